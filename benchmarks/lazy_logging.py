@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+Benchmark : cost of debug messages during generation when logging is at WARN level,
+with lazy messages (Configuration) and with messages built eagerly, as they used to be
+
+Usage : python benchmarks/lazy_logging.py [--meals N] [--plans N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from benchmarks.synthetic import write_dataset # noqa
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.meals_for_a_week import MealDatabase, MealGenerator # noqa
+
+DEFAULT_NUMBER_OF_MEALS = 10000
+DEFAULT_NUMBER_OF_PLANS = 2000
+NUMBER_OF_LEFTOVER_MEALS = 3
+
+
+class EagerConfiguration(Configuration):
+    """
+    Configuration building every debug message, even when it is not logged
+    """
+    def is_debug_log(self):
+        return True
+
+    def log(self, level, message, *args):
+        if callable(message):
+            message = message()
+        if args:
+            message = message % args
+        super().log(level, message)
+
+
+def generate_plans(configuration, database, leftovers, number_of_plans):
+    """
+    Generate number_of_plans plans of 7 meals using leftovers
+    """
+    generator = random.Random(0)
+    for _ in range(number_of_plans):
+        meal_generator = MealGenerator(configuration, database.get().get_view(), 7, generator)
+        meal_generator.set_veggie_limit(2)
+        meal_generator.set_special_limit(1)
+        meal_generator.generate(leftovers)
+
+
+def main():
+    """
+    Run benchmark
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--meals', default=DEFAULT_NUMBER_OF_MEALS, type=int,
+                        help='number of meals of the synthetic database')
+    parser.add_argument('--plans', default=DEFAULT_NUMBER_OF_PLANS, type=int,
+                        help='number of plans generated per configuration')
+    args = parser.parse_args()
+
+    number_of_meals = args.meals
+    number_of_plans = args.plans
+    with tempfile.TemporaryDirectory() as output_dir:
+        database_path, _, _ = write_dataset(output_dir, number_of_meals, 0)
+        databases = {}
+        for name, configuration in [('eager', EagerConfiguration()), ('lazy', Configuration())]:
+            database = MealDatabase(database_path, configuration)
+            database.load()
+            database.build()
+            databases[name] = (configuration, database)
+        leftovers = {ingredient
+                     for meal in random.Random(0).sample(databases['lazy'][1].get().get(),
+                                                         NUMBER_OF_LEFTOVER_MEALS)
+                     for ingredient in meal.get_mandatory_ingredients()}
+
+        for scenario, scenario_leftovers in [('without leftovers', None),
+                                             ('with leftovers', leftovers)]:
+            print(scenario)
+            durations = {}
+            for name, (configuration, database) in databases.items():
+                def generate(configuration=configuration, database=database,
+                             leftovers=scenario_leftovers):
+                    generate_plans(configuration, database, leftovers, number_of_plans)
+                durations[name] = min(timeit.repeat(generate, number=1, repeat=5)) \
+                    / number_of_plans
+                print('  {0:<6} {1:8.1f} us/plan'.format(name, durations[name] * 1e6))
+            print('  saving {0:.0%}'.format(1 - durations['lazy'] / durations['eager']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""
+Benchmark : memory used by Meal and MonthlyVegetables objects built from a synthetic database,
+compared with the former layout (per-instance __dict__, lists, one string per occurrence)
+
+Usage : python benchmarks/memory_meals.py [--meals N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from meals_for_a_week.meals_for_a_week import Meal, MonthlyVegetables, intern_name # noqa
+
+DEFAULT_NUMBER_OF_MEALS = 100000
+NUMBER_OF_INGREDIENTS = 500
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August',
+          'September', 'October', 'November', 'December']
+
+
+class LegacyMeal:
+    """
+    Meal layout before __slots__ and interning
+    """
+    def __init__(self, name):
+        self.__name = name
+        self.__mandatory_ingredients = []
+        self.__is_special = False
+        self.__is_veggie_compatible = False
+        self.__is_enable = True
+        self.__collections = []
+
+    def add_mandatory_ingredients(self, _ingredient):
+        self.__mandatory_ingredients.append(_ingredient)
+
+
+class LegacyMonthlyVegetables:
+    """
+    MonthlyVegetables layout before __slots__ and interning
+    """
+    def __init__(self, name):
+        self.__name = name
+        self.__vegetables = []
+
+    def add(self, _vegetable_name):
+        self.__vegetables.append(_vegetable_name)
+
+
+def build_records(number_of_meals):
+    """
+    Synthetic raw yaml content : meals and 12 months of seasonal vegetables
+    """
+    generator = random.Random(0)
+    ingredients = ['Ingredient{0}'.format(index) for index in range(NUMBER_OF_INGREDIENTS)]
+    meals = [{'meal': 'Meal {0}'.format(index),
+              'mandatory_ingredients': generator.sample(ingredients, generator.randint(0, 4))}
+             for index in range(number_of_meals)]
+    months = [{'month': month, 'vegetables': generator.sample(ingredients, 100)}
+              for month in MONTHS]
+    return meals, months
+
+
+def build_legacy(meals, months):
+    """
+    Build objects the former way
+    """
+    built_meals = []
+    for record in meals:
+        meal = LegacyMeal(record['meal'].lower())
+        for ingredient in record['mandatory_ingredients']:
+            meal.add_mandatory_ingredients(ingredient.lower())
+        built_meals.append(meal)
+    built_months = []
+    for record in months:
+        month = LegacyMonthlyVegetables(record['month'].lower())
+        for vegetable in record['vegetables']:
+            month.add(vegetable.lower())
+        built_months.append(month)
+    return built_meals, built_months
+
+
+def build_compact(meals, months):
+    """
+    Build objects the way MealDatabase and SeasonalDatabase do
+    """
+    built_meals = []
+    for record in meals:
+        meal = Meal(intern_name(record['meal']))
+        meal.set_mandatory_ingredients(intern_name(ingredient)
+                                       for ingredient in record['mandatory_ingredients'])
+        built_meals.append(meal)
+    built_months = []
+    for record in months:
+        month = MonthlyVegetables(intern_name(record['month']))
+        month.set_vegetables(intern_name(vegetable) for vegetable in record['vegetables'])
+        built_months.append(month)
+    return built_meals, built_months
+
+
+def measure(build, meals, months):
+    """
+    Memory allocated by build(meals, months) and still alive afterwards
+    """
+    tracemalloc.start()
+    built = build(meals, months)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del built
+    return current, peak
+
+
+def main():
+    """
+    Run benchmark
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--meals', default=DEFAULT_NUMBER_OF_MEALS, type=int,
+                        help='number of meals of the synthetic records')
+    args = parser.parse_args()
+
+    number_of_meals = args.meals
+    meals, months = build_records(number_of_meals)
+    print('{0} meals, {1} ingredients, {2} months'.format(number_of_meals, NUMBER_OF_INGREDIENTS,
+                                                          len(months)))
+    results = {}
+    for name, build in [('legacy', build_legacy), ('compact', build_compact)]:
+        results[name] = measure(build, meals, months)
+        print('  {0:<8} {1:8.1f} MiB ({2:5.0f} bytes/meal, peak {3:.1f} MiB)'.format(
+            name, results[name][0] / 2 ** 20, results[name][0] / number_of_meals,
+            results[name][1] / 2 ** 20))
+    print('  reduction {0:.0%}'.format(1 - results['compact'][0] / results['legacy'][0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Benchmark : peak memory of MealDatabase load() + build(), whole-document parsing vs streaming
+
+Every measurement runs in a fresh interpreter (interned names and yaml caches of a previous
+measurement would hide part of the cost) on the same synthetic database.yaml :
+- retained : memory still allocated once the database is built (Meal objects and indexes)
+- peak : highest memory allocated while loading and building, as traced by tracemalloc
+- max RSS and time : of another run without tracemalloc (which slows and inflates them)
+Streaming peak should be close to retained memory (one copy of the catalogue),
+whole-document peak several times as much (yaml nodes, then records and Meal objects at the
+same time, records being kept afterwards).
+
+Usage : python benchmarks/memory_streaming.py [--meals N]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from benchmarks.synthetic import write_dataset # noqa
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.meals_for_a_week import MealDatabase # noqa
+
+DEFAULT_NUMBER_OF_MEALS = 100000
+MODES = ['whole', 'streaming']
+
+
+def get_max_rss():
+    """
+    Peak resident memory of this process, in bytes
+    VmHWM is read first : ru_maxrss of a child process starts from the benchmark process one
+    """
+    try:
+        with open('/proc/self/status', encoding='ascii') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(database_path, mode, is_traced):
+    """
+    Load and build database_path in this process
+    :return: {'retained', 'peak'} with tracemalloc, {'max_rss', 'duration'} otherwise (bytes)
+    """
+    database = MealDatabase(database_path, Configuration())
+    if mode == 'streaming':
+        database.enable_streaming()
+    if is_traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    database.load()
+    database.build()
+    duration = time.perf_counter() - start
+    if is_traced:
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {'retained': retained, 'peak': peak}
+    return {'max_rss': get_max_rss(), 'duration': duration}
+
+
+def run(database_path, mode, is_traced):
+    """
+    Measure mode in a fresh interpreter
+    """
+    process = subprocess.run([sys.executable, os.path.realpath(__file__), '--measure', mode,
+                              database_path] + (['--traced'] if is_traced else []),
+                             capture_output=True, check=True, text=True)
+    return json.loads(process.stdout)
+
+
+def main():
+    """
+    Run benchmark
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--meals', default=DEFAULT_NUMBER_OF_MEALS, type=int,
+                        help='number of meals of the synthetic database')
+    parser.add_argument('--measure', default=None, nargs=2, metavar=('MODE', 'DATABASE'),
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--traced', default=False, action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure[1], args.measure[0], args.traced)))
+        return
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        database_path, _, _ = write_dataset(output_dir, args.meals, 0)
+        print('{0} meals, {1:.1f} MiB of yaml'.format(
+            args.meals, os.path.getsize(database_path) / 2 ** 20))
+        for mode in MODES:
+            result = run(database_path, mode, True)
+            result.update(run(database_path, mode, False))
+            print('  {0:<10} retained {1:7.1f} MiB, peak {2:7.1f} MiB ({3:.2f}x retained), '
+                  'max RSS {4:7.1f} MiB, {5:6.2f} s'.format(
+                      mode, result['retained'] / 2 ** 20, result['peak'] / 2 ** 20,
+                      result['peak'] / result['retained'], result['max_rss'] / 2 ** 20,
+                      result['duration']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+"""
+Benchmark : time of each stage of the planning pipeline on synthetic databases
+
+Stages are timed separately (best of several runs) :
+load (yaml files), build (python objects), filter (seasonal and history),
+restrict_by_ingredients (leftovers) and generate (one meal list).
+Every run appends one JSON line per database size to the results file,
+so that regressions can be tracked over time.
+
+Usage : python benchmarks/pipeline.py [--meals N [N ...]] [--history-years Y]
+                                      [--repeat R] [--output RESULTS.jsonl]
+"""
+
+import argparse
+import datetime
+import json
+import locale
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from benchmarks.synthetic import write_dataset # noqa
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.history import HistoryDatabase # noqa
+from meals_for_a_week.meals_for_a_week import MealDatabase, SeasonalDatabase, MealGenerator # noqa
+from meals_for_a_week.yaml_io import get_backend # noqa
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_HISTORY_YEARS = 2
+DEFAULT_REPEAT = 3
+# Outside the source tree : pass --output to keep results elsewhere
+DEFAULT_OUTPUT = os.path.join(tempfile.gettempdir(), 'meals_for_a_week_pipeline.jsonl')
+# Plan generated by the generate stage
+NUMBER_OF_MEALS = 7
+NUMBER_OF_VEGGIE_MEALS = 2
+NUMBER_OF_SPECIAL_MEALS = 1
+HISTORY_WEEKS = 4
+NUMBER_OF_LEFTOVER_MEALS = 3
+GENERATIONS_PER_RUN = 100
+
+
+def best_of(repeat, stage):
+    """
+    Shortest duration of stage() over repeat runs
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def get_revision():
+    """
+    Git revision of the benchmarked tree, None outside of a git checkout
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=os.path.dirname(os.path.realpath(__file__)),
+                              capture_output=True, check=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_pipeline(paths, repeat, configuration):
+    """
+    Time every stage on the files at paths
+    :return: stage name -> duration in seconds
+    """
+    database_path, seasonal_path, history_path = paths
+    database = MealDatabase(database_path, configuration)
+    seasonal_database = SeasonalDatabase(seasonal_path, configuration)
+    history_database = HistoryDatabase(history_path, configuration)
+    durations = {}
+
+    def load():
+        database.load()
+        seasonal_database.load()
+        history_database.load(HISTORY_WEEKS)
+    durations['load'] = best_of(repeat, load)
+
+    def build():
+        database.build()
+        seasonal_database.build()
+        history_database.build()
+    durations['build'] = best_of(repeat, build)
+
+    filtered_views = []
+
+    def filter_database():
+        filtered_views.append(database.get().get_view())
+        database.filter(seasonal_database, history_database, HISTORY_WEEKS, filtered_views[-1])
+    durations['filter'] = best_of(repeat, filter_database)
+    filtered_view = filtered_views[-1]
+
+    generator = random.Random(0)
+    leftovers = {ingredient
+                 for meal in generator.sample(filtered_view.get(), NUMBER_OF_LEFTOVER_MEALS)
+                 for ingredient in meal.get_mandatory_ingredients()}
+
+    def restrict_by_ingredients():
+        leftover_view = filtered_view.get_view()
+        leftover_view.set_random(generator)
+        leftover_view.restrict_by_ingredients(leftovers)
+    durations['restrict_by_ingredients'] = best_of(repeat, restrict_by_ingredients)
+
+    def generate():
+        for _ in range(GENERATIONS_PER_RUN):
+            meal_generator = MealGenerator(configuration, filtered_view.get_view(),
+                                           NUMBER_OF_MEALS, generator)
+            meal_generator.set_veggie_limit(NUMBER_OF_VEGGIE_MEALS)
+            meal_generator.set_special_limit(NUMBER_OF_SPECIAL_MEALS)
+            meal_generator.generate(None)
+    durations['generate'] = best_of(repeat, generate) / GENERATIONS_PER_RUN
+    return durations
+
+
+def main():
+    """
+    Run benchmark
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--meals', default=DEFAULT_SIZES, nargs='+', type=int,
+                        help='database sizes (number of meals)')
+    parser.add_argument('--history-years', default=DEFAULT_HISTORY_YEARS, type=int)
+    parser.add_argument('--repeat', default=DEFAULT_REPEAT, type=int)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON lines results file')
+    args = parser.parse_args()
+
+    # Same month names as the application (see SeasonalDatabase.build)
+    locale.setlocale(locale.LC_ALL, '')
+    configuration = Configuration()
+    revision = get_revision()
+
+    with tempfile.TemporaryDirectory() as output_dir, \
+            open(args.output, 'a', encoding='utf-8') as results_file:
+        for number_of_meals in args.meals:
+            paths = write_dataset(os.path.join(output_dir, str(number_of_meals)),
+                                  number_of_meals, args.history_years)
+            durations = run_pipeline(paths, args.repeat, configuration)
+
+            print('{0} meals'.format(number_of_meals))
+            for stage, duration in durations.items():
+                print('  {0:<24} {1:10.3f} ms'.format(stage, duration * 1000))
+
+            results_file.write(json.dumps({
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'revision': revision,
+                'python': platform.python_version(),
+                'yaml_backend': get_backend(),
+                'meals': number_of_meals,
+                'history_years': args.history_years,
+                'repeat': args.repeat,
+                'seconds': durations,
+            }) + '\n')
+    print('Results appended to ' + args.output)
+
+
+if __name__ == '__main__':
+    main()
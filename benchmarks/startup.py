@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+Benchmark : start-up time of the command line application
+
+Every scenario runs bin/meals_for_a_week in a fresh interpreter with python -X importtime :
+wall time is the best of several runs, import time is the sum of top level imports
+reported by the interpreter, and the slowest imports are listed.
+
+Usage : python benchmarks/startup.py [--repeat R] [--meals N] [--top T]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from benchmarks.synthetic import write_dataset # noqa
+
+APPLICATION = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'bin',
+                           'meals_for_a_week')
+DEFAULT_REPEAT = 10
+DEFAULT_NUMBER_OF_MEALS = 1000
+DEFAULT_TOP = 8
+
+
+def run(arguments):
+    """
+    Run application once with arguments
+    :return: (wall time in seconds, {top level module: cumulative import time in us})
+    """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', APPLICATION] + arguments,
+                             capture_output=True, check=False, text=True,
+                             stdin=subprocess.DEVNULL)
+    duration = time.perf_counter() - start
+    imports = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit() and not module[1:].startswith(' '):
+            imports[module.strip()] = int(cumulative)
+    return duration, imports
+
+
+def main():
+    """
+    Run benchmark
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', default=DEFAULT_REPEAT, type=int)
+    parser.add_argument('--meals', default=DEFAULT_NUMBER_OF_MEALS, type=int,
+                        help='number of meals of the synthetic database')
+    parser.add_argument('--top', default=DEFAULT_TOP, type=int,
+                        help='number of slowest imports listed per scenario')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        database_path, seasonal_path, history_path = write_dataset(output_dir, args.meals, 1)
+        plan = ['-c', database_path, '-s', seasonal_path, '--history', history_path, '-p',
+                '--seed', '0']
+        scenarios = [('--help', ['--help']),
+                     ('argument error', ['--meals', 'x']),
+                     ('plan', plan),
+                     ('plan --no-snapshot', plan + ['--no-snapshot'])]
+        # First run writes database snapshots : later "plan" runs start from them
+        run(plan)
+
+        for name, arguments in scenarios:
+            runs = [run(arguments) for _ in range(args.repeat)]
+            duration, imports = min(runs, key=lambda result: result[0])
+            print('{0:<20} {1:8.1f} ms wall, {2:8.1f} ms imports'.format(
+                name, duration * 1000, sum(imports.values()) / 1000))
+            for module, cumulative in sorted(imports.items(), key=lambda item: -item[1])[
+                    :args.top]:
+                print('  {0:<38} {1:8.1f} ms'.format(module, cumulative / 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+"""
+Synthetic database.yaml, seasonal.yaml and history.yaml files of configurable size
+
+Ingredient popularity follows a Zipf-like distribution (a few ingredients are used by many
+meals), some ingredients are seasonal vegetables available a few consecutive months a year,
+and history holds one week of meals per week over several years.
+
+Usage : python benchmarks/synthetic.py OUTPUT_DIR [--meals N] [--history-years Y] [--seed S]
+"""
+
+import argparse
+import calendar
+import datetime
+import itertools
+import os
+import random
+import sys
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from meals_for_a_week.history import HistoryDatabase # noqa
+from meals_for_a_week.meals_for_a_week import Meal # noqa
+from meals_for_a_week.yaml_io import dump_yaml_line # noqa
+
+DEFAULT_NUMBER_OF_MEALS = 10000
+DEFAULT_HISTORY_YEARS = 2
+NUMBER_OF_INGREDIENTS = 2000
+NUMBER_OF_VEGETABLES = 300
+# Number of mandatory ingredients of a meal, and its probability
+INGREDIENTS_PER_MEAL = [0, 1, 2, 3, 4]
+INGREDIENTS_PER_MEAL_WEIGHTS = [15, 35, 30, 15, 5]
+VEGGIE_RATIO = 0.3
+SPECIAL_RATIO = 0.1
+GROUP_RATIO = 0.2
+MEALS_PER_GROUP = 5
+DISHES = ['Gratin', 'Soupe', 'Tarte', 'Salade', 'Curry', 'Risotto', 'Poêlée', 'Lasagne',
+          'Quiche', 'Wok', 'Velouté', 'Galette']
+
+DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+
+def get_ingredients():
+    """
+    Ingredient names, the first NUMBER_OF_VEGETABLES ones being seasonal vegetables
+    """
+    return ['Légume {0}'.format(index) for index in range(NUMBER_OF_VEGETABLES)] \
+        + ['Ingrédient {0}'.format(index)
+           for index in range(NUMBER_OF_INGREDIENTS - NUMBER_OF_VEGETABLES)]
+
+
+def build_meal_records(number_of_meals, generator):
+    """
+    Meal records of database.yaml
+    """
+    ingredients = get_ingredients()
+    # Popularity : shuffled ranks, so that vegetables are not all the most popular ingredients
+    ranks = list(range(1, len(ingredients) + 1))
+    generator.shuffle(ranks)
+    cumulative_weights = list(itertools.accumulate(1 / rank for rank in ranks))
+
+    records = []
+    for index in range(number_of_meals):
+        meal_ingredients = list(dict.fromkeys(generator.choices(
+            ingredients, cum_weights=cumulative_weights,
+            k=generator.choices(INGREDIENTS_PER_MEAL, INGREDIENTS_PER_MEAL_WEIGHTS)[0])))
+        record = {'meal': '{0} {1}'.format(generator.choice(DISHES), index)}
+        if generator.random() < VEGGIE_RATIO:
+            record['is_veggie_compatible'] = True
+        if generator.random() < SPECIAL_RATIO:
+            record['is_special'] = True
+        if meal_ingredients:
+            record['mandatory_ingredients'] = meal_ingredients
+        if generator.random() < GROUP_RATIO:
+            record['group'] = 'Groupe {0}'.format(
+                generator.randrange(max(1, int(number_of_meals * GROUP_RATIO / MEALS_PER_GROUP))))
+        records.append(record)
+    return records
+
+
+def build_month_records(generator):
+    """
+    Month records of seasonal.yaml : every vegetable is available 2 to 6 consecutive months
+    Month names are those of the current locale, as SeasonalDatabase looks them up
+    """
+    vegetables_by_month = [[] for _ in range(12)]
+    for vegetable in get_ingredients()[:NUMBER_OF_VEGETABLES]:
+        first_month = generator.randrange(12)
+        for month in range(first_month, first_month + generator.randint(2, 6)):
+            vegetables_by_month[month % 12].append(vegetable)
+    return [{'month': calendar.month_name[index + 1].capitalize(), 'vegetables': vegetables}
+            for index, vegetables in enumerate(vegetables_by_month)]
+
+
+def write_history(history_path, meal_records, history_years, generator):
+    """
+    Write history.yaml : one entry per week of 7 meals, up to last week
+    """
+    last_week = datetime.date.today() - datetime.timedelta(days=7)
+    number_of_weeks = history_years * 52
+    with open(history_path, 'w', encoding='utf-8') as history_file:
+        for week in range(number_of_weeks, 0, -1):
+            meals = [Meal(record['meal'].lower())
+                     for record in generator.sample(meal_records, min(7, len(meal_records)))]
+            history_file.write(dump_yaml_line(HistoryDatabase.build_entry(
+                meals, last_week - datetime.timedelta(weeks=week - 1))))
+
+
+def write_dataset(output_dir, number_of_meals, history_years=DEFAULT_HISTORY_YEARS, seed=0):
+    """
+    Write synthetic database.yaml, seasonal.yaml and history.yaml into output_dir
+    :return: (database path, seasonal path, history path)
+    """
+    generator = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    database_path = os.path.join(output_dir, 'database.yaml')
+    seasonal_path = os.path.join(output_dir, 'seasonal.yaml')
+    history_path = os.path.join(output_dir, 'history.yaml')
+
+    meal_records = build_meal_records(number_of_meals, generator)
+    with open(database_path, 'w', encoding='utf-8') as database_file:
+        yaml.dump({'meals': meal_records}, database_file, Dumper=DUMPER, allow_unicode=True,
+                  sort_keys=False)
+    with open(seasonal_path, 'w', encoding='utf-8') as seasonal_file:
+        yaml.dump({'months': build_month_records(generator)}, seasonal_file, Dumper=DUMPER,
+                  allow_unicode=True)
+    write_history(history_path, meal_records, history_years, generator)
+    return database_path, seasonal_path, history_path
+
+
+def main():
+    """
+    Write synthetic files
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output_dir')
+    parser.add_argument('--meals', default=DEFAULT_NUMBER_OF_MEALS, type=int)
+    parser.add_argument('--history-years', default=DEFAULT_HISTORY_YEARS, type=int)
+    parser.add_argument('--seed', default=0, type=int)
+    args = parser.parse_args()
+
+    for path in write_dataset(args.output_dir, args.meals, args.history_years, args.seed):
+        print('{0} ({1:.1f} KiB)'.format(path, os.path.getsize(path) / 1024))
+
+
+if __name__ == '__main__':
+    main()
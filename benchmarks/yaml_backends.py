@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+Benchmark : yaml parse time of example files scaled up 1000x, per yaml loader
+
+Usage : python benchmarks/yaml_backends.py [--scale N]
+"""
+
+import argparse
+import copy
+import os
+import tempfile
+import timeit
+import yaml
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../examples')
+DEFAULT_SCALE = 1000
+
+
+def scale_examples(scale, output_dir):
+    """
+    Write examples files scaled up "scale" times into output_dir
+    :return: list of scaled file paths
+    """
+    scaled_files = []
+    for file_name, key in [('database.yaml', 'meals'),
+                           ('seasonal.yaml', 'months'),
+                           ('history.yaml', 'meals')]:
+        with open(os.path.join(EXAMPLES_DIR, file_name), encoding='utf-8') as example_file:
+            content = yaml.safe_load(example_file)
+        # Deep copies : repeated objects would be dumped as yaml aliases
+        content[key] = [copy.deepcopy(record) for _ in range(scale) for record in content[key]]
+        scaled_path = os.path.join(output_dir, file_name)
+        with open(scaled_path, 'w', encoding='utf-8') as scaled_file:
+            yaml.dump(content, scaled_file, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper),
+                      allow_unicode=True)
+        scaled_files.append(scaled_path)
+    return scaled_files
+
+
+def get_loaders():
+    """
+    Available loaders, by name
+    """
+    loaders = {'FullLoader': yaml.FullLoader, 'SafeLoader': yaml.SafeLoader}
+    if yaml.__with_libyaml__:
+        loaders['CSafeLoader'] = yaml.CSafeLoader
+    return loaders
+
+
+def main():
+    """
+    Run benchmark
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', default=DEFAULT_SCALE, type=int,
+                        help='number of copies of the example records')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        scaled_files = scale_examples(args.scale, output_dir)
+        for scaled_path in scaled_files:
+            print('{0} ({1:.1f} KiB)'.format(os.path.basename(scaled_path),
+                                             os.path.getsize(scaled_path) / 1024))
+            for loader_name, loader in get_loaders().items():
+                def parse(path=scaled_path, loader=loader):
+                    with open(path, encoding='utf-8') as scaled_file:
+                        yaml.load(scaled_file, Loader=loader)
+                duration = min(timeit.repeat(parse, number=1, repeat=3))
+                print('  {0:<12} {1:8.3f} s'.format(loader_name, duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""
+Meal for a week : generate many independent meal plans in one run
+
+Meal and seasonal databases are loaded, built and filtered once,
+then every plan draws from its own view of the database,
+either in the current process or in forked worker processes.
+"""
+import gc
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from meals_for_a_week.meals_for_a_week import MealGenerator, NotEnoughMealsError # noqa
+from meals_for_a_week.history import HistoryDatabase # noqa
+from meals_for_a_week.plan_cache import get_meal_records # noqa
+from meals_for_a_week.yaml_io import load_yaml_file # noqa
+
+
+# Settings of a plan, when not set in plans file nor on command line
+DEFAULT_PLAN_SETTINGS = {
+    'meals': 7,
+    'veggie_meals': 0,
+    'special_meals': 0,
+    'leftovers': None,
+    'history': None,
+    'history_meals': 1,
+}
+
+
+# BatchGenerator shared with worker processes : set before forking them
+_worker_batch_generator = None
+
+
+def get_plan_seed(seed, plan_id):
+    """
+    Seed of a plan random generator, derived from batch seed and plan id
+    so that a plan does not depend on the worker or order it is generated in
+    :param seed:
+    :type seed:
+    :param plan_id:
+    :type plan_id:
+    :return:
+    :rtype: int
+    """
+    __digest = hashlib.sha256('{0}:{1}'.format(seed, plan_id).encode('utf-8')).digest()
+    return int.from_bytes(__digest[:8], 'big')
+
+
+def generate_plan_in_worker(_indexed_plan):
+    """
+    Generate a plan in a worker process
+    :param _indexed_plan: (index, plan settings) tuple
+    :type _indexed_plan:
+    :return:
+    :rtype:
+    """
+    __index, __plan = _indexed_plan
+    return _worker_batch_generator.generate_plan(__plan, __index)
+
+
+def load_plans(plans_path, _configuration):
+    """
+    Load list of plan settings from a yaml file (plans: [{id: ..., meals: ..., ...}])
+    Relative history paths of plans are relative to the directory of the plans file
+    :param plans_path:
+    :type plans_path:
+    :param _configuration:
+    :type _configuration:
+    :return:
+    :rtype:
+    """
+    __plans_raw_content = load_yaml_file(plans_path, _configuration)
+    __plans = __plans_raw_content.get("plans") or []
+    __plans_dir = os.path.dirname(plans_path)
+    for __plan in __plans:
+        if isinstance(__plan, dict) and __plan.get("history"):
+            __plan["history"] = os.path.join(__plans_dir, str(__plan["history"]))
+    return __plans
+
+
+class BatchGenerator:
+    """
+    BatchGenerator class
+    """
+    def __init__(self, _configuration, database, seasonal_database=None, default_settings=None,
+                 seed=None, plan_cache=None):
+        """
+
+        :param _configuration:
+        :type _configuration:
+        :param database: built MealDatabase
+        :type database:
+        :param seasonal_database: built SeasonalDatabase
+        :type seasonal_database:
+        :param default_settings: settings used for keys missing from a plan
+        :type default_settings:
+        :param seed: batch seed, plans are reproducible for a given seed (random if None)
+        :type seed:
+        :param plan_cache: PlanCache of plans generated with a given seed
+        :type plan_cache:
+        """
+        self._configuration = _configuration
+        self._seed = seed if seed is not None else random.SystemRandom().getrandbits(64)
+        # Plans of a random batch seed are never requested again
+        self._plan_cache = plan_cache if seed is not None else None
+        self._database = database
+        self._seasonal_path = seasonal_database.get_path() if seasonal_database else None
+        self._default_settings = dict(DEFAULT_PLAN_SETTINGS)
+        if default_settings:
+            self._default_settings.update(default_settings)
+        # Seasonal filtering is the same for every plan : apply it once
+        self.__seasonal_view = database.get().get_view()
+        if seasonal_database:
+            database.filter(seasonal_database, None, 0, self.__seasonal_view)
+        # (history path, number of weeks) -> view filtered by history, meals excluded by history
+        self.__history_views = {}
+        self.__history_meal_names = {}
+
+    def get_plan_settings(self, _plan):
+        """
+        Plan settings, completed with default settings and checked like a server request
+        :param _plan:
+        :type _plan:
+        :return:
+        :rtype:
+        :raise ValueError: invalid plan settings
+        """
+        if not isinstance(_plan, dict):
+            raise ValueError('plan must be a mapping')
+        __settings = dict(self._default_settings)
+        __settings.update(_plan)
+        # A string is iterable too : it would be read as one leftover per character
+        if not isinstance(__settings['leftovers'] or [], list):
+            raise ValueError('leftovers must be a list')
+        for __key in ('meals', 'veggie_meals', 'special_meals', 'history_meals'):
+            try:
+                __settings[__key] = int(__settings[__key])
+            except (TypeError, ValueError) as err:
+                raise ValueError('{0}: {1}'.format(__key, err)) from err
+        if min(__settings['meals'], __settings['veggie_meals'], __settings['special_meals']) < 0:
+            raise ValueError('negative number of meals')
+        return __settings
+
+    def get_filtered_view(self, _history_path, _number_of_history_meals):
+        """
+        Get database view filtered by season and history (history files are read once)
+        :param _history_path:
+        :type _history_path:
+        :param _number_of_history_meals:
+        :type _number_of_history_meals:
+        :return:
+        :rtype:
+        """
+        if not _history_path or _number_of_history_meals <= 0:
+            return self.__seasonal_view
+
+        __key = (_history_path, _number_of_history_meals)
+        if __key not in self.__history_views:
+            __history_database = HistoryDatabase(_history_path, self._configuration)
+            __history_database.load(_number_of_history_meals)
+            __view = self.__seasonal_view.get_view()
+            self._database.filter(None, __history_database, _number_of_history_meals, __view)
+            self.__history_views[__key] = __view
+            self.__history_meal_names[__key] = __history_database.get_recent_meal_names(
+                _number_of_history_meals)
+        return self.__history_views[__key]
+
+    def get_history_meal_names(self, _history_path, _number_of_history_meals):
+        """
+        Names of meals excluded by history from plans
+        :param _history_path:
+        :type _history_path:
+        :param _number_of_history_meals:
+        :type _number_of_history_meals:
+        :return:
+        :rtype:
+        """
+        if not _history_path or _number_of_history_meals <= 0:
+            return frozenset()
+        self.get_filtered_view(_history_path, _number_of_history_meals)
+        return self.__history_meal_names[(_history_path, _number_of_history_meals)]
+
+    def get_seed(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self._seed
+
+    def prepare(self, _plans):
+        """
+        Load and filter every history needed by _plans
+        (done once, before sharing this object with worker processes)
+        :param _plans:
+        :type _plans:
+        """
+        for __plan in _plans:
+            try:
+                __settings = self.get_plan_settings(__plan)
+            except ValueError:
+                # Reported when the plan is generated
+                continue
+            self.get_filtered_view(__settings['history'], __settings['history_meals'])
+
+    def generate_plan(self, _plan, _plan_id=None):
+        """
+        Generate a meal plan
+        :param _plan: plan settings
+        :type _plan:
+        :param _plan_id: plan identifier, when _plan has no "id"
+        :type _plan_id:
+        :return: {'id': ..., 'meals': [...]} or {'id': ..., 'error': ...}
+        :rtype:
+        """
+        try:
+            __settings = self.get_plan_settings(_plan)
+        except ValueError as err:
+            # Other plans of the batch are still generated
+            return {'id': _plan.get('id', _plan_id) if isinstance(_plan, dict) else _plan_id,
+                    'error': 'Invalid plan settings: {0}'.format(err)}
+        __plan_id = __settings.get('id', _plan_id)
+        __plan_seed = get_plan_seed(self._seed, __plan_id)
+        __random = random.Random(__plan_seed)
+
+        if __settings['veggie_meals'] + __settings['special_meals'] > __settings['meals']:
+            return {'id': __plan_id, 'error': 'You asked for too many veggie or special meals'}
+
+        __leftovers = [str(__leftover).lower() for __leftover in __settings['leftovers'] or []]
+
+        __plan_key = None
+        if self._plan_cache:
+            __plan_key = self._plan_cache.get_key(
+                self._database.get_path(), self._seasonal_path,
+                self.get_history_meal_names(__settings['history'], __settings['history_meals']),
+                dict(__settings, leftovers=__leftovers), __plan_seed)
+            __meals = self._plan_cache.get(__plan_key)
+            if __meals is not None:
+                return {'id': __plan_id, 'meals': __meals}
+
+        __view = self.get_filtered_view(__settings['history'],
+                                        __settings['history_meals']).get_view()
+        __view.set_leftover_mode(bool(__leftovers))
+
+        __meal_generator = MealGenerator(self._configuration, __view, __settings['meals'],
+                                         __random)
+        __meal_generator.set_veggie_limit(__settings['veggie_meals'])
+        __meal_generator.set_special_limit(__settings['special_meals'])
+
+        if not __meal_generator.is_config_valid():
+            return {'id': __plan_id, 'error': 'Config is invalid'}
+
+        try:
+            __meal_generator.generate(__leftovers)
+        except NotEnoughMealsError as err:
+            return {'id': __plan_id, 'error': str(err)}
+
+        __meals = get_meal_records(__meal_generator.get().get())
+        if __plan_key:
+            self._plan_cache.put(__plan_key, __meals)
+        return {'id': __plan_id, 'meals': __meals}
+
+    def generate(self, _plans, _jobs=1):
+        """
+        Generate meal plans, in _plans order
+        With _jobs > 1, plans are generated by a pool of forked worker processes
+        sharing this object (and its databases) copy-on-write
+        :param _plans: list of plan settings
+        :type _plans:
+        :param _jobs: number of worker processes
+        :type _jobs:
+        :return: generator of plans (see generate_plan)
+        """
+        if _jobs > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            self._configuration.warn_log('Parallel generation needs fork : using a single process')
+            _jobs = 1
+
+        if _jobs <= 1:
+            for __index, __plan in enumerate(_plans):
+                yield self.generate_plan(__plan, __index)
+            return
+
+        global _worker_batch_generator  # pylint: disable=global-statement
+        self.prepare(_plans)
+        _worker_batch_generator = self
+        # Keep already built objects out of garbage collector scans,
+        # so that workers do not write to (hence copy) their memory pages
+        gc.freeze()
+        try:
+            with multiprocessing.get_context('fork').Pool(_jobs) as __pool:
+                __chunk_size = max(1, len(_plans) // (_jobs * 8))
+                yield from __pool.imap(generate_plan_in_worker, enumerate(_plans), __chunk_size)
+        finally:
+            gc.unfreeze()
+            _worker_batch_generator = None
+
+
+def run_batch(plans_path, _configuration, database, seasonal_database, default_settings,
+              seed=None, jobs=1, plan_cache=None):
+    """
+    Generate plans listed in plans_path, stream them as JSON lines on stdout
+    and report throughput on stderr (log messages must be written to stderr too,
+    see Configuration.set_log_stream())
+    :param plans_path:
+    :type plans_path:
+    :param _configuration:
+    :type _configuration:
+    :param database:
+    :type database:
+    :param seasonal_database:
+    :type seasonal_database:
+    :param default_settings:
+    :type default_settings:
+    :param seed:
+    :type seed:
+    :param jobs:
+    :type jobs:
+    :param plan_cache:
+    :type plan_cache:
+    """
+    __plans = load_plans(plans_path, _configuration)
+
+    __start = time.perf_counter()
+    __batch_generator = BatchGenerator(_configuration, database, seasonal_database,
+                                       default_settings, seed, plan_cache)
+    for __result in __batch_generator.generate(__plans, jobs):
+        sys.stdout.write(json.dumps(__result, ensure_ascii=False) + '\n')
+    sys.stdout.flush()
+    __duration = time.perf_counter() - __start
+
+    print('Generated {0} plans in {1:.3f} s ({2:.0f} plans/sec, {3} job(s), seed {4})'.format(
+        len(__plans), __duration, len(__plans) / __duration if __duration else 0,
+        jobs, __batch_generator.get_seed()),
+        file=sys.stderr)
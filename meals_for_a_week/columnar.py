@@ -0,0 +1,124 @@
+"""
+Meal for a week : columnar catalogue of a meal collection
+
+Meal names and ingredients are stored as integer codes into interned (sorted) tables,
+ingredients of every meal as a CSR-style ragged array. Seasonal and history filters are then
+computed as masks over the whole catalogue instead of Python loops over Meal objects.
+Meal type selection stays with the candidate pools of MealCollection, which are already
+maintained incrementally.
+
+NumPy is optional : is_available() is False when it cannot be imported.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def is_available():
+    """
+    Whether the columnar backend can be used (NumPy is installed)
+    :return:
+    :rtype: bool
+    """
+    return numpy is not None
+
+
+class ColumnarCatalogue:
+    """
+    ColumnarCatalogue class : read-only columns built from a list of Meal objects
+    """
+    def __init__(self, _meals):
+        """
+        Build columns from _meals (Meal objects keep their position as row index)
+        :param _meals:
+        :type _meals:
+        """
+        self.__meals = list(_meals)
+        __count = len(self.__meals)
+
+        # Interned names : sorted table, so that name code order is name order
+        self.__name_table, self.__name_codes = numpy.unique(
+            numpy.array([__meal.get() for __meal in self.__meals], dtype=object),
+            return_inverse=True)
+        self.__name_codes_by_name = {__name: __code
+                                     for __code, __name in enumerate(self.__name_table)}
+
+        # Ingredients : meal i uses __ingredient_codes[__indptr[i]:__indptr[i + 1]]
+        __ingredient_lists = [__meal.get_mandatory_ingredients() for __meal in self.__meals]
+        self.__indptr = numpy.zeros(__count + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.fromiter((len(__ingredients) for __ingredients in __ingredient_lists),
+                                    dtype=numpy.int64, count=__count),
+                     out=self.__indptr[1:])
+        self.__ingredient_table, __ingredient_codes = numpy.unique(
+            numpy.array([__ingredient for __ingredients in __ingredient_lists
+                         for __ingredient in __ingredients], dtype=object),
+            return_inverse=True)
+        self.__ingredient_codes = __ingredient_codes.astype(numpy.int32)
+        self.__ingredient_codes_by_name = {__ingredient: __code for __code, __ingredient
+                                           in enumerate(self.__ingredient_table)}
+        # Row (meal index) of every ingredient code
+        self.__ingredient_rows = numpy.repeat(numpy.arange(__count, dtype=numpy.int64),
+                                              numpy.diff(self.__indptr))
+
+    def get_meals(self, _mask):
+        """
+        Meals selected by _mask, in catalogue order
+        :param _mask:
+        :type _mask:
+        :return:
+        :rtype: list
+        """
+        return [self.__meals[__index] for __index in numpy.flatnonzero(_mask)]
+
+    def get_meals_by_name_order(self, _mask):
+        """
+        Meals selected by _mask, sorted by name (catalogue order for equal names)
+        :param _mask:
+        :type _mask:
+        :return:
+        :rtype: list
+        """
+        __indexes = numpy.flatnonzero(_mask)
+        __indexes = __indexes[numpy.argsort(self.__name_codes[__indexes], kind='stable')]
+        return [self.__meals[__index] for __index in __indexes]
+
+    @staticmethod
+    def get_table_mask(_codes_by_value, _values):
+        """
+        Mask over an interned table selecting _values
+        (dict lookups : numpy.isin is very slow on object arrays)
+        :param _codes_by_value:
+        :type _codes_by_value:
+        :param _values:
+        :type _values:
+        :return:
+        :rtype:
+        """
+        __is_selected = numpy.zeros(len(_codes_by_value), dtype=bool)
+        __codes = [_codes_by_value[__value] for __value in _values if __value in _codes_by_value]
+        __is_selected[numpy.array(__codes, dtype=numpy.int64)] = True
+        return __is_selected
+
+    def get_ingredient_mask(self, _ingredients):
+        """
+        Meals using at least one of _ingredients
+        :param _ingredients:
+        :type _ingredients:
+        :return:
+        :rtype:
+        """
+        __is_selected = self.get_table_mask(self.__ingredient_codes_by_name, _ingredients)
+        __rows = self.__ingredient_rows[__is_selected[self.__ingredient_codes]]
+        return numpy.bincount(__rows, minlength=len(self.__meals)).astype(bool)
+
+    def get_name_mask(self, _names):
+        """
+        Meals named after one of _names
+        :param _names:
+        :type _names:
+        :return:
+        :rtype:
+        """
+        __is_selected = self.get_table_mask(self.__name_codes_by_name, _names)
+        return __is_selected[self.__name_codes]
@@ -3,6 +3,7 @@ Meal for a week : configuration class
 """
 import logging
 import sys
+from meals_for_a_week.profiling import Profiler # noqa
 
 
 # Configuration class
@@ -23,6 +24,8 @@ class Configuration:
         self._meal_types = ['VEGGIE', 'SPECIAL', 'NORMAL']
         # Init log
         self._logger = self.init_log()
+        # Stage timings and counters, recorded once enabled
+        self._profiler = Profiler()
 
     def enable_verbose(self):
         """
@@ -54,6 +57,12 @@ class Configuration:
         """
         self._leftover_mode = True
 
+    def enable_profile(self):
+        """
+        Enable profiling (stage timings and counters)
+        """
+        self._profiler.enable()
+
     def is_verbose(self):
         """
         Return if verbose mode is enable
@@ -94,6 +103,14 @@ class Configuration:
         """
         return self._meal_types
 
+    def get_profiler(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self._profiler
+
     # Logging
     @staticmethod
     def init_log():
@@ -123,26 +140,62 @@ class Configuration:
         """
         self._logger.setLevel('INFO')
 
-    def debug_log(self, message):
+    def set_log_stream(self, _stream):
+        """
+        Write log messages to _stream instead of stdout
+        :param _stream:
+        :type _stream:
+        """
+        for __handler in self._logger.handlers:
+            if isinstance(__handler, logging.StreamHandler):
+                __handler.setStream(_stream)
+
+    def is_debug_log(self):
+        """
+        Return if DEBUG messages are logged : guard for messages costly to build
+        :return:
+        :rtype: bool
+        """
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+    def is_verbose_log(self):
+        """
+        Return if INFO messages are logged
+        :return:
+        :rtype: bool
+        """
+        return self._logger.isEnabledFor(logging.INFO)
+
+    def log(self, level, message, *args):
+        """
+        Log "message" at "level", only building it when it is logged :
+        "message" is %-formatted with "args", or called (without argument) when it is a callable
+        """
+        if self._logger.isEnabledFor(level):
+            if callable(message):
+                message = message()
+            self._logger.log(level, message, *args)
+
+    def debug_log(self, message, *args):
         """
-        Log "message" when log level is DEBUG
+        Log "message" when log level is DEBUG (see log())
         """
-        self._logger.debug(message)
+        self.log(logging.DEBUG, message, *args)
 
-    def verbose_log(self, message):
+    def verbose_log(self, message, *args):
         """
-        Log "message" when log level is INFO
+        Log "message" when log level is INFO (see log())
         """
-        self._logger.info(message)
+        self.log(logging.INFO, message, *args)
 
-    def warn_log(self, message):
+    def warn_log(self, message, *args):
         """
-        Log "message" when log level is WARN
+        Log "message" when log level is WARN (see log())
         """
-        self._logger.warning(message)
+        self.log(logging.WARNING, message, *args)
 
-    def error_log(self, message):
+    def error_log(self, message, *args):
         """
-        Log "message" when log level is ERROR
+        Log "message" when log level is ERROR (see log())
         """
-        self._logger.error(message)
+        self.log(logging.ERROR, message, *args)
@@ -0,0 +1,327 @@
+"""
+Meal for a week : append-only history of accepted meal plans
+
+History file layout :
+- an optional block document (meals: [...]) as written by older versions
+- one single-line yaml document per accepted week, appended at the end of the file :
+  --- {date: 2021-03-01, meals: [{meal: lasagne}, {meal: pizza}], week: 9}
+"""
+import datetime
+import os
+import sys
+from meals_for_a_week.meals_for_a_week import Meal, MealCollection, intern_name # noqa
+from meals_for_a_week.yaml_io import YAMLError, load_yaml_string, dump_yaml_line # noqa
+
+
+# Every appended entry is a single line starting with this prefix
+ENTRY_PREFIX = '--- {'
+# Block size used when reading history file backwards
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+class HistoryDatabase:
+    """
+    HistoryDatabase class
+    """
+    def __init__(self, history_path, _configuration):
+        """
+
+        :param history_path:
+        :type history_path:
+        """
+        self.__history_path = history_path
+        self.__entries = []
+        # Entries added by add(), not written to history file yet
+        self.__pending_entries = []
+        self._configuration = _configuration
+        self.__meal_database = MealCollection(self._configuration)
+
+    def get_path(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self.__history_path
+
+    def load(self, _number_of_weeks=0):
+        """
+        Load function
+        A missing history file is an empty history : it is created by the first append
+        When _number_of_weeks is set, only the last _number_of_weeks weeks are read,
+        from the end of the file
+        :param _number_of_weeks:
+        :type _number_of_weeks:
+        """
+        if _number_of_weeks > 0:
+            self.load_tail(_number_of_weeks)
+            return
+
+        try:
+            with open(self.__history_path, encoding='utf-8') as __history_file:
+                __content = __history_file.read()
+        except FileNotFoundError:
+            __content = ''
+        except OSError as err:
+            self._configuration.error_log('OS error: %s', err)
+            sys.exit(os.EX_OSFILE)
+
+        __head_lines = []
+        __entry_lines = []
+        for __line in __content.splitlines():
+            if __line.startswith(ENTRY_PREFIX):
+                __entry_lines.append(__line)
+            elif not __entry_lines:
+                __head_lines.append(__line)
+            elif __line.strip():
+                self._configuration.warn_log('Ignoring unexpected history line: %s', __line)
+
+        self.__entries = []
+        __head = load_yaml_string('\n'.join(__head_lines)) if __head_lines else None
+        if __head and "meals" in __head:
+            self.__entries.append({'meals': __head["meals"]})
+
+        for __line in __entry_lines:
+            __entry = self.parse_entry(__line)
+            if __entry:
+                self.__entries.append(__entry)
+
+    def load_tail(self, _number_of_weeks):
+        """
+        Load the last _number_of_weeks dated entries, reading history file backwards
+        The whole file is only read when history has fewer entries than requested
+        :param _number_of_weeks:
+        :type _number_of_weeks:
+        """
+        __entries = []
+        __number_of_weeks = 0
+        try:
+            with open(self.__history_path, 'rb') as __history_file:
+                for __line_start, __line in self.reverse_lines(__history_file):
+                    if __line.startswith(ENTRY_PREFIX.encode('utf-8')):
+                        __entry = self.parse_entry(__line.decode('utf-8'))
+                        if not __entry:
+                            continue
+                        __entries.append(__entry)
+                        if "date" not in __entry:
+                            # Undated entries come from old block history : nothing older
+                            break
+                        __number_of_weeks += 1
+                        if __number_of_weeks >= _number_of_weeks:
+                            break
+                    elif __line.strip():
+                        # Reached old block document : read it as a whole
+                        __history_file.seek(0)
+                        __head = load_yaml_string(
+                            __history_file.read(__line_start + len(__line)).decode('utf-8'))
+                        if __head and "meals" in __head:
+                            __entries.append({'meals': __head["meals"]})
+                        break
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            self._configuration.error_log('OS error: %s', err)
+            sys.exit(os.EX_OSFILE)
+
+        __entries.reverse()
+        self.__entries = __entries
+
+    @staticmethod
+    def reverse_lines(_file):
+        """
+        Yield (offset, line) tuples of a binary file, from its last line to its first one
+        :param _file:
+        :type _file:
+        """
+        _file.seek(0, os.SEEK_END)
+        __position = _file.tell()
+        __buffer = b''
+        while __position > 0:
+            __read_size = min(TAIL_BLOCK_SIZE, __position)
+            __position -= __read_size
+            _file.seek(__position)
+            __lines = (_file.read(__read_size) + __buffer).split(b'\n')
+            # First line may be incomplete : keep it for next block
+            __buffer = __lines.pop(0)
+            __line_start = __position + len(__buffer) + 1
+            __line_starts = []
+            for __line in __lines:
+                __line_starts.append(__line_start)
+                __line_start += len(__line) + 1
+            for __line_start, __line in zip(reversed(__line_starts), reversed(__lines)):
+                yield __line_start, __line
+        yield 0, __buffer
+
+    def parse_entry(self, _line):
+        """
+        Parse an appended history entry, None if it is invalid (ie : truncated by a crash)
+        :param _line:
+        :type _line:
+        :return:
+        :rtype:
+        """
+        try:
+            __entry = load_yaml_string(_line)
+        except YAMLError:
+            __entry = None
+        if not isinstance(__entry, dict) or "meals" not in __entry:
+            self._configuration.warn_log('Ignoring invalid history entry: %s', _line)
+            return None
+        return __entry
+
+    def build(self):
+        """
+        Build meal collection from history entries, oldest first
+        """
+        self.__meal_database = MealCollection(self._configuration)
+        for __entry in self.__entries:
+            self.__add_entry_meals(__entry)
+
+    def __add_entry_meals(self, _entry):
+        """
+
+        :param _entry:
+        :type _entry:
+        """
+        for __meal_record in _entry["meals"] or []:
+            if "meal" in __meal_record:
+                self.__meal_database.add(Meal(intern_name(str(__meal_record["meal"]))))
+
+    def get(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self.__meal_database
+
+    def get_recent_meal_names(self, _number_of_weeks):
+        """
+        Names of meals planned over the last _number_of_weeks weeks
+        Undated entries (old block history) count as 7 meals per week
+        :param _number_of_weeks:
+        :type _number_of_weeks:
+        :return:
+        :rtype: frozenset
+        """
+        __meal_names = set()
+        __weeks_left = _number_of_weeks
+        for __entry in reversed(self.__entries):
+            if __weeks_left <= 0:
+                break
+            __meal_records = [__meal_record for __meal_record in __entry["meals"] or []
+                              if "meal" in __meal_record]
+            if "date" in __entry:
+                __weeks_left -= 1
+            else:
+                __meal_records = __meal_records[-__weeks_left * 7:]
+                __weeks_left = 0
+            __meal_names.update(str(__meal_record["meal"]).lower()
+                                for __meal_record in __meal_records)
+        return frozenset(__meal_names)
+
+    def get_entries(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self.__entries
+
+    @staticmethod
+    def build_entry(_meals, _date):
+        """
+        Build a history entry for a week
+        :param _meals:
+        :type _meals:
+        :param _date:
+        :type _date:
+        :return:
+        :rtype:
+        """
+        return {'date': _date,
+                'week': _date.isocalendar()[1],
+                'meals': [{'meal': str(__meal.get())} for __meal in _meals]}
+
+    def append(self, _meals, _date=None):
+        """
+        Append a week of meals at the end of history file
+        :param _meals:
+        :type _meals:
+        :param _date:
+        :type _date:
+        """
+        self.add(_meals, _date)
+        self.commit()
+
+    def add(self, _meals, _date=None):
+        """
+        Add a week of meals to history, in memory only until commit()
+        (next weeks can be planned against it without writing history file)
+        :param _meals:
+        :type _meals:
+        :param _date:
+        :type _date:
+        """
+        __entry = self.build_entry(_meals, _date if _date else datetime.date.today())
+        self.__entries.append(__entry)
+        self.__add_entry_meals(__entry)
+        self.__pending_entries.append(__entry)
+
+    def commit(self):
+        """
+        Write weeks added since last commit at the end of history file
+        Entries are written with a single write() on a file opened in append mode
+        then synced, so that history is never rewritten nor truncated
+        """
+        if not self.__pending_entries:
+            return
+        __data = ''.join(dump_yaml_line(__entry)
+                         for __entry in self.__pending_entries).encode('utf-8')
+
+        try:
+            __file_descriptor = os.open(self.__history_path,
+                                        os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        except OSError as err:
+            self._configuration.error_log('OS error: %s', err)
+            sys.exit(os.EX_OSFILE)
+        try:
+            # Previous content (ie : hand-written history) may lack a final new line
+            __size = os.fstat(__file_descriptor).st_size
+            if __size and os.pread(__file_descriptor, 1, __size - 1) != b'\n':
+                __data = b'\n' + __data
+            os.write(__file_descriptor, __data)
+            os.fsync(__file_descriptor)
+        except OSError as err:
+            self._configuration.error_log('OS error: %s', err)
+            sys.exit(os.EX_OSFILE)
+        finally:
+            os.close(__file_descriptor)
+
+        self.__pending_entries = []
+
+    def compact(self, _keep_weeks=0):
+        """
+        Rewrite history file with one line per entry, keeping the last _keep_weeks entries
+        (all entries if _keep_weeks is 0). Old block document becomes a single undated entry.
+        The new file replaces the old one atomically.
+        :param _keep_weeks:
+        :type _keep_weeks:
+        """
+        __entries = self.__entries[-_keep_weeks:] if _keep_weeks > 0 else self.__entries
+        __temporary_path = self.__history_path + '.tmp'
+        try:
+            with open(__temporary_path, 'w', encoding='utf-8') as __history_file:
+                for __entry in __entries:
+                    __history_file.write(dump_yaml_line(__entry))
+                __history_file.flush()
+                os.fsync(__history_file.fileno())
+            os.replace(__temporary_path, self.__history_path)
+        except OSError as err:
+            self._configuration.error_log('OS error: %s', err)
+            sys.exit(os.EX_OSFILE)
+        self.__pending_entries = []
+
+        self._configuration.verbose_log('History compacted: %d entries kept out of %d',
+                                        len(__entries), len(self.__entries))
+        self.__entries = list(__entries)
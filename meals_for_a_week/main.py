@@ -3,11 +3,17 @@ Meal for a week : main function
 """
 
 import argparse
+import atexit
+import datetime
 import locale
 import os
 import sys
-from meals_for_a_week.configuration import Configuration # noqa
-from meals_for_a_week.meals_for_a_week import MealDatabase, SeasonalDatabase, MealGenerator # noqa
+
+# pylint: disable=import-outside-toplevel
+# Application modules (yaml, logging, multiprocessing, asyncio...) are imported by main()
+# once arguments are parsed, and only on the code paths needing them :
+# --help and argument errors start without loading them,
+# --compact-history only loads the history database (yaml, logging), not the meal databases
 
 
 # Define constants
@@ -15,6 +21,7 @@ DEFAULT_CONFIG_FILE_PATH = 'database.yaml'
 DEFAULT_SEASONAL_FILE_PATH = 'seasonal.yaml'
 DEFAULT_HISTORY_PERIOD = 1
 DEFAULT_HISTORY_FILE_PATH = 'history.yaml'
+DEFAULT_PLAN_CACHE_SIZE = 64
 
 
 def parse_args():
@@ -38,7 +45,51 @@ def parse_args():
                         default=DEFAULT_HISTORY_PERIOD,
                         help='do not include meals already done over the last x weeks', type=int)
     parser.add_argument('--history', default=None, help='path to history file')
+    parser.add_argument('--sqlite', default=None, metavar='PATH',
+                        help='read meals, seasonal vegetables and history from SQLite file PATH '
+                             '(see --import-sqlite) instead of yaml files ; --batch and --serve '
+                             'still read history from --history')
+    parser.add_argument('--import-sqlite', default=None, metavar='PATH',
+                        help='import config, seasonal and history yaml files into SQLite file '
+                             'PATH (replacing its content), then exit')
+    parser.add_argument('--compact-history', default=None, nargs='?', const=0, type=int,
+                        metavar='WEEKS',
+                        help='rewrite history file compactly, keeping only the last WEEKS weeks '
+                             '(all weeks by default), then exit')
+    parser.add_argument('--weeks', default=1, type=int,
+                        help='plan WEEKS consecutive weeks (leftovers are used the first week) ; '
+                             'as a single week, they are saved to history and kept apart '
+                             'only when --history-meals is above 0')
     parser.add_argument('-p', '--pretend', default=False, action="store_true")
+    parser.add_argument('--batch', default=None, metavar='PLANS',
+                        help='generate every plan listed in PLANS yaml file as JSON lines '
+                             '(command line options are defaults for each plan)')
+    parser.add_argument('--serve', default=None, metavar='ADDRESS',
+                        help='serve meal plans over HTTP on ADDRESS (HOST:PORT or unix:PATH) '
+                             'instead of generating a single list')
+    parser.add_argument('-j', '--jobs', default=1, type=int,
+                        help='number of worker processes for --batch')
+    parser.add_argument('--solver', default=False, action="store_true",
+                        help='solve every constraint at once (at most one meal per group, '
+                             'every leftover used) instead of drawing meals at random')
+    parser.add_argument('--seed', default=None, type=int,
+                        help='random seed : meal lists are reproducible for a given seed')
+    parser.add_argument('--plan-cache', default=None, metavar='DIR',
+                        help='reuse plans generated with a seed (with --pretend, --batch or '
+                             '--serve) : plans are stored in DIR')
+    parser.add_argument('--plan-cache-size', default=DEFAULT_PLAN_CACHE_SIZE, type=int,
+                        metavar='MB', help='size limit of plan cache directory, in MB')
+    parser.add_argument('--stream', default=False, action="store_true",
+                        help='parse config file meal by meal (lower peak memory for very large '
+                             'files)')
+    parser.add_argument('--no-snapshot', default=False, action="store_true",
+                        help='do not read or write compiled database snapshots')
+    parser.add_argument('--columnar', default=False, action="store_true",
+                        help='filter database with NumPy arrays (for very large databases)')
+    parser.add_argument('--profile', default=None, nargs='?', const='table',
+                        choices=['table', 'json'],
+                        help='print stage timings and counters on stderr when exiting '
+                             '(--batch -j 1 to include plan generation)')
 
     args = parser.parse_args()
     return args
@@ -66,6 +117,13 @@ def set_configuration(_arguments, _configuration):
     if _arguments.pretend:
         _configuration.enable_pretend_only()
 
+    if _arguments.batch:
+        # stdout is the JSON lines stream of generated plans
+        _configuration.set_log_stream(sys.stderr)
+
+    if _arguments.profile:
+        _configuration.enable_profile()
+
 
 def get_yaml_file(file_path, default_file_path):
     """
@@ -101,9 +159,33 @@ def display_results(meal_planning):
     :type meal_planning:
     """
     for meal in meal_planning.get():
-        print('Plat : ' + meal.get()
-              + ' (veggie : ' + str(meal.is_veggie())
-              + ' ; special : ' + str(meal.is_special()) + ')')
+        display_meal(meal.get(), meal.is_veggie(), meal.is_special())
+
+
+def display_meal_records(meal_records):
+    """
+    Display meals of a cached plan
+    :param meal_records:
+    :type meal_records:
+    """
+    for meal_record in meal_records:
+        display_meal(meal_record['meal'], meal_record['is_veggie_compatible'],
+                     meal_record['is_special'])
+
+
+def display_meal(name, is_veggie, is_special):
+    """
+
+    :param name:
+    :type name:
+    :param is_veggie:
+    :type is_veggie:
+    :param is_special:
+    :type is_special:
+    """
+    print('Plat : ' + name
+          + ' (veggie : ' + str(is_veggie)
+          + ' ; special : ' + str(is_special) + ')')
 
 
 def check_user_input(_configuration):
@@ -135,8 +217,196 @@ def save_to_history(meal_planning, history_database):
     :param history_database:
     :type history_database:
     """
-    history_database.extend(meal_planning.get())
-    history_database.dump_to_yaml_file()
+    history_database.append(meal_planning.get())
+
+
+def print_profile(_configuration, _format):
+    """
+    Print profiler report on stderr
+    :param _configuration:
+    :type _configuration:
+    :param _format: 'table' or 'json'
+    :type _format:
+    """
+    __profiler = _configuration.get_profiler()
+    if _format == 'json':
+        print(__profiler.format_json(), file=sys.stderr)
+    else:
+        print(__profiler.format_table(), file=sys.stderr)
+
+
+def get_database_classes(use_sqlite):
+    """
+    Meal, seasonal and history database classes of the storage backend
+    :param use_sqlite: SQLite file instead of yaml files
+    :type use_sqlite:
+    :return: (meal database class, seasonal database class, history database class)
+    :rtype: tuple
+    """
+    if use_sqlite:
+        from meals_for_a_week.sqlite_store import SQLiteMealDatabase, SQLiteSeasonalDatabase, \
+            SQLiteHistoryDatabase # noqa
+        return SQLiteMealDatabase, SQLiteSeasonalDatabase, SQLiteHistoryDatabase
+
+    from meals_for_a_week.meals_for_a_week import MealDatabase, SeasonalDatabase # noqa
+    from meals_for_a_week.history import HistoryDatabase # noqa
+    return MealDatabase, SeasonalDatabase, HistoryDatabase
+
+
+def compact_history(history_path, keep_weeks, _configuration, history_database_class):
+    """
+    Compact history file
+    :param history_path:
+    :type history_path:
+    :param keep_weeks:
+    :type keep_weeks:
+    :param _configuration:
+    :type _configuration:
+    :param history_database_class: HistoryDatabase or SQLiteHistoryDatabase
+    :type history_database_class:
+    """
+    if not history_path:
+        _configuration.error_log('Cannot find history file')
+        sys.exit(os.EX_NOINPUT)
+
+    history_database = history_database_class(history_path, _configuration)
+    history_database.load()
+    history_database.compact(keep_weeks)
+
+
+def import_sqlite(sqlite_path, database_path, seasonal_path, history_path, _configuration):
+    """
+    Import yaml files into SQLite file
+    :param sqlite_path:
+    :type sqlite_path:
+    :param database_path:
+    :type database_path:
+    :param seasonal_path:
+    :type seasonal_path:
+    :param history_path:
+    :type history_path:
+    :param _configuration:
+    :type _configuration:
+    """
+    if not database_path:
+        _configuration.error_log('Cannot find config file')
+        sys.exit(os.EX_NOINPUT)
+
+    from meals_for_a_week.sqlite_store import import_yaml_files # noqa
+
+    import_yaml_files(sqlite_path, database_path, seasonal_path, history_path, _configuration)
+
+
+def choose_meal_plan(_configuration, meal_generator_class, meal_collection, settings, leftovers,
+                     random_generator):
+    """
+    Generate and display meal lists from meal_collection until one is accepted
+    (the first one in pretend mode)
+    :param _configuration:
+    :type _configuration:
+    :param meal_generator_class: MealGenerator or PlanSolver
+    :type meal_generator_class:
+    :param meal_collection: filtered database
+    :type meal_collection:
+    :param settings: number of meals, veggie meals and special meals
+    :type settings:
+    :param leftovers:
+    :type leftovers:
+    :param random_generator:
+    :type random_generator:
+    :return: accepted meal list
+    :rtype: MealCollection
+    """
+    from meals_for_a_week.meals_for_a_week import NotEnoughMealsError # noqa
+
+    while True:
+
+        # Init meal generator
+        # Each attempt draws from its own copy-on-write view of the database
+        meal_generator = meal_generator_class(_configuration, meal_collection.get_view(),
+                                              settings['meals'], random_generator)
+        if settings['veggie_meals'] > 0:
+            meal_generator.set_veggie_limit(settings['veggie_meals'])
+        if settings['special_meals'] > 0:
+            meal_generator.set_special_limit(settings['special_meals'])
+
+        if meal_generator.is_config_valid():
+            _configuration.verbose_log('Config is valid')
+        else:
+            _configuration.error_log('Config is invalid')
+            sys.exit(os.EX_NOINPUT)
+
+        try:
+            meal_generator.generate(leftovers)
+        except NotEnoughMealsError as err:
+            _configuration.error_log(str(err))
+            sys.exit(os.EX_NOINPUT)
+
+        meal_planning = meal_generator.get()
+
+        display_results(meal_planning)
+
+        if _configuration.is_pretend_only() or check_user_input(_configuration):
+            return meal_planning
+
+
+def plan_weeks(_configuration, meal_generator_class, database, seasonal_database,
+               history_database, number_of_history_meals, number_of_weeks, settings, leftovers,
+               random_generator):
+    """
+    Plan number_of_weeks consecutive weeks, starting today, in a single run
+    Each accepted week is added to history in memory, so that next weeks are filtered against it,
+    and seasonal vegetables follow the month of each week.
+    History file is only written once every week is accepted (never in pretend mode).
+    :param _configuration:
+    :type _configuration:
+    :param meal_generator_class:
+    :type meal_generator_class:
+    :param database: built MealDatabase
+    :type database:
+    :param seasonal_database: built SeasonalDatabase, None without seasonal filtering
+    :type seasonal_database:
+    :param history_database: loaded HistoryDatabase, None without history (--history-meals 0) :
+    weeks are then neither filtered against each other nor saved, as a single week
+    :type history_database:
+    :param number_of_history_meals:
+    :type number_of_history_meals:
+    :param number_of_weeks:
+    :type number_of_weeks:
+    :param settings:
+    :type settings:
+    :param leftovers: leftovers, used by the first week only
+    :type leftovers:
+    :param random_generator:
+    :type random_generator:
+    """
+    profiler = _configuration.get_profiler()
+    # Month -> database view filtered by season, shared by the weeks of that month
+    seasonal_views = {}
+    week_date = datetime.date.today()
+    for week in range(number_of_weeks):
+        if week_date.month not in seasonal_views:
+            seasonal_views[week_date.month] = database.get().get_view()
+            if seasonal_database:
+                database.filter(seasonal_database, None, 0, seasonal_views[week_date.month],
+                                week_date)
+        week_view = seasonal_views[week_date.month].get_view()
+        if number_of_history_meals > 0:
+            database.filter(None, history_database, number_of_history_meals, week_view)
+        if week > 0:
+            week_view.set_leftover_mode(False)
+
+        print('Week of ' + week_date.isoformat())
+        with profiler.stage('generate.week'):
+            meal_planning = choose_meal_plan(_configuration, meal_generator_class, week_view,
+                                             settings, leftovers if week == 0 else None,
+                                             random_generator)
+        if history_database:
+            history_database.add(meal_planning.get(), week_date)
+        week_date += datetime.timedelta(weeks=1)
+
+    if not _configuration.is_pretend_only() and history_database:
+        history_database.commit()
 
 
 # This function is called with two arguments:
@@ -157,22 +427,42 @@ def main():
     """
     Main function
     """
-    # Global configuration
-    application_config = Configuration()
-
     # Argument management
     args = parse_args()
 
+    # Global configuration
+    from meals_for_a_week.configuration import Configuration # noqa
+    application_config = Configuration()
+
     # Define configuration
     set_configuration(args, application_config)
-
-    database_path = get_yaml_file(args.config, DEFAULT_CONFIG_FILE_PATH)
+    profiler = application_config.get_profiler()
+    if args.profile:
+        # Registered now so that the report is printed on every exit path
+        atexit.register(print_profile, application_config, args.profile)
+
+    if args.compact_history is not None:
+        compact_history(args.sqlite or get_yaml_file(args.history, DEFAULT_HISTORY_FILE_PATH),
+                        args.compact_history, application_config,
+                        get_database_classes(args.sqlite)[2])
+        return
+
+    if args.import_sqlite:
+        import_sqlite(args.import_sqlite, get_yaml_file(args.config, DEFAULT_CONFIG_FILE_PATH),
+                      get_yaml_file(args.seasonal, DEFAULT_SEASONAL_FILE_PATH),
+                      get_yaml_file(args.history, DEFAULT_HISTORY_FILE_PATH), application_config)
+        return
+
+    if args.sqlite:
+        # Meals and seasonal vegetables are read from the SQLite file
+        database_path = seasonal_path = args.sqlite
+    else:
+        database_path = get_yaml_file(args.config, DEFAULT_CONFIG_FILE_PATH)
+        seasonal_path = get_yaml_file(args.seasonal, DEFAULT_SEASONAL_FILE_PATH)
     if not database_path:
         application_config.error_log('Cannot find config file')
         sys.exit(os.EX_NOINPUT)
 
-    seasonal_path = get_yaml_file(args.seasonal, DEFAULT_SEASONAL_FILE_PATH)
-
     # Number of meals
     number_of_meals = args.meals
     number_of_veggie_meals = args.veggie_meals
@@ -184,14 +474,17 @@ def main():
 
     # History
     number_of_history_meals = args.history_meals
-    history_path = get_yaml_file(args.history, DEFAULT_HISTORY_FILE_PATH)
+    if args.sqlite and not (args.batch or args.serve):
+        history_path = args.sqlite
+    else:
+        history_path = get_yaml_file(args.history, DEFAULT_HISTORY_FILE_PATH)
 
     # Leftovers
     if args.leftovers:
         leftovers = [leftover.lower() for leftover in args.leftovers]
         application_config.enable_leftover_mode()
         # Debug
-        application_config.debug_log('List of leftovers : ' + str(leftovers))
+        application_config.debug_log('List of leftovers : %s', leftovers)
 
     else:
         leftovers = None
@@ -199,65 +492,134 @@ def main():
     # Set locale to system locale
     locale.setlocale(locale.LC_ALL, '')
 
+    plan_cache = None
+    if args.plan_cache:
+        from meals_for_a_week.plan_cache import PlanCache, get_meal_records # noqa
+        plan_cache = PlanCache(application_config, cache_dir=args.plan_cache,
+                               disk_size=args.plan_cache_size * 1024 * 1024)
+
+    # A seeded plan which is not prompted for is looked up before loading anything
+    plan_key = None
+    history_database = None
+    if plan_cache and args.seed is not None and args.pretend and args.weeks == 1 \
+            and not (args.batch or args.serve):
+        history_meal_names = None
+        if history_path and number_of_history_meals > 0:
+            history_database = get_database_classes(args.sqlite)[2](history_path,
+                                                                    application_config)
+            with profiler.stage('load.history'):
+                history_database.load(number_of_history_meals)
+            history_meal_names = history_database.get_recent_meal_names(number_of_history_meals)
+        plan_key = plan_cache.get_key(database_path, seasonal_path, history_meal_names,
+                                      {'meals': number_of_meals,
+                                       'veggie_meals': number_of_veggie_meals,
+                                       'special_meals': number_of_special_meals,
+                                       'leftovers': leftovers},
+                                      args.seed, 'solver' if args.solver else 'random')
+        meal_records = plan_cache.get(plan_key)
+        if meal_records is not None:
+            display_meal_records(meal_records)
+            return
+
+    meal_database_class, seasonal_database_class, history_database_class = \
+        get_database_classes(args.sqlite)
+
     # Init meal database
-    database = MealDatabase(database_path, application_config)
+    database = meal_database_class(database_path, application_config)
+    if not args.no_snapshot:
+        database.enable_snapshot()
+    if args.columnar:
+        database.enable_columnar()
+    if args.stream:
+        database.enable_streaming()
+    if args.serve:
+        # Follow changes of database file while serving
+        database.enable_reload()
 
     # Load content from yaml
-    database.load()
+    with profiler.stage('load.database'):
+        database.load()
 
+    seasonal_database = None
     if seasonal_path:
         # Init seasonal database
-        seasonal_database = SeasonalDatabase(seasonal_path, application_config)
+        seasonal_database = seasonal_database_class(seasonal_path, application_config)
+        if not args.no_snapshot:
+            seasonal_database.enable_snapshot()
 
         # Load content from yaml
-        seasonal_database.load()
-
-    if history_path and number_of_history_meals > 0:
-        history_database = MealDatabase(history_path, application_config)
-        history_database.load()
-    else:
-        history_database = None
+        with profiler.stage('load.seasonal'):
+            seasonal_database.load()
 
-    final_meal_list = False
-    while not final_meal_list:
-
-        # Build python object
+    # Build python objects once : they are not modified by meal generation
+    with profiler.stage('build.database'):
         database.build()
 
-        if seasonal_database:
-            # Build python object from it
+    if seasonal_database:
+        # Build python object from it
+        with profiler.stage('build.seasonal'):
             seasonal_database.build()
 
-        if history_database:
+    if args.batch:
+        from meals_for_a_week.batch import run_batch # noqa
+        run_batch(args.batch, application_config, database, seasonal_database,
+                  {'meals': number_of_meals,
+                   'veggie_meals': number_of_veggie_meals,
+                   'special_meals': number_of_special_meals,
+                   'leftovers': leftovers,
+                   'history': history_path,
+                   'history_meals': number_of_history_meals},
+                  args.seed, args.jobs, plan_cache)
+        return
+
+    if args.serve:
+        from meals_for_a_week.server import run_server # noqa
+        run_server(args.serve, application_config, database, seasonal_database, history_path,
+                   number_of_history_meals,
+                   {'meals': number_of_meals,
+                    'veggie_meals': number_of_veggie_meals,
+                    'special_meals': number_of_special_meals,
+                    'leftovers': leftovers},
+                   args.seed, plan_cache)
+        return
+
+    import random
+    from meals_for_a_week.meals_for_a_week import MealGenerator, NotEnoughMealsError # noqa
+    meal_generator_class = MealGenerator
+    if args.solver:
+        from meals_for_a_week.solver import PlanSolver # noqa
+        meal_generator_class = PlanSolver
+
+    if history_database is None and history_path and number_of_history_meals > 0:
+        history_database = history_database_class(history_path, application_config)
+        with profiler.stage('load.history'):
+            history_database.load(number_of_history_meals)
+
+    if history_database:
+        with profiler.stage('build.history'):
             history_database.build()
 
-        # Filter database
-        if seasonal_database or (history_database and number_of_history_meals > 0):
-            database.filter(seasonal_database, history_database, number_of_history_meals)
+    # Random number generator for every draw : reproducible meal lists with --seed
+    random_generator = random.Random(args.seed)
+    settings = {'meals': number_of_meals,
+                'veggie_meals': number_of_veggie_meals,
+                'special_meals': number_of_special_meals}
 
-        # Init meal generator
-        meal_generator = MealGenerator(application_config, database.get(), number_of_meals)
-        if number_of_veggie_meals > 0:
-            meal_generator.set_veggie_limit(number_of_veggie_meals)
-        if number_of_special_meals > 0:
-            meal_generator.set_special_limit(number_of_special_meals)
+    if args.weeks > 1:
+        plan_weeks(application_config, meal_generator_class, database, seasonal_database,
+                   history_database, number_of_history_meals, args.weeks, settings, leftovers,
+                   random_generator)
+        return
 
-        if meal_generator.is_config_valid():
-            application_config.verbose_log('Config is valid')
-        else:
-            application_config.error_log('Config is invalid')
-            sys.exit(os.EX_NOINPUT)
+    # Filter database
+    if seasonal_database or (history_database and number_of_history_meals > 0):
+        database.filter(seasonal_database, history_database, number_of_history_meals)
 
-        meal_generator.generate(leftovers)
+    meal_planning = choose_meal_plan(application_config, meal_generator_class, database.get(),
+                                     settings, leftovers, random_generator)
 
-        meal_planning = meal_generator.get()
-
-        display_results(meal_planning)
+    if plan_key:
+        plan_cache.put(plan_key, get_meal_records(meal_planning.get()))
 
-        if not application_config.is_pretend_only():
-            final_meal_list = check_user_input(application_config)
-
-            if final_meal_list and history_database:
-                save_to_history(meal_planning, history_database)
-        else:
-            final_meal_list = True
+    if not application_config.is_pretend_only() and history_database:
+        save_to_history(meal_planning, history_database)
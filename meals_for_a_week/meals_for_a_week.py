@@ -1,11 +1,228 @@
 """
 Meal for a week : classes related to Meals and databases
 """
+import collections
 import datetime
 import os
+import pickle
 import random
 import sys
-import yaml
+from meals_for_a_week.snapshot import read_snapshot, write_snapshot, get_source_signature # noqa
+from meals_for_a_week.yaml_io import YAMLError, load_yaml_file, dump_yaml_file, \
+    load_yaml_string, read_text_file, split_sequence_items, iter_yaml_sequence # noqa
+
+
+class NotEnoughMealsError(Exception):
+    """
+    Raised when there are not enough candidate meals to generate a meal list
+    """
+
+
+def intern_name(_name):
+    """
+    Lowercase and intern a meal, ingredient or vegetable name :
+    equal names read from yaml files share a single string object
+    :param _name:
+    :type _name:
+    :return:
+    :rtype: str
+    """
+    return sys.intern(_name.lower())
+
+
+# MealPool class
+class MealPool:
+    """
+    MealPool class : unordered set of meals with O(1) add, remove and random pick
+    """
+    def __init__(self):
+        """
+        Init MealPool with empty __meals array and __positions map
+        """
+        self.__meals = []
+        self.__positions = {}
+
+    def add(self, _meal):
+        """
+        Add a Meal object to the pool (no-op if already present)
+        :param _meal:
+        :type _meal: object
+        """
+        if _meal not in self.__positions:
+            self.__positions[_meal] = len(self.__meals)
+            self.__meals.append(_meal)
+
+    def remove(self, _meal):
+        """
+        Remove a Meal object from the pool by swapping it with the last one
+        :param _meal:
+        :type _meal: object
+        """
+        __position = self.__positions.pop(_meal, None)
+        if __position is None:
+            return
+        __last_meal = self.__meals.pop()
+        if __last_meal is not _meal:
+            self.__meals[__position] = __last_meal
+            self.__positions[__last_meal] = __position
+
+    def contains(self, _meal):
+        """
+
+        :param _meal:
+        :return:
+        :rtype: bool
+        """
+        return _meal in self.__positions
+
+    def get_at(self, _position):
+        """
+
+        :param _position:
+        :return:
+        """
+        return self.__meals[_position]
+
+    def get_position(self, _meal):
+        """
+        Position of a meal in the pool, None if it is not part of the pool
+        :param _meal:
+        :return:
+        """
+        return self.__positions.get(_meal)
+
+    def get(self):
+        """
+
+        :return:
+        """
+        return self.__meals
+
+    def get_count(self):
+        """
+
+        :return:
+        """
+        return len(self.__meals)
+
+    def get_random(self, _random=random):
+        """
+        Get a random meal from the pool, None if the pool is empty
+        :param _random: random number generator (random.Random instance or random module)
+        :return:
+        """
+        __random_meal = None
+
+        if self.__meals:
+            __random_int = _random.randint(0, len(self.__meals) - 1)
+            __random_meal = self.__meals[__random_int]
+
+        return __random_meal
+
+
+# MealPoolView class
+class MealPoolView:
+    """
+    MealPoolView class : MealPool overlay leaving its base pool untouched
+    Meals removed or added through the view are recorded as a sparse permutation
+    of the base pool (position -> meal and meal -> position overrides),
+    so that add, remove and random pick stay O(1) without copying the base pool
+    """
+    def __init__(self, _base_pool):
+        """
+
+        :param _base_pool: MealPool or MealPoolView, must not change while the view is used
+        """
+        self.__base_pool = _base_pool
+        self.__count = _base_pool.get_count()
+        self.__meals = {}
+        self.__positions = {}
+
+    def add(self, _meal):
+        """
+        Add a Meal object to the view (no-op if already present)
+        :param _meal:
+        :type _meal: object
+        """
+        if self.contains(_meal):
+            return
+        self.__meals[self.__count] = _meal
+        self.__positions[_meal] = self.__count
+        self.__count += 1
+
+    def remove(self, _meal):
+        """
+        Remove a Meal object from the view by swapping it with the last one
+        :param _meal:
+        :type _meal: object
+        """
+        __position = self.get_position(_meal)
+        if __position is None:
+            return
+        __last_position = self.__count - 1
+        __last_meal = self.get_at(__last_position)
+        self.__meals[__position] = __last_meal
+        self.__positions[__last_meal] = __position
+        self.__positions[_meal] = None
+        self.__meals.pop(__last_position, None)
+        self.__count -= 1
+
+    def contains(self, _meal):
+        """
+
+        :param _meal:
+        :return:
+        :rtype: bool
+        """
+        return self.get_position(_meal) is not None
+
+    def get_at(self, _position):
+        """
+
+        :param _position:
+        :return:
+        """
+        if _position in self.__meals:
+            return self.__meals[_position]
+        return self.__base_pool.get_at(_position)
+
+    def get_position(self, _meal):
+        """
+        Position of a meal in the view, None if it is not part of the view
+        :param _meal:
+        :return:
+        """
+        if _meal in self.__positions:
+            return self.__positions[_meal]
+        return self.__base_pool.get_position(_meal)
+
+    def get(self):
+        """
+
+        :return:
+        """
+        return [self.get_at(__position) for __position in range(self.__count)]
+
+    def get_count(self):
+        """
+
+        :return:
+        """
+        return self.__count
+
+    def get_random(self, _random=random):
+        """
+        Get a random meal from the view, None if the view is empty
+        :param _random: random number generator (random.Random instance or random module)
+        :return:
+        """
+        __random_meal = None
+
+        if self.__count:
+            __random_int = _random.randint(0, self.__count - 1)
+            __random_meal = self.get_at(__random_int)
+
+        return __random_meal
 
 
 # MealCollection class
@@ -13,19 +230,85 @@ class MealCollection:
     """
     Meal class
     """
-    def __init__(self, _configuration):
+    # Candidate pools maintained by MealCollection
+    # NORMAL_LENIENT (leftover mode) holds every enabled meal
+    POOL_VEGGIE = 'VEGGIE'
+    POOL_SPECIAL = 'SPECIAL'
+    POOL_NORMAL_STRICT = 'NORMAL_STRICT'
+    POOL_NORMAL_LENIENT = 'NORMAL_LENIENT'
+
+    def __init__(self, _configuration, _random=None):
+        """
+        Init MealCollection with empty __meals array and empty candidate pools
+        :param _random: random number generator used for draws (random module if None)
+        """
+        # dict used as an insertion-ordered set : O(1) membership and removal
+        self.__meals = {}
+        self.__pools = {
+            self.POOL_VEGGIE: MealPool(),
+            self.POOL_SPECIAL: MealPool(),
+            self.POOL_NORMAL_STRICT: MealPool(),
+            self.POOL_NORMAL_LENIENT: MealPool(),
+        }
+        # ingredient -> meals inverted index, see build_ingredient_index()
+        self.__ingredient_index = None
+        # Meals enabled / disabled in this collection only, irrespective of their own flag
+        self.__enable_overrides = {}
+        # Leftover mode of this collection, None to follow configuration
+        self.__is_leftover_mode = None
+        # Collection this view was created from (see get_view()), None if not a view
+        self.__parent = None
+        # Meals removed from / added to the parent collection, for views
+        self.__removed_meals = set()
+        self.__added_meals = {}
+        # Whether Meal objects notify this collection when their flags change
+        self.__is_watching_meals = False
+        self.__random = _random if _random else random
+        self._configuration = _configuration
+
+    def watch_meals(self):
         """
-        Init MealCollection with empty __meals array
+        Register this collection to its meals (current and future ones),
+        so that Meal.enable / Meal.disable / Meal.set_* keep candidate pools up to date
         """
-        self.__meals = []
-        self._configuration = _configuration
+        self.__is_watching_meals = True
+        for __meal in self.__meals:
+            __meal.attach(self)
+
+    def get_view(self):
+        """
+        Get a cheap view of the collection
+        Adding, removing, enabling or disabling meals in the view leaves this collection
+        and Meal objects untouched : the view only records its own changes.
+        This collection must not be modified while views are in use.
+        :return:
+        :rtype: MealCollection
+        """
+        __view = MealCollection(self._configuration, self.__random)
+        __view.__parent = self
+        __view.__pools = {__pool_name: MealPoolView(__pool)
+                          for __pool_name, __pool in self.__pools.items()}
+        __view.__is_leftover_mode = self.__is_leftover_mode
+        return __view
 
     def add(self, _meal):
         """
         Add a Meal object to __meals array
         :type _meal: object
         """
-        self.__meals.append(_meal)
+        if self.has_meal(_meal):
+            return
+        if self.__parent is None:
+            self.__meals[_meal] = None
+        elif _meal in self.__removed_meals:
+            self.__removed_meals.discard(_meal)
+        else:
+            self.__added_meals[_meal] = None
+        if self.__is_watching_meals:
+            _meal.attach(self)
+        self.update_meal(_meal)
+        if self.__ingredient_index is not None:
+            self.__index_meal_ingredients(_meal)
 
     def extend(self, _meals):
         """
@@ -34,14 +317,158 @@ class MealCollection:
         :type _meals:
         :type _meal: object
         """
-        self.__meals.extend(_meals)
+        for __meal in _meals:
+            self.add(__meal)
 
     def remove_meal(self, _meal):
         """
 
         :param _meal:
         """
-        self.__meals.remove(_meal)
+        if self.__parent is None:
+            del self.__meals[_meal]
+        elif _meal in self.__added_meals:
+            del self.__added_meals[_meal]
+        else:
+            self.__removed_meals.add(_meal)
+        if self.__is_watching_meals:
+            _meal.detach(self)
+        for __pool_name in self.__pools:
+            self.__pools[__pool_name].remove(_meal)
+        if self.__ingredient_index is not None:
+            for __ingredient in _meal.get_mandatory_ingredients():
+                self.__ingredient_index[__ingredient].pop(_meal, None)
+
+    def enable_meal(self, _meal):
+        """
+        Enable a meal in this collection only (the Meal object itself is not modified)
+        :param _meal:
+        """
+        self.__set_enable_override(_meal, True)
+
+    def disable_meal(self, _meal):
+        """
+        Disable a meal in this collection only (the Meal object itself is not modified)
+        :param _meal:
+        """
+        self.__set_enable_override(_meal, False)
+
+    def __set_enable_override(self, _meal, _is_enable):
+        """
+
+        :param _meal:
+        :param _is_enable:
+        """
+        self.__enable_overrides[_meal] = _is_enable
+        if self.has_meal(_meal):
+            self.update_meal(_meal)
+
+    def is_meal_enable(self, _meal):
+        """
+        Return if meal is enabled, in this collection
+        :param _meal:
+        :return:
+        :rtype: bool
+        """
+        if _meal in self.__enable_overrides:
+            return self.__enable_overrides[_meal]
+        if self.__parent is not None:
+            return self.__parent.is_meal_enable(_meal)
+        return _meal.is_enable()
+
+    def set_random(self, _random):
+        """
+        Set random number generator used for draws
+        :param _random: random.Random instance
+        """
+        self.__random = _random
+
+    def get_random_generator(self):
+        """
+
+        :return:
+        :rtype: random.Random
+        """
+        return self.__random
+
+    def set_leftover_mode(self, _is_leftover_mode):
+        """
+        Set leftover mode for this collection, instead of the configuration one
+        :param _is_leftover_mode:
+        """
+        self.__is_leftover_mode = _is_leftover_mode
+
+    def is_leftover_mode(self):
+        """
+        Return if "normal" meals are drawn in leftover mode (including special meals)
+        :return:
+        :rtype: bool
+        """
+        if self.__is_leftover_mode is None:
+            return self._configuration.is_leftover_mode()
+        return self.__is_leftover_mode
+
+    def build_ingredient_index(self):
+        """
+        Build ingredient -> meals inverted index
+        Once built, it is kept up to date by add() and remove_meal()
+        """
+        self.__ingredient_index = {}
+        for __meal in self.get():
+            self.__index_meal_ingredients(__meal)
+
+    def __index_meal_ingredients(self, _meal):
+        """
+
+        :param _meal:
+        """
+        for __ingredient in _meal.get_mandatory_ingredients():
+            self.__ingredient_index.setdefault(__ingredient, {})[_meal] = None
+
+    def set_configuration(self, _configuration):
+        """
+        Set configuration (used after loading a collection from a snapshot)
+        :param _configuration:
+        """
+        self._configuration = _configuration
+
+    def __getstate__(self):
+        """
+        Configuration (and its logger) is not part of snapshots
+        :return:
+        """
+        __state = self.__dict__.copy()
+        __state['_configuration'] = None
+        __state['_MealCollection__random'] = None
+        return __state
+
+    def __setstate__(self, _state):
+        """
+
+        :param _state:
+        """
+        self.__dict__.update(_state)
+        self.__random = random
+
+    def update_meal(self, _meal):
+        """
+        Refresh candidate pools membership of a meal
+        Called by Meal objects when their flags change
+        :param _meal:
+        """
+        __is_enable = self.is_meal_enable(_meal)
+        __is_special = _meal.is_special()
+        __membership = {
+            self.POOL_VEGGIE: __is_enable and _meal.is_veggie() and not __is_special,
+            self.POOL_SPECIAL: __is_enable and __is_special,
+            self.POOL_NORMAL_STRICT: __is_enable and not __is_special,
+            self.POOL_NORMAL_LENIENT: __is_enable,
+        }
+        for __pool_name, __is_member in __membership.items():
+            if __is_member:
+                self.__pools[__pool_name].add(_meal)
+            else:
+                self.__pools[__pool_name].remove(_meal)
 
     # Get functions #
 
@@ -50,31 +477,46 @@ class MealCollection:
 
         :return:
         """
-        return self.__meals
+        if self.__parent is None:
+            return list(self.__meals)
+        return [__meal for __meal in self.__parent.get() if __meal not in self.__removed_meals] \
+            + list(self.__added_meals)
+
+    def has_meal(self, _meal):
+        """
+
+        :param _meal:
+        :return:
+        :rtype: bool
+        """
+        if self.__parent is None:
+            return _meal in self.__meals
+        if _meal in self.__added_meals:
+            return True
+        return _meal not in self.__removed_meals and self.__parent.has_meal(_meal)
+
+    def get_pool(self, _pool_name):
+        """
+
+        :param _pool_name:
+        :return:
+        :rtype: MealPool
+        """
+        return self.__pools[_pool_name]
 
     def get_veggie_meals(self):
         """
 
         :return:
         """
-        __veggie_meals = []
-        for __meal in self.__meals:
-            if __meal.is_veggie() \
-                    and not __meal.is_special() \
-                    and __meal.is_enable():
-                __veggie_meals.append(__meal)
-        return __veggie_meals
+        return list(self.__pools[self.POOL_VEGGIE].get())
 
     def get_special_meals(self):
         """
 
         :return:
         """
-        __special_meals = []
-        for __meal in self.__meals:
-            if __meal.is_special() and __meal.is_enable():
-                __special_meals.append(__meal)
-        return __special_meals
+        return list(self.__pools[self.POOL_SPECIAL].get())
 
     def get_normal_meals(self, strict_mode):
         """
@@ -84,24 +526,32 @@ class MealCollection:
         :type strict_mode
         :return:
         """
-        __normal_meals = []
-        for __meal in self.__meals:
-            if __meal.is_enable():
-                if strict_mode and not __meal.is_special():
-                    __normal_meals.append(__meal)
-                elif not strict_mode:
-                    __normal_meals.append(__meal)
-        return __normal_meals
+        if strict_mode:
+            return list(self.__pools[self.POOL_NORMAL_STRICT].get())
+        return list(self.__pools[self.POOL_NORMAL_LENIENT].get())
+
+    def get_meals_by_ingredient(self, _ingredient):
+        """
+        Get meals having _ingredient as mandatory ingredient
+        Views reuse their parent index unless they have their own
+        :param _ingredient:
+        :return:
+        """
+        if self.__ingredient_index is None and self.__parent is not None:
+            return [__meal for __meal in self.__parent.get_meals_by_ingredient(_ingredient)
+                    if __meal not in self.__removed_meals] \
+                + [__meal for __meal in self.__added_meals
+                   if _ingredient in __meal.get_mandatory_ingredients()]
+        if self.__ingredient_index is None:
+            self.build_ingredient_index()
+        return list(self.__ingredient_index.get(_ingredient, ()))
 
     def get_meals(self):
         """
         Get list of "normal" meals (excluding special meals but including veggie meals)
         :return:
         """
-        __meals = []
-        for __meal in self.__meals:
-            __meals.append(__meal.get())
-        return __meals
+        return [__meal.get() for __meal in self.get()]
 
     # Random functions #
     def get_random_veggie_meal(self):
@@ -109,59 +559,30 @@ class MealCollection:
         Get a random meal from get_normal_meals function
         :return:
         """
-        __meals = self.get_veggie_meals()
-        __random_meal = None
-
-        if __meals:
-            __random_int = random.randint(0, len(__meals) - 1)
-            __random_meal = __meals[__random_int]
-
-        return __random_meal
+        return self.__pools[self.POOL_VEGGIE].get_random(self.__random)
 
     def get_random_special_meal(self):
         """
 
         :return:
         """
-        __meals = self.get_special_meals()
-        __random_meal = None
-
-        if __meals:
-            __random_int = random.randint(0, len(__meals) - 1)
-            __random_meal = __meals[__random_int]
-
-        return __random_meal
+        return self.__pools[self.POOL_SPECIAL].get_random(self.__random)
 
     def get_random_normal_meal(self):
         """
 
         :return:
         """
-        if self._configuration.is_leftover_mode():
-            __meals = self.get_normal_meals(False)
-        else:
-            __meals = self.get_normal_meals(True)
-        __random_meal = None
-
-        if __meals:
-            __random_int = random.randint(0, len(__meals) - 1)
-            __random_meal = __meals[__random_int]
-
-        return __random_meal
+        if self.is_leftover_mode():
+            return self.__pools[self.POOL_NORMAL_LENIENT].get_random(self.__random)
+        return self.__pools[self.POOL_NORMAL_STRICT].get_random(self.__random)
 
     def get_random_meal(self):
         """
 
         :return:
         """
-        __meals = self.get_normal_meals(False)
-        __random_meal = None
-
-        if __meals:
-            __random_int = random.randint(0, len(__meals) - 1)
-            __random_meal = __meals[__random_int]
-
-        return __random_meal
+        return self.__pools[self.POOL_NORMAL_LENIENT].get_random(self.__random)
 
     def get_random_meal_by_type(self, _meal_type):
         """
@@ -182,27 +603,43 @@ class MealCollection:
             _meal = self.get_random_special_meal()
         return _meal
 
+    def pop_random_meal_by_type(self, _meal_type):
+        """
+        Draw a random meal of _meal_type and remove it from the collection
+        (one step of a partial Fisher-Yates shuffle over the candidate pool)
+        :param _meal_type:
+        :type _meal_type:
+        :return:
+        :rtype:
+        """
+        _meal = self.get_random_meal_by_type(_meal_type)
+        if _meal:
+            self.remove_meal(_meal)
+        return _meal
+
     # Count functions #
     def get_count_veggie_meals(self):
         """
 
         :return:
         """
-        return len(self.get_veggie_meals())
+        return self.__pools[self.POOL_VEGGIE].get_count()
 
     def get_count_special_meals(self):
         """
 
         :return:
         """
-        return len(self.get_special_meals())
+        return self.__pools[self.POOL_SPECIAL].get_count()
 
     def get_count_meal(self):
         """
 
         :return:
         """
-        return len(self.__meals)
+        if self.__parent is None:
+            return len(self.__meals)
+        return self.__parent.get_count_meal() - len(self.__removed_meals) + len(self.__added_meals)
 
     def get_count_by_meal_type(self, _meal_type):
         """
@@ -224,6 +661,29 @@ class MealCollection:
 
         return _count
 
+    def get_count_candidates_by_meal_type(self, _meal_type):
+        """
+        Number of meals get_random_meal_by_type can draw from
+        :param _meal_type:
+        :type _meal_type:
+        :return:
+        :rtype:
+        """
+        if _meal_type not in self._configuration.get_meal_types():
+            sys.exit(os.EX_SOFTWARE)
+        _count = 0
+        if _meal_type == 'NORMAL':
+            if self.is_leftover_mode():
+                _count = self.__pools[self.POOL_NORMAL_LENIENT].get_count()
+            else:
+                _count = self.__pools[self.POOL_NORMAL_STRICT].get_count()
+        elif _meal_type == 'VEGGIE':
+            _count = self.get_count_veggie_meals()
+        elif _meal_type == 'SPECIAL':
+            _count = self.get_count_special_meals()
+
+        return _count
+
     # Misc functions #
 
     def restrict_by_ingredients(self, _ingredients):
@@ -232,25 +692,34 @@ class MealCollection:
         :param _ingredients:
         :return:
         """
-        _restricted_meal_collection = MealCollection(self._configuration)
-        # Get shuffled / randomized meal list
-        for __meal in random.sample(self.__meals, len(self.__meals)):
+        _restricted_meal_collection = MealCollection(self._configuration, self.__random)
+        _restricted_meal_collection.set_leftover_mode(True)
+        # Only meals sharing at least one ingredient with leftovers are candidates
+        __candidates = {}
+        for _ingredient in _ingredients:
+            for __meal in self.get_meals_by_ingredient(_ingredient):
+                __candidates[__meal] = None
+        _ingredients = set(_ingredients)
+
+        # Get shuffled / randomized candidate list
+        for __meal in self.__random.sample(list(__candidates), len(__candidates)):
+            if not _ingredients:
+                break
             _meal_ingredients = __meal.get_mandatory_ingredients()
 
-            # Check if any ingredient in current meal is available in leftovers
-            if any(_ingredient in _meal_ingredients
-                   for _ingredient in _ingredients):
+            # Check if any ingredient in current meal is still available in leftovers
+            if not _ingredients.isdisjoint(_meal_ingredients):
                 # Enable meal irrespective of seasoning and history meals
                 # We want to use leftovers in any case
-                if not __meal.is_enable():
-                    __meal.enable()
+                if not self.is_meal_enable(__meal):
+                    self.enable_meal(__meal)
 
                 # Add meal to restricted collection
+                _restricted_meal_collection.enable_meal(__meal)
                 _restricted_meal_collection.add(__meal)
 
                 # Remove ingredients used in current meal from leftovers
-                _ingredients = [_ingredient for _ingredient in _ingredients
-                                if _ingredient not in _meal_ingredients]
+                _ingredients.difference_update(_meal_ingredients)
 
         return _restricted_meal_collection
 
@@ -259,16 +728,24 @@ class Meal:
     """
     Meal class
     """
+    # No per-instance __dict__ : large databases hold many Meal objects
+    __slots__ = ('__name', '__mandatory_ingredients', '__is_special', '__is_veggie_compatible',
+                 '__is_enable', '__group', '__collections')
+
     def __init__(self, name):
         """
 
         :param name:
         """
         self.__name = name
-        self.__mandatory_ingredients = []
+        self.__mandatory_ingredients = ()
         self.__is_special = False
         self.__is_veggie_compatible = False
         self.__is_enable = True
+        # Meals of a same group (ie : lasagne variants) are alike, None if not grouped
+        self.__group = None
+        # MealCollection objects indexing this meal
+        self.__collections = ()
 
     def get(self):
         """
@@ -301,6 +778,22 @@ class Meal:
         """
         return self.__is_enable
 
+    def get_group(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self.__group
+
+    def set_group(self, _group):
+        """
+
+        :param _group:
+        :type _group:
+        """
+        self.__group = _group
+
     def set_special(self, switch):
         """
 
@@ -308,6 +801,7 @@ class Meal:
         :type switch:
         """
         self.__is_special = switch
+        self.__notify_collections()
 
     def set_veggie(self, switch):
         """
@@ -316,18 +810,46 @@ class Meal:
         :type switch:
         """
         self.__is_veggie_compatible = switch
+        self.__notify_collections()
 
     def enable(self):
         """
         Enable meal manually
         """
         self.__is_enable = True
+        self.__notify_collections()
 
     def disable(self):
         """
         Disable menu
         """
         self.__is_enable = False
+        self.__notify_collections()
+
+    def attach(self, _collection):
+        """
+        Register a MealCollection to notify when flags change
+        :param _collection:
+        :type _collection:
+        """
+        self.__collections += (_collection,)
+
+    def detach(self, _collection):
+        """
+        Unregister a MealCollection
+        :param _collection:
+        :type _collection:
+        """
+        __collections = list(self.__collections)
+        __collections.remove(_collection)
+        self.__collections = tuple(__collections)
+
+    def __notify_collections(self):
+        """
+        Refresh candidate pools of every MealCollection indexing this meal
+        """
+        for __collection in self.__collections:
+            __collection.update_meal(self)
 
     def add_mandatory_ingredients(self, _ingredient):
         """
@@ -335,7 +857,15 @@ class Meal:
         :param _ingredient:
         :type _ingredient:
         """
-        self.__mandatory_ingredients.append(_ingredient)
+        self.__mandatory_ingredients += (_ingredient,)
+
+    def set_mandatory_ingredients(self, _ingredients):
+        """
+
+        :param _ingredients:
+        :type _ingredients:
+        """
+        self.__mandatory_ingredients = tuple(_ingredients)
 
     def get_mandatory_ingredients(self):
         """
@@ -360,6 +890,22 @@ class MealDatabase:
         self.__database_raw_content = {}
         self._configuration = _configuration
         self.__meal_database = MealCollection(self._configuration)
+        self.__meal_database.watch_meals()
+        self.__meals_by_name = None
+        self.__snapshot = False
+        self.__snapshot_payload = None
+        self.__columnar = False
+        self.__catalogue = None
+        self.__is_streaming = False
+        # Incremental reload : signature of the loaded yaml file, yaml text of meal records
+        # (from load() to build()), number of occurrences of each record and meals built from them
+        self.__is_reload_enabled = False
+        self.__source_signature = None
+        # Signature of a yaml file which could not be parsed : not parsed again until it changes
+        self.__rejected_signature = None
+        self.__loaded_records = None
+        self.__record_counts = None
+        self.__meals_by_record = None
 
     def get_path(self):
         """
@@ -369,18 +915,91 @@ class MealDatabase:
         """
         return self.__database_path
 
+    def enable_snapshot(self):
+        """
+        Enable compiled snapshot : load() and build() reuse it while yaml file is unchanged
+        """
+        self.__snapshot = True
+
+    def enable_columnar(self):
+        """
+        Enable columnar catalogue : filter() computes masks instead of looping over meals
+        Ignored (with a warning) when NumPy is not installed
+        """
+        # Imported on demand : NumPy import is most of the start-up time otherwise
+        from meals_for_a_week import columnar # noqa pylint: disable=import-outside-toplevel
+        if not columnar.is_available():
+            self._configuration.warn_log('Columnar filtering needs NumPy : using meal objects')
+            return
+        self.__columnar = True
+
+    def enable_reload(self):
+        """
+        Enable incremental reload (see reload()) : load() keeps the yaml text of every meal record
+        Snapshots are then written but not read
+        """
+        self.__is_reload_enabled = True
+
+    def enable_streaming(self):
+        """
+        Enable streaming : build() parses yaml file meal by meal instead of load() parsing it whole,
+        and yaml records are dropped as soon as their Meal object is built
+        (peak memory is about one copy of the database instead of two)
+        Ignored when incremental reload is enabled : it needs the yaml text of every record
+        """
+        self.__is_streaming = True
+
     def load(self):
         """
         Load function
+        Raise YAMLError when yaml file cannot be parsed (the file is then still seen as modified)
+        """
+        # Taken before reading : a change during the read is reloaded next time
+        __signature = self.__get_source_signature()
+        self.__loaded_records = None
+        if self.__snapshot and not self.__is_reload_enabled:
+            self.__snapshot_payload = read_snapshot(self.__database_path, 'meals')
+            if self.__snapshot_payload:
+                self._configuration.verbose_log('Using snapshot for %s', self.__database_path)
+                self.__source_signature = __signature
+                return
+
+        if not self.__is_reload_enabled:
+            # When streaming, yaml file is parsed by build()
+            self.__database_raw_content = {} if self.__is_streaming \
+                else load_yaml_file(self.__database_path, self._configuration)
+            self.__source_signature = __signature
+            return
+
+        self._configuration.verbose_log('Loading %s for incremental reload', self.__database_path)
+        __content = read_text_file(self.__database_path, self._configuration)
+        self.__database_raw_content = load_yaml_string(__content) or {}
+        __records = split_sequence_items(__content, 'meals')
+        if __records is not None \
+                and len(__records) == len(self.__database_raw_content.get("meals") or []):
+            self.__loaded_records = __records
+        self.__source_signature = __signature
+
+    def __get_source_signature(self):
+        """
+
+        :return: signature of yaml file, None if it cannot be read
+        :rtype:
         """
         try:
-            __database_file = open(self.__database_path)
-        except OSError as err:
-            self._configuration.error_log('OS error: {0}'.format(err))
-            sys.exit(os.EX_OSFILE)
-        else:
-            self.__database_raw_content = yaml.load(__database_file, Loader=yaml.FullLoader)
-            __database_file.close()
+            return get_source_signature(self.__database_path)
+        except OSError:
+            return None
+
+    def is_modified(self):
+        """
+        Return if yaml file changed since last load() or reload()
+        :return:
+        :rtype: bool
+        """
+        __signature = self.__get_source_signature()
+        return __signature is not None \
+            and __signature not in (self.__source_signature, self.__rejected_signature)
 
     def get_raw_content(self):
         """
@@ -392,25 +1011,164 @@ class MealDatabase:
 
     def build(self):
         """
-        Build meal database
+        Build meal database (from scratch : calling it again does not duplicate meals)
         """
+        self.__meals_by_name = None
+        self.__catalogue = None
+        if self.__snapshot_payload:
+            self.__meal_database = pickle.loads(self.__snapshot_payload)
+            self.__meal_database.set_configuration(self._configuration)
+            return
 
-        if "meals" in self.__database_raw_content:
-            for __meal_record in self.__database_raw_content["meals"]:
-                if "meal" in __meal_record:
-                    __meal = Meal(__meal_record["meal"].lower())
-
-                    if "is_veggie_compatible" in __meal_record:
-                        __meal.set_veggie(True)
-
-                    if "is_special" in __meal_record:
-                        __meal.set_special(True)
-
-                    if "mandatory_ingredients" in __meal_record:
-                        for _mandatory_ingredient in __meal_record["mandatory_ingredients"]:
-                            __meal.add_mandatory_ingredients(_mandatory_ingredient.lower())
+        self.__meal_database = MealCollection(self._configuration)
+        self.__meal_database.watch_meals()
+        # Yaml text of each record, when kept by load() for incremental reload
+        __records = self.__loaded_records
+        self.__loaded_records = None
+        self.__record_counts = collections.Counter(__records) if __records is not None else None
+        self.__meals_by_record = {} if __records is not None else None
+        if self.__is_streaming and not self.__is_reload_enabled:
+            __meal_records = iter_yaml_sequence(self.__database_path, 'meals', self._configuration)
+        elif "meals" in self.__database_raw_content:
+            __meal_records = self.__database_raw_content["meals"]
+        else:
+            __meal_records = ()
+        for __index, __meal_record in enumerate(__meal_records):
+            __meal = self.build_meal(__meal_record)
+            if __meal:
+                self.__meal_database.add(__meal)
+                if __records is not None:
+                    self.__meals_by_record.setdefault(__records[__index], []).append(__meal)
+
+        self.__meal_database.build_ingredient_index()
+
+        if self.__snapshot:
+            self.__snapshot_payload = write_snapshot(self.__database_path, 'meals',
+                                                     self.__meal_database)
+            if not self.__snapshot_payload:
+                self._configuration.warn_log('Cannot write snapshot for %s', self.__database_path)
+
+    @staticmethod
+    def build_meal(_meal_record):
+        """
+        Build a Meal object from a yaml record, None if the record has no meal name
+        :param _meal_record:
+        :type _meal_record:
+        :return:
+        :rtype: Meal
+        """
+        if "meal" not in _meal_record:
+            return None
+        __meal = Meal(intern_name(_meal_record["meal"]))
+
+        if "is_veggie_compatible" in _meal_record:
+            __meal.set_veggie(True)
+
+        if "is_special" in _meal_record:
+            __meal.set_special(True)
+
+        if _meal_record.get("group"):
+            __meal.set_group(intern_name(str(_meal_record["group"])))
+
+        if "mandatory_ingredients" in _meal_record:
+            __meal.set_mandatory_ingredients(
+                intern_name(_mandatory_ingredient)
+                for _mandatory_ingredient in _meal_record["mandatory_ingredients"])
+        return __meal
+
+    def reload(self):
+        """
+        Apply changes of the yaml file since last load() or reload() :
+        only meals of added, removed or modified records are removed from / added to the
+        database (and its indexes), other Meal objects are kept as they are.
+        Falls back to load() + build() when records cannot be compared one by one.
+        Views obtained before a reload must not be used after it, and filters must be applied
+        again to the database or to new views
+        :return: True if the database changed
+        :rtype: bool
+        """
+        if not self.is_modified():
+            return False
+
+        if self.__record_counts is None:
+            return self.__full_reload()
+
+        __signature = self.__get_source_signature()
+        __records = split_sequence_items(read_text_file(self.__database_path,
+                                                        self._configuration), 'meals')
+        if __records is None:
+            return self.__full_reload()
+        __record_counts = collections.Counter(__records)
+        if len(__record_counts) == len(__records) \
+                and len(self.__record_counts) == sum(self.__record_counts.values()):
+            # No duplicated record : set differences (much faster than Counter ones)
+            __added_records = dict.fromkeys(__record_counts.keys() - self.__record_counts.keys(), 1)
+            __removed_records = dict.fromkeys(self.__record_counts.keys() - __record_counts.keys(),
+                                              1)
+        else:
+            __added_records = __record_counts - self.__record_counts
+            __removed_records = self.__record_counts - __record_counts
 
-                    self.__meal_database.add(__meal)
+        # Parse added records first : database is left untouched if one of them is invalid
+        __added_meals = []
+        try:
+            for __record, __count in __added_records.items():
+                __meal_records = load_yaml_string(__record)
+                if not isinstance(__meal_records, list) or len(__meal_records) != 1:
+                    return self.__full_reload()
+                for _ in range(__count):
+                    __added_meals.append((__record, self.build_meal(__meal_records[0])))
+        except YAMLError as err:
+            self._configuration.warn_log('Cannot reload %s, keeping current meals: %s',
+                                         self.__database_path, err)
+            self.__rejected_signature = __signature
+            return False
+
+        __number_of_removed_meals = 0
+        for __record, __count in __removed_records.items():
+            __meals = self.__meals_by_record.get(__record)
+            for _ in range(__count if __meals else 0):
+                __meal = __meals.pop()
+                self.__meal_database.remove_meal(__meal)
+                if self.__meals_by_name is not None:
+                    self.__meals_by_name[__meal.get()].remove(__meal)
+                __number_of_removed_meals += 1
+            if not __meals:
+                self.__meals_by_record.pop(__record, None)
+
+        for __record, __meal in __added_meals:
+            if __meal:
+                self.__meal_database.add(__meal)
+                self.__meals_by_record.setdefault(__record, []).append(__meal)
+                if self.__meals_by_name is not None:
+                    self.__meals_by_name.setdefault(__meal.get(), []).append(__meal)
+
+        self.__record_counts = __record_counts
+        self.__source_signature = __signature
+        self.__catalogue = None
+        self._configuration.verbose_log('Reloaded %s: %d meal(s) removed, %d added',
+                                        self.__database_path, __number_of_removed_meals,
+                                        sum(1 for _, __meal in __added_meals if __meal))
+        return True
+
+    def __full_reload(self):
+        """
+        Load and build database again, keeping current meals when yaml file cannot be parsed
+        :return: True if the database changed
+        :rtype: bool
+        """
+        self._configuration.verbose_log('Reloading %s entirely', self.__database_path)
+        __signature = self.__get_source_signature()
+        self.__snapshot_payload = None
+        try:
+            self.load()
+        except YAMLError as err:
+            self._configuration.warn_log('Cannot reload %s, keeping current meals: %s',
+                                         self.__database_path, err)
+            self.__rejected_signature = __signature
+            return False
+        self.build()
+        return True
 
     def get(self):
         """
@@ -420,7 +1178,33 @@ class MealDatabase:
         """
         return self.__meal_database
 
-    def filter(self, _seasoning, _history, _number_of_history_meals):
+    def get_meals_by_name(self, _name):
+        """
+        Get meals named _name (name -> meals index is built on first call)
+        :param _name:
+        :type _name:
+        :return:
+        :rtype:
+        """
+        if self.__meals_by_name is None:
+            self.__meals_by_name = {}
+            for __meal in self.__meal_database.get():
+                self.__meals_by_name.setdefault(__meal.get(), []).append(__meal)
+        return self.__meals_by_name.get(_name, [])
+
+    def get_catalogue(self):
+        """
+        Get columnar catalogue of the database (built on first call), None if not enabled
+        :return:
+        :rtype:
+        """
+        if self.__columnar and self.__catalogue is None:
+            from meals_for_a_week import columnar # noqa pylint: disable=import-outside-toplevel
+            self.__catalogue = columnar.ColumnarCatalogue(self.__meal_database.get())
+        return self.__catalogue
+
+    def filter(self, _seasoning, _history, _number_of_history_meals, _meal_collection=None,
+               _date=None):
         """
         Filter database
         :param _number_of_history_meals:
@@ -429,24 +1213,93 @@ class MealDatabase:
         :type _seasoning:
         :param _history:
         :type _history:
-        """
+        :param _meal_collection: view of the database to filter, instead of the database itself
+        :type _meal_collection:
+        :param _date: date whose month seasonal vegetables are taken from (today if None)
+        :type _date: datetime.date
+        """
+        __catalogue = self.get_catalogue()
+        if __catalogue is not None:
+            self.__filter_catalogue(__catalogue, _seasoning, _history, _number_of_history_meals,
+                                    _meal_collection, _date)
+            return
+
+        if _meal_collection:
+            _disable_meal = _meal_collection.disable_meal
+        else:
+            _meal_collection = self.__meal_database
+            _disable_meal = Meal.disable
+        __profiler = self._configuration.get_profiler()
+
         if _seasoning:
-            for _meal in self.__meal_database.get():
-                _meal_ingredients = _meal.get_mandatory_ingredients()
-                for _meal_ingredient in _meal_ingredients:
-                    if _meal_ingredient.lower() in _seasoning.get_restricted_vegetables() and \
-                            _meal_ingredient.lower() not in _seasoning.get_current_vegetables():
-                        _meal.disable()
+            with __profiler.stage('filter.seasonal'):
+                # Vegetables restricted to a season which are not available this month
+                _out_of_season_vegetables = _seasoning.get_restricted_vegetable_set() \
+                    - _seasoning.get_current_vegetable_set(_date)
+                for _meal in _meal_collection.get():
+                    if not _out_of_season_vegetables.isdisjoint(
+                            _meal.get_mandatory_ingredients()):
+                        _disable_meal(_meal)
 
         if _history:
-            history_meals = _history.get().get_meals()[-_number_of_history_meals*7:]
-            self._configuration.debug_log('Meals from history database: ' + str(history_meals))
+            with __profiler.stage('filter.history'):
+                history_meals = _history.get_recent_meal_names(_number_of_history_meals)
+                self._configuration.debug_log('Meals from history database: %s', history_meals)
 
-            for _meal in self.__meal_database.get():
                 # Disable meal which was part of history file over the
-                # last _number_of_history_meals weeks * 7 days
-                if _meal.get() in history_meals:
-                    _meal.disable()
+                # last _number_of_history_meals weeks
+                # (sorted : pools order, hence draws for a given seed, must not depend on set order)
+                for _history_meal in sorted(history_meals):
+                    for _meal in self.get_meals_by_name(_history_meal):
+                        if _meal_collection.has_meal(_meal):
+                            _disable_meal(_meal)
+
+    def __filter_catalogue(self, _catalogue, _seasoning, _history, _number_of_history_meals,
+                           _meal_collection, _date=None):
+        """
+        Filter database with masks computed on its columnar catalogue
+        Meals are disabled in the same order as filter() does without catalogue,
+        so that draws for a given seed do not depend on the backend
+        :param _catalogue:
+        :type _catalogue:
+        :param _seasoning:
+        :type _seasoning:
+        :param _history:
+        :type _history:
+        :param _number_of_history_meals:
+        :type _number_of_history_meals:
+        :param _meal_collection:
+        :type _meal_collection:
+        :param _date:
+        :type _date:
+        """
+        if _meal_collection:
+            _disable_meal = _meal_collection.disable_meal
+        else:
+            _meal_collection = self.__meal_database
+            _disable_meal = Meal.disable
+
+        __profiler = self._configuration.get_profiler()
+        __disabled_meals = []
+
+        if _seasoning:
+            with __profiler.stage('filter.seasonal'):
+                __seasonal_mask = _catalogue.get_ingredient_mask(
+                    _seasoning.get_restricted_vegetable_set()
+                    - _seasoning.get_current_vegetable_set(_date))
+                __disabled_meals.extend(_catalogue.get_meals(__seasonal_mask))
+
+        if _history:
+            with __profiler.stage('filter.history'):
+                history_meals = _history.get_recent_meal_names(_number_of_history_meals)
+                self._configuration.debug_log('Meals from history database: %s', history_meals)
+                __history_mask = _catalogue.get_name_mask(history_meals)
+                __disabled_meals.extend(_catalogue.get_meals_by_name_order(__history_mask))
+
+        with __profiler.stage('filter.disable'):
+            for _meal in __disabled_meals:
+                if _meal_collection.has_meal(_meal):
+                    _disable_meal(_meal)
 
     def extend(self, another_meal_collection):
         """
@@ -455,6 +1308,8 @@ class MealDatabase:
         :type another_meal_collection:
         """
         self.__meal_database.extend(another_meal_collection)
+        self.__meals_by_name = None
+        self.__catalogue = None
 
     def dump_to_yaml_file(self):
         """
@@ -465,20 +1320,15 @@ class MealDatabase:
             meal_list.append({'meal': str(meal.get())})
         yaml_data = {'meals': meal_list}
 
-        try:
-            __database_file = open(self.__database_path, 'w')
-        except OSError as err:
-            self._configuration.error_log('OS error: {0}'.format(err))
-            sys.exit(os.EX_OSFILE)
-        else:
-            yaml.dump(yaml_data, __database_file, allow_unicode=True)
-            __database_file.close()
+        dump_yaml_file(yaml_data, self.__database_path, self._configuration)
 
 
 class MonthlyVegetables:
     """
     MonthlyVegetables class
     """
+    __slots__ = ('__name', '__vegetables')
+
     def __init__(self, name):
         """
 
@@ -486,7 +1336,7 @@ class MonthlyVegetables:
         :type name:
         """
         self.__name = name
-        self.__vegetables = []
+        self.__vegetables = ()
 
     def add(self, _vegetable_name):
         """
@@ -494,7 +1344,15 @@ class MonthlyVegetables:
         :param _vegetable_name:
         :type _vegetable_name:
         """
-        self.__vegetables.append(_vegetable_name)
+        self.__vegetables += (_vegetable_name,)
+
+    def set_vegetables(self, _vegetable_names):
+        """
+
+        :param _vegetable_names:
+        :type _vegetable_names:
+        """
+        self.__vegetables = tuple(_vegetable_names)
 
     def get(self):
         """
@@ -525,7 +1383,16 @@ class SeasonalDatabase:
         self.__database_path = database_path
         self.__database_raw_content = {}
         self.__database = []
+        # Normalized lookup sets, computed by build()
+        self.__restricted_vegetables = frozenset()
+        self.__vegetables_by_month = {}
+        self.__current_vegetables = frozenset()
         self._configuration = _configuration
+        self.__snapshot = False
+        self.__snapshot_payload = None
+        self.__source_signature = None
+        # Signature of a yaml file which could not be parsed : not parsed again until it changes
+        self.__rejected_signature = None
 
     def get_path(self):
         """
@@ -535,18 +1402,77 @@ class SeasonalDatabase:
         """
         return self.__database_path
 
+    def enable_snapshot(self):
+        """
+        Enable compiled snapshot : load() and build() reuse it while yaml file is unchanged
+        """
+        self.__snapshot = True
+
     def load(self):
         """
         Load function
+        Raise YAMLError when yaml file cannot be parsed (the file is then still seen as modified)
+        """
+        # Taken before reading : a change during the read is reloaded next time
+        __signature = self.__get_source_signature()
+        if self.__snapshot:
+            self.__snapshot_payload = read_snapshot(self.__database_path, 'seasonal')
+            if self.__snapshot_payload:
+                self._configuration.verbose_log('Using snapshot for %s', self.__database_path)
+                self.__source_signature = __signature
+                return
+
+        self.load_content()
+        self.__source_signature = __signature
+
+    def load_content(self):
+        """
+        Read database file (months are built from its content by build_months())
+        """
+        self.__database_raw_content = load_yaml_file(self.__database_path, self._configuration)
+
+    def __get_source_signature(self):
+        """
+
+        :return: signature of yaml file, None if it cannot be read
+        :rtype:
         """
         try:
-            __database_file = open(self.__database_path)
-        except OSError as err:
-            self._configuration.error_log('OS error: {0}'.format(err))
-            sys.exit(os.EX_OSFILE)
-        else:
-            self.__database_raw_content = yaml.load(__database_file, Loader=yaml.FullLoader)
-            __database_file.close()
+            return get_source_signature(self.__database_path)
+        except OSError:
+            return None
+
+    def is_modified(self):
+        """
+        Return if yaml file changed since last load()
+        :return:
+        :rtype: bool
+        """
+        __signature = self.__get_source_signature()
+        return __signature is not None \
+            and __signature not in (self.__source_signature, self.__rejected_signature)
+
+    def reload(self):
+        """
+        Load and build seasonal database again if yaml file changed
+        (12 months of vegetables : no need to apply changes record by record),
+        keeping current months when yaml file cannot be parsed
+        :return: True if the database changed
+        :rtype: bool
+        """
+        if not self.is_modified():
+            return False
+        __signature = self.__get_source_signature()
+        self.__snapshot_payload = None
+        try:
+            self.load()
+        except YAMLError as err:
+            self._configuration.warn_log('Cannot reload %s, keeping current months: %s',
+                                         self.__database_path, err)
+            self.__rejected_signature = __signature
+            return False
+        self.build()
+        return True
 
     def get_raw_content(self):
         """
@@ -560,14 +1486,48 @@ class SeasonalDatabase:
         """
         Build function
         """
+        if self.__snapshot_payload:
+            self.__database, self.__vegetables_by_month, self.__restricted_vegetables = \
+                pickle.loads(self.__snapshot_payload)
+        else:
+            self.__database = self.build_months()
+            self.__vegetables_by_month = {
+                _month.get(): frozenset(_month.get_vegetables()) for _month in self.__database
+            }
+            self.__restricted_vegetables = frozenset().union(*self.__vegetables_by_month.values())
+
+            if self.__snapshot:
+                self.__snapshot_payload = write_snapshot(
+                    self.__database_path, 'seasonal',
+                    (self.__database, self.__vegetables_by_month, self.__restricted_vegetables))
+                if not self.__snapshot_payload:
+                    self._configuration.warn_log('Cannot write snapshot for %s',
+                                                 self.__database_path)
+
+        __current_month_name = datetime.datetime.today().strftime('%B').lower()
+        if __current_month_name in self.__vegetables_by_month:
+            self.__current_vegetables = self.__vegetables_by_month[__current_month_name]
+        else:
+            self._configuration.warn_log('No seasonal vegetables for month: %s',
+                                         __current_month_name)
+            self.__current_vegetables = frozenset()
+
+    def build_months(self):
+        """
+        MonthlyVegetables objects of the content read by load_content()
+        :return:
+        :rtype: list
+        """
+        __months = []
         if "months" in self.__database_raw_content:
             for __month_record in self.__database_raw_content["months"]:
                 if "month" in __month_record:
-                    __month = MonthlyVegetables(__month_record["month"].lower())
-                    self.__database.append(__month)
+                    __month = MonthlyVegetables(intern_name(__month_record["month"]))
+                    __months.append(__month)
                     if "vegetables" in __month_record:
-                        for __vegetable in __month_record["vegetables"]:
-                            __month.add(__vegetable.lower())
+                        __month.set_vegetables(intern_name(__vegetable)
+                                               for __vegetable in __month_record["vegetables"])
+        return __months
 
     def get(self):
         """
@@ -588,13 +1548,44 @@ class SeasonalDatabase:
             _get_restricted_vegetables.extend(_month.get_vegetables())
         return _get_restricted_vegetables
 
-    def get_current_month(self):
+    def get_restricted_vegetable_set(self):
         """
+        Union of the vegetables of every month
+        :return:
+        :rtype: frozenset
+        """
+        return self.__restricted_vegetables
 
+    def get_vegetable_set_by_month(self):
+        """
+        Month name -> vegetables map
+        :return:
+        :rtype: dict
+        """
+        return self.__vegetables_by_month
+
+    def get_current_vegetable_set(self, _date=None):
+        """
+        Vegetables of the current month (or of the month of _date)
+        :param _date:
+        :type _date: datetime.date
+        :return:
+        :rtype: frozenset
+        """
+        if _date is None:
+            return self.__current_vegetables
+        return self.__vegetables_by_month.get(_date.strftime('%B').lower(), frozenset())
+
+    def get_current_month(self, _date=None):
+        """
+
+        :param _date: date of the month (today if None)
+        :type _date: datetime.date
         :return:
         :rtype:
         """
-        __current_month_name = datetime.datetime.today().strftime('%B').lower()
+        __current_month_name = (_date if _date else datetime.datetime.today()).strftime('%B') \
+            .lower()
         __current_month = None
         for _month in self.__database:
             if __current_month_name == _month.get():
@@ -614,17 +1605,23 @@ class MealGenerator:
     """
     MealGenerator class
     """
+    # Profiler stage of each meal type : named once, not for every generated plan
+    GENERATE_STAGES = {}
 
-    def __init__(self, _configuration, meal_database, meal_limit):
+    def __init__(self, _configuration, meal_database, meal_limit, _random=None):
         """
 
         :param meal_database:
         :type meal_database:
         :param meal_limit:
         :type meal_limit:
+        :param _random: random number generator, used for every draw from meal_database
+        :type _random: random.Random
         """
         self._configuration = _configuration
         self._meal_database = meal_database
+        if _random:
+            self._meal_database.set_random(_random)
         self._meal_limit = meal_limit
         self._meal_veggie_limit = 0
         self._meal_special_limit = 0
@@ -687,48 +1684,79 @@ class MealGenerator:
         :type _meal_type:
         """
         _meal_limit = self.get_meal_limit_by_type(_meal_type)
+        _number_of_meals = _meal_limit - self._meal_collection.get_count_by_meal_type(_meal_type)
 
         # Debug
-        self._configuration.debug_log('For ' + _meal_type
-                                      + ' type, generate '
-                                      + str(_meal_limit) + ' meal(s)')
-        while self._meal_collection.get_count_by_meal_type(_meal_type) < _meal_limit:
+        # (messages are only built when logged : this loop runs for every generated meal)
+        __is_debug = self._configuration.is_debug_log()
+        self._configuration.debug_log('For %s type, generate %d meal(s)', _meal_type, _meal_limit)
+        if _number_of_meals <= 0:
+            return
+
+        # Meals drawn are removed from every candidate pool, so each draw is a new meal :
+        # fail now rather than running out of candidates
+        # (leftover-compatible meals are enabled, hence part of database pools too)
+        _number_of_candidates = self._meal_database.get_count_candidates_by_meal_type(_meal_type)
+        __profiler = self._configuration.get_profiler()
+        __is_profiling = __profiler.is_enabled()
+        if __is_profiling:
+            __profiler.observe('pool_size.' + _meal_type, _number_of_candidates)
+            if _restricted_database:
+                __profiler.observe('pool_size.leftovers.' + _meal_type,
+                                   _restricted_database.get_count_by_meal_type(_meal_type))
+        if _number_of_candidates < _number_of_meals:
+            raise NotEnoughMealsError('Cannot find ' + str(_number_of_meals) + ' ' + _meal_type
+                                      + ' meal(s), only ' + str(_number_of_candidates)
+                                      + ' available')
+
+        for _ in range(_number_of_meals):
             _meal = None
 
             # If a list of leftover-compatible meals is available
             if _restricted_database and _restricted_database.get_count_meal() > 0:
                 # Debug
-                self._configuration.debug_log('Trying to find a '
-                                              + _meal_type + ' meal to use leftovers')
+                if __is_debug:
+                    self._configuration.debug_log('Trying to find a %s meal to use leftovers',
+                                                  _meal_type)
 
                 # Then try to get a random meal from it
-                _meal = _restricted_database.get_random_meal_by_type(_meal_type)
+                _meal = _restricted_database.pop_random_meal_by_type(_meal_type)
+                if __is_profiling:
+                    __profiler.count('draws.leftovers.' + _meal_type)
                 # If a meal was found in the list of leftover-compatible meals
                 if _meal:
                     # Debug
-                    self._configuration.debug_log('Found a leftover-compatible meal : '
-                                                  + _meal.get())
+                    if __is_debug:
+                        self._configuration.debug_log('Found a leftover-compatible meal : %s',
+                                                      _meal.get())
 
                     # Remove meal from list of potential meals
-                    _restricted_database.remove_meal(_meal)
+                    self._meal_database.remove_meal(_meal)
 
             # If meal is empty (either no leftover or no compatible meal found before)
             if not _meal:
                 # Then get a random meal
                 # Debug
-                self._configuration.debug_log('Tring to find a ' + _meal_type + ' meal')
-                _meal = self._meal_database.get_random_meal_by_type(_meal_type)
+                if __is_debug:
+                    self._configuration.debug_log('Tring to find a %s meal', _meal_type)
+                _meal = self._meal_database.pop_random_meal_by_type(_meal_type)
+                if __is_profiling:
+                    __profiler.count('draws.' + _meal_type)
+
+                # Remove meal from list of leftover-compatible meals
+                if _restricted_database and _restricted_database.has_meal(_meal):
+                    _restricted_database.remove_meal(_meal)
 
-            # If a meal was found and this meal is not already part of the list
-            if _meal and _meal not in self._meal_collection.get():
-                # Add it to the meal collection
-                self._meal_collection.add(_meal)
+            # Drawn meals are popped from candidate pools : a duplicate would be a bug
+            if __is_profiling and self._meal_collection.has_meal(_meal):
+                __profiler.count('rejected_duplicates.' + _meal_type)
 
-                # Remove meal from list of potential meals
-                self._meal_database.remove_meal(_meal)
+            # Add it to the meal collection
+            self._meal_collection.add(_meal)
 
-                # Debug
-                self._configuration.debug_log('Found a meal : ' + _meal.get())
+            # Debug
+            if __is_debug:
+                self._configuration.debug_log('Found a meal : %s', _meal.get())
 
     def generate(self, _leftovers):
         """
@@ -738,16 +1766,24 @@ class MealGenerator:
         """
         # If the list of meals must be generated from leftovers,
         # then build a list of potential compatible meals
+        __profiler = self._configuration.get_profiler()
         if _leftovers:
-            _restricted_database = self._meal_database.restrict_by_ingredients(_leftovers)
+            self._meal_database.set_leftover_mode(True)
+            with __profiler.stage('generate.restrict_by_ingredients'):
+                _restricted_database = self._meal_database.restrict_by_ingredients(_leftovers)
             # Debug
-            self._configuration.debug_log('List of meal(s) compatible with leftovers : ' +
-                                          str(_restricted_database.get_meals()))
+            self._configuration.debug_log(
+                lambda: 'List of meal(s) compatible with leftovers : '
+                + str(_restricted_database.get_meals()))
         else:
             _restricted_database = None
 
         for _meal_type in self._configuration.get_meal_types():
-            self.generate_meal_by_type(_restricted_database, _meal_type)
+            __stage = MealGenerator.GENERATE_STAGES.get(_meal_type)
+            if __stage is None:
+                __stage = MealGenerator.GENERATE_STAGES[_meal_type] = 'generate.' + _meal_type
+            with __profiler.stage(__stage):
+                self.generate_meal_by_type(_restricted_database, _meal_type)
 
     # Set the number of vegetarian meals we want
     def set_veggie_limit(self, veggie_limit):
@@ -0,0 +1,302 @@
+"""
+Meal for a week : cache of generated meal plans
+
+A seeded plan only depends on its inputs : database and seasonal files content, current month,
+meals excluded by history and plan settings. PlanCache maps a hash of these inputs
+to the generated meals, so that a repeated request is answered without loading,
+filtering nor generating anything.
+
+Plans are kept in memory (least recently used ones are forgotten first)
+and, optionally, in a cache directory shared by every run (one JSON file per plan,
+least recently used files are deleted once the directory exceeds its size limit).
+"""
+import collections
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+from meals_for_a_week.snapshot import get_source_digest, get_source_signature # noqa
+
+
+# Bump when generated plans change for the same inputs (ie : new draw algorithm)
+PLAN_CACHE_VERSION = 1
+DEFAULT_MEMORY_SIZE = 256
+DEFAULT_DISK_SIZE = 64 * 1024 * 1024
+PLAN_FILE_SUFFIX = '.json'
+# Once over its size limit, cache directory is shrunk to this ratio of it
+DISK_EVICTION_RATIO = 0.9
+
+
+def get_meal_records(_meals):
+    """
+    JSON-serializable records of Meal objects, as cached and returned by batch and server
+    :param _meals:
+    :type _meals:
+    :return:
+    :rtype: list
+    """
+    return [{'meal': __meal.get(),
+             'is_veggie_compatible': __meal.is_veggie(),
+             'is_special': __meal.is_special()}
+            for __meal in _meals]
+
+
+def get_current_month_name():
+    """
+    Name of current month, as looked up in seasonal database
+    :return:
+    :rtype: str
+    """
+    return datetime.datetime.today().strftime('%B').lower()
+
+
+class PlanCache:
+    """
+    PlanCache class
+    """
+    def __init__(self, _configuration, memory_size=DEFAULT_MEMORY_SIZE, cache_dir=None,
+                 disk_size=DEFAULT_DISK_SIZE):
+        """
+
+        :param _configuration:
+        :type _configuration:
+        :param memory_size: number of plans kept in memory
+        :type memory_size:
+        :param cache_dir: directory plans are also stored in, None for memory only
+        :type cache_dir:
+        :param disk_size: size limit of cache directory, in bytes
+        :type disk_size:
+        """
+        self._configuration = _configuration
+        self.__memory_size = memory_size
+        self.__cache_dir = cache_dir
+        self.__disk_size = disk_size
+        # key -> meal records, least recently used first
+        self.__plans = collections.OrderedDict()
+        # Size of cache directory, None until it is scanned
+        self.__disk_usage = None
+        # file path -> (file signature, digest of its content)
+        self.__file_digests = {}
+
+    def get_file_digest(self, _path):
+        """
+        Hash of a file content, None if there is no file
+        (files are hashed again only when their signature changes)
+        :param _path:
+        :type _path:
+        :return:
+        :rtype: str
+        """
+        if not _path:
+            return None
+        try:
+            __signature = get_source_signature(_path)
+        except OSError:
+            return None
+        __known_digest = self.__file_digests.get(_path)
+        if __known_digest and __known_digest[0] == __signature:
+            return __known_digest[1]
+
+        try:
+            __digest = get_source_digest(_path)
+        except OSError:
+            return None
+        self.__file_digests[_path] = (__signature, __digest)
+        return __digest
+
+    def get_key(self, _database_path, _seasonal_path, _history_meal_names, _settings, _seed,
+                _generator='random'):
+        """
+        Key of a plan : hash of every input of a seeded meal generation
+        :param _database_path:
+        :type _database_path:
+        :param _seasonal_path: None without seasonal database
+        :type _seasonal_path:
+        :param _history_meal_names: names of meals excluded by history
+        :type _history_meal_names:
+        :param _settings: meals, veggie_meals, special_meals and leftovers of the plan
+        :type _settings: dict
+        :param _seed: seed of the plan random generator
+        :type _seed:
+        :param _generator: meal generator ('random' or 'solver')
+        :type _generator:
+        :return:
+        :rtype: str
+        """
+        __seasonal_digest = self.get_file_digest(_seasonal_path)
+        __inputs = {
+            'version': PLAN_CACHE_VERSION,
+            'database': self.get_file_digest(_database_path),
+            'seasonal': __seasonal_digest,
+            'month': get_current_month_name() if __seasonal_digest else None,
+            'history': sorted(_history_meal_names or ()),
+            'meals': _settings['meals'],
+            'veggie_meals': _settings['veggie_meals'],
+            'special_meals': _settings['special_meals'],
+            # Order matters : leftover-compatible meals are looked up in this order
+            'leftovers': list(_settings['leftovers'] or ()),
+            'seed': _seed,
+            'generator': _generator,
+        }
+        return hashlib.sha256(json.dumps(__inputs, ensure_ascii=False, sort_keys=True)
+                              .encode('utf-8')).hexdigest()
+
+    def get(self, _key):
+        """
+        Cached meal records of a plan, None if the plan is not cached
+        :param _key:
+        :type _key:
+        :return:
+        :rtype: list
+        """
+        __profiler = self._configuration.get_profiler()
+        __meals = self.__plans.get(_key)
+        if __meals is not None:
+            self.__plans.move_to_end(_key)
+            __profiler.count('plan_cache.hits.memory')
+            return __meals
+
+        __meals = self.__read_plan_file(_key)
+        if __meals is not None:
+            self.__remember(_key, __meals)
+            __profiler.count('plan_cache.hits.disk')
+            return __meals
+
+        __profiler.count('plan_cache.misses')
+        return None
+
+    def put(self, _key, _meals):
+        """
+        Cache meal records of a plan
+        :param _key:
+        :type _key:
+        :param _meals:
+        :type _meals: list
+        """
+        self.__remember(_key, _meals)
+        if self.__cache_dir:
+            self.__write_plan_file(_key, _meals)
+
+    def __remember(self, _key, _meals):
+        """
+        Keep a plan in memory
+        :param _key:
+        :type _key:
+        :param _meals:
+        :type _meals:
+        """
+        self.__plans[_key] = _meals
+        self.__plans.move_to_end(_key)
+        while len(self.__plans) > self.__memory_size:
+            self.__plans.popitem(last=False)
+
+    def __get_plan_path(self, _key):
+        """
+
+        :param _key:
+        :type _key:
+        :return:
+        :rtype:
+        """
+        return os.path.join(self.__cache_dir, _key + PLAN_FILE_SUFFIX)
+
+    def __read_plan_file(self, _key):
+        """
+        Meal records stored in cache directory, None if missing or unreadable
+        :param _key:
+        :type _key:
+        :return:
+        :rtype: list
+        """
+        if not self.__cache_dir:
+            return None
+        __plan_path = self.__get_plan_path(_key)
+        try:
+            with open(__plan_path, encoding='utf-8') as __plan_file:
+                __meals = json.load(__plan_file)
+            # Recently used files are evicted last
+            os.utime(__plan_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as err:
+            self._configuration.warn_log('Cannot read cached plan %s: %s', __plan_path, err)
+            return None
+        return __meals
+
+    def __write_plan_file(self, _key, _meals):
+        """
+        Store meal records in cache directory (atomically : concurrent runs share it)
+        :param _key:
+        :type _key:
+        :param _meals:
+        :type _meals:
+        """
+        __data = json.dumps(_meals, ensure_ascii=False).encode('utf-8')
+        try:
+            os.makedirs(self.__cache_dir, exist_ok=True)
+            __file_descriptor, __temporary_path = tempfile.mkstemp(dir=self.__cache_dir,
+                                                                   suffix='.tmp')
+            try:
+                with os.fdopen(__file_descriptor, 'wb') as __plan_file:
+                    __plan_file.write(__data)
+                os.replace(__temporary_path, self.__get_plan_path(_key))
+            except OSError:
+                os.unlink(__temporary_path)
+                raise
+        except OSError as err:
+            self._configuration.warn_log('Cannot write cached plan in %s: %s',
+                                         self.__cache_dir, err)
+            return
+
+        if self.__disk_usage is None:
+            self.__disk_usage = sum(__size for _, __size, _ in self.__scan_plan_files())
+        else:
+            self.__disk_usage += len(__data)
+        if self.__disk_usage > self.__disk_size:
+            self.__evict_plan_files()
+
+    def __scan_plan_files(self):
+        """
+        (path, size, last use) of every plan file in cache directory
+        :return:
+        :rtype: list
+        """
+        __plan_files = []
+        try:
+            with os.scandir(self.__cache_dir) as __entries:
+                for __entry in __entries:
+                    if not __entry.name.endswith(PLAN_FILE_SUFFIX):
+                        continue
+                    try:
+                        __stat = __entry.stat()
+                    except OSError:
+                        continue
+                    __plan_files.append((__entry.path, __stat.st_size, __stat.st_mtime_ns))
+        except OSError as err:
+            self._configuration.warn_log('Cannot scan plan cache %s: %s', self.__cache_dir, err)
+        return __plan_files
+
+    def __evict_plan_files(self):
+        """
+        Delete least recently used plan files until cache directory is below its size limit
+        """
+        __plan_files = sorted(self.__scan_plan_files(), key=lambda __plan_file: __plan_file[2])
+        __disk_usage = sum(__size for _, __size, _ in __plan_files)
+        __target_size = self.__disk_size * DISK_EVICTION_RATIO
+        __evicted = 0
+        for __plan_path, __size, _ in __plan_files:
+            if __disk_usage <= __target_size:
+                break
+            try:
+                os.unlink(__plan_path)
+            except FileNotFoundError:
+                pass
+            except OSError as err:
+                self._configuration.warn_log('Cannot evict cached plan %s: %s', __plan_path, err)
+                continue
+            __disk_usage -= __size
+            __evicted += 1
+        self.__disk_usage = __disk_usage
+        self._configuration.get_profiler().count('plan_cache.evictions', __evicted)
+        self._configuration.verbose_log('Plan cache: %d plan(s) evicted', __evicted)
@@ -0,0 +1,163 @@
+"""
+Meal for a week : stage timings and counters
+
+A Profiler is owned by Configuration and shared by every object using it.
+It records wall time and number of calls of named stages, counters and observed values
+(ie : candidate pool sizes). When it is not enabled, stage() returns a reusable no-op context
+and counters are not recorded, so instrumented code runs at (almost) full speed.
+"""
+import contextlib
+import json
+import time
+
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class _Stage:
+    """
+    Context manager timing one call of a stage
+    """
+    __slots__ = ('__statistics', '__start')
+
+    def __init__(self, _statistics):
+        """
+
+        :param _statistics: [calls, seconds] of the stage
+        :type _statistics:
+        """
+        self.__statistics = _statistics
+        self.__start = 0.0
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.__statistics[0] += 1
+        self.__statistics[1] += time.perf_counter() - self.__start
+        return False
+
+
+class Profiler:
+    """
+    Profiler class
+    """
+    def __init__(self):
+        """
+        Init a disabled Profiler
+        """
+        self.__is_enabled = False
+        # stage name -> [calls, seconds]
+        self.__stages = {}
+        # counter name -> value
+        self.__counters = {}
+        # value name -> [count, total, min, max]
+        self.__values = {}
+
+    def enable(self):
+        """
+        Enable profiling
+        """
+        self.__is_enabled = True
+
+    def is_enabled(self):
+        """
+
+        :return:
+        :rtype: bool
+        """
+        return self.__is_enabled
+
+    def stage(self, _name):
+        """
+        Context manager timing a call of stage _name
+        :param _name:
+        :type _name:
+        :return:
+        :rtype:
+        """
+        if not self.__is_enabled:
+            return _NULL_STAGE
+        return _Stage(self.__stages.setdefault(_name, [0, 0.0]))
+
+    def count(self, _name, _value=1):
+        """
+        Add _value to counter _name
+        :param _name:
+        :type _name:
+        :param _value:
+        :type _value:
+        """
+        if self.__is_enabled:
+            self.__counters[_name] = self.__counters.get(_name, 0) + _value
+
+    def observe(self, _name, _value):
+        """
+        Record an observation of _name (count, mean, min and max are reported)
+        :param _name:
+        :type _name:
+        :param _value:
+        :type _value:
+        """
+        if not self.__is_enabled:
+            return
+        __statistics = self.__values.get(_name)
+        if __statistics is None:
+            self.__values[_name] = [1, _value, _value, _value]
+        else:
+            __statistics[0] += 1
+            __statistics[1] += _value
+            __statistics[2] = min(__statistics[2], _value)
+            __statistics[3] = max(__statistics[3], _value)
+
+    def get_report(self):
+        """
+        Recorded data, as a JSON-serializable dict
+        :return:
+        :rtype: dict
+        """
+        return {
+            'stages': {__name: {'calls': __calls, 'seconds': __seconds}
+                       for __name, (__calls, __seconds) in self.__stages.items()},
+            'counters': dict(self.__counters),
+            'values': {__name: {'count': __count, 'mean': __total / __count,
+                                'min': __minimum, 'max': __maximum}
+                       for __name, (__count, __total, __minimum, __maximum)
+                       in self.__values.items()},
+        }
+
+    def format_json(self):
+        """
+
+        :return:
+        :rtype: str
+        """
+        return json.dumps(self.get_report(), indent=2, sort_keys=True)
+
+    def format_table(self):
+        """
+        Recorded data, as a summary table
+        :return:
+        :rtype: str
+        """
+        __report = self.get_report()
+        __lines = ['{0:<40} {1:>8} {2:>12} {3:>12}'.format('Stage', 'Calls', 'Total (ms)',
+                                                           'Mean (ms)')]
+        for __name, __stage in __report['stages'].items():
+            __lines.append('{0:<40} {1:>8} {2:>12.3f} {3:>12.3f}'.format(
+                __name, __stage['calls'], __stage['seconds'] * 1000,
+                __stage['seconds'] * 1000 / __stage['calls'] if __stage['calls'] else 0))
+        if __report['counters']:
+            __lines.append('')
+            __lines.append('{0:<40} {1:>8}'.format('Counter', 'Value'))
+            for __name, __value in sorted(__report['counters'].items()):
+                __lines.append('{0:<40} {1:>8}'.format(__name, __value))
+        if __report['values']:
+            __lines.append('')
+            __lines.append('{0:<40} {1:>8} {2:>12} {3:>12} {4:>12}'.format(
+                'Value', 'Count', 'Mean', 'Min', 'Max'))
+            for __name, __value in sorted(__report['values'].items()):
+                __lines.append('{0:<40} {1:>8} {2:>12.1f} {3:>12} {4:>12}'.format(
+                    __name, __value['count'], __value['mean'], __value['min'], __value['max']))
+        return '\n'.join(__lines)
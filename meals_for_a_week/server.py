@@ -0,0 +1,409 @@
+"""
+Meal for a week : long-running planning server
+
+Databases are loaded, built and filtered once, then kept in memory while clients
+generate meal plans and accept (written to history) or reject them.
+The API is a minimal HTTP/1.1 JSON API (keep-alive), served by asyncio
+on a local TCP address (HOST:PORT) or on a Unix socket (unix:PATH) :
+
+  POST /plans                 {"meals": 7, "veggie_meals": 2, "special_meals": 1,
+                               "leftovers": ["tomate"], "seed": 42}   (every key is optional)
+                              -> 201 {"id": 1, "meals": [{"meal": ..., ...}, ...]}
+  POST /plans/<id>/accept     -> 200 {"id": 1, "status": "accepted"}  (plan written to history)
+  POST /plans/<id>/reject     -> 200 {"id": 1, "status": "rejected"}
+
+ie : curl --unix-socket /tmp/meals.sock -d '{"meals": 5}' http://localhost/plans
+"""
+import asyncio
+import collections
+import datetime
+import json
+import os
+import random
+import sys
+import time
+from meals_for_a_week.meals_for_a_week import MealGenerator, NotEnoughMealsError # noqa
+from meals_for_a_week.history import HistoryDatabase # noqa
+from meals_for_a_week.plan_cache import PlanCache, get_meal_records # noqa
+from meals_for_a_week.yaml_io import YAMLError # noqa
+
+
+# Generated plans waiting to be accepted or rejected (oldest ones are forgotten first)
+MAX_PENDING_PLANS = 1024
+# Requests larger than that are refused
+MAX_BODY_SIZE = 64 * 1024
+
+HTTP_REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+                405: 'Method Not Allowed', 413: 'Payload Too Large',
+                422: 'Unprocessable Entity', 500: 'Internal Server Error',
+                503: 'Service Unavailable'}
+
+
+class RequestError(Exception):
+    """
+    Raised when a request cannot be served : carries the HTTP status to answer with
+    """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PlanningServer:
+    """
+    PlanningServer class
+    """
+    def __init__(self, _configuration, database, seasonal_database=None, history_path=None,
+                 number_of_history_meals=0, default_settings=None, seed=None, plan_cache=None):
+        """
+
+        :param _configuration:
+        :type _configuration:
+        :param database: built MealDatabase (with reload enabled to follow file changes)
+        :type database:
+        :param seasonal_database: built SeasonalDatabase
+        :type seasonal_database:
+        :param history_path: history file accepted plans are appended to
+        :type history_path:
+        :param number_of_history_meals: weeks of history excluded from plans
+        :type number_of_history_meals:
+        :param default_settings: settings used for keys missing from a request
+        :type default_settings:
+        :param seed: seed of plans generated without their own seed
+        :type seed:
+        :param plan_cache: PlanCache of plans generated with their own seed (in memory if None)
+        :type plan_cache:
+        """
+        self._configuration = _configuration
+        self._database = database
+        self._seasonal_database = seasonal_database
+        self._number_of_history_meals = number_of_history_meals
+        self._default_settings = {'meals': 7, 'veggie_meals': 0, 'special_meals': 0,
+                                  'leftovers': None}
+        if default_settings:
+            self._default_settings.update(default_settings)
+        self.__random = random.Random(seed)
+        self.__plan_cache = plan_cache if plan_cache else PlanCache(self._configuration)
+        self.__history_database = None
+        if history_path:
+            self.__history_database = HistoryDatabase(history_path, self._configuration)
+            if number_of_history_meals > 0:
+                self.__history_database.load(number_of_history_meals)
+        # Plans waiting for acceptance : id -> list of Meal objects
+        self.__pending_plans = collections.OrderedDict()
+        self.__next_plan_id = 1
+        self.__filtered_view = None
+        # Date the filtered view was computed for : seasonal vegetables follow its month
+        self.__filter_date = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Filter database again (after a database reload, an accepted plan or a new month)
+        """
+        self.__filter_date = datetime.date.today()
+        __view = self._database.get().get_view()
+        __history = self.__history_database if self._number_of_history_meals > 0 else None
+        if self._seasonal_database or __history:
+            self._database.filter(self._seasonal_database, __history,
+                                  self._number_of_history_meals, __view, self.__filter_date)
+        self.__filtered_view = __view
+
+    def reload(self):
+        """
+        Reload databases whose file changed since they were loaded,
+        filter database again when they changed or when a new month started
+        """
+        __is_changed = self._database.reload()
+        if self._seasonal_database and self._seasonal_database.reload():
+            __is_changed = True
+        __today = datetime.date.today()
+        if (__today.year, __today.month) != (self.__filter_date.year, self.__filter_date.month):
+            __is_changed = True
+        if __is_changed:
+            self.refresh()
+
+    def generate(self, _request):
+        """
+        Generate a plan, kept pending until accepted or rejected
+        :param _request: plan settings
+        :type _request: dict
+        :return:
+        :rtype: dict
+        """
+        if not isinstance(_request, dict):
+            raise RequestError(400, 'Request body must be a JSON object')
+        __settings = dict(self._default_settings)
+        __settings.update(_request)
+        # A string is iterable too : it would be read as one leftover per character
+        __leftovers = __settings['leftovers'] or []
+        if not isinstance(__leftovers, list) \
+                or not all(isinstance(__leftover, str) for __leftover in __leftovers):
+            raise RequestError(400, 'Invalid plan settings: leftovers must be a list of strings')
+        try:
+            __number_of_meals = int(__settings['meals'])
+            __number_of_veggie_meals = int(__settings['veggie_meals'])
+            __number_of_special_meals = int(__settings['special_meals'])
+            __leftovers = [__leftover.lower() for __leftover in __leftovers]
+            __random = random.Random(int(__settings['seed'])) if 'seed' in __settings \
+                else self.__random
+        except (TypeError, ValueError) as err:
+            raise RequestError(400, 'Invalid plan settings: {0}'.format(err)) from err
+        if min(__number_of_meals, __number_of_veggie_meals, __number_of_special_meals) < 0:
+            raise RequestError(400, 'Invalid plan settings: negative number of meals')
+
+        if __number_of_veggie_meals + __number_of_special_meals > __number_of_meals:
+            raise RequestError(422, 'You asked for too many veggie or special meals')
+
+        try:
+            self.reload()
+        except (YAMLError, OSError, TypeError, ValueError, AttributeError, KeyError) as err:
+            # Filtered view of the last databases built is kept : next requests are served from it
+            self._configuration.error_log('Cannot reload databases: %s', err)
+            raise RequestError(503, 'Cannot reload databases: {0}'.format(err)) from err
+        __plan_key = None
+        if 'seed' in __settings:
+            __plan_key = self.__get_plan_key(__settings, __leftovers)
+            __meals = self.__plan_cache.get(__plan_key)
+            if __meals is not None:
+                return self.__add_pending_plan(
+                    [self._database.get_meals_by_name(__meal['meal'])[0] for __meal in __meals],
+                    __meals)
+
+        __view = self.__filtered_view.get_view()
+        __view.set_leftover_mode(bool(__leftovers))
+        __meal_generator = MealGenerator(self._configuration, __view, __number_of_meals,
+                                         __random)
+        __meal_generator.set_veggie_limit(__number_of_veggie_meals)
+        __meal_generator.set_special_limit(__number_of_special_meals)
+        if not __meal_generator.is_config_valid():
+            raise RequestError(422, 'Config is invalid')
+        try:
+            __meal_generator.generate(__leftovers)
+        except NotEnoughMealsError as err:
+            raise RequestError(422, str(err)) from err
+
+        __meals = __meal_generator.get().get()
+        __meal_records = get_meal_records(__meals)
+        if __plan_key:
+            self.__plan_cache.put(__plan_key, __meal_records)
+        return self.__add_pending_plan(__meals, __meal_records)
+
+    def __get_plan_key(self, _settings, _leftovers):
+        """
+        Plan cache key of a seeded plan request
+        :param _settings:
+        :type _settings:
+        :param _leftovers:
+        :type _leftovers:
+        :return:
+        :rtype:
+        """
+        __history_meal_names = None
+        if self.__history_database and self._number_of_history_meals > 0:
+            __history_meal_names = self.__history_database.get_recent_meal_names(
+                self._number_of_history_meals)
+        return self.__plan_cache.get_key(
+            self._database.get_path(),
+            self._seasonal_database.get_path() if self._seasonal_database else None,
+            __history_meal_names,
+            {'meals': int(_settings['meals']), 'veggie_meals': int(_settings['veggie_meals']),
+             'special_meals': int(_settings['special_meals']), 'leftovers': _leftovers},
+            int(_settings['seed']))
+
+    def __add_pending_plan(self, _meals, _meal_records):
+        """
+        Keep a generated plan until it is accepted or rejected
+        :param _meals: Meal objects of the plan
+        :type _meals:
+        :param _meal_records: their JSON records
+        :type _meal_records:
+        :return:
+        :rtype: dict
+        """
+        __plan_id = self.__next_plan_id
+        self.__next_plan_id += 1
+        self.__pending_plans[__plan_id] = _meals
+        if len(self.__pending_plans) > MAX_PENDING_PLANS:
+            self.__pending_plans.popitem(last=False)
+        return {'id': __plan_id, 'meals': _meal_records}
+
+    def accept(self, _plan_id):
+        """
+        Accept a pending plan : it is written to history and excluded from next plans
+        :param _plan_id:
+        :type _plan_id:
+        :return:
+        :rtype: dict
+        """
+        __meals = self.__pop_pending_plan(_plan_id)
+        if self.__history_database:
+            self.__history_database.append(__meals)
+            if self._number_of_history_meals > 0:
+                self.refresh()
+        return {'id': _plan_id, 'status': 'accepted'}
+
+    def reject(self, _plan_id):
+        """
+        Reject a pending plan
+        :param _plan_id:
+        :type _plan_id:
+        :return:
+        :rtype: dict
+        """
+        self.__pop_pending_plan(_plan_id)
+        return {'id': _plan_id, 'status': 'rejected'}
+
+    def __pop_pending_plan(self, _plan_id):
+        """
+
+        :param _plan_id:
+        :type _plan_id:
+        :return:
+        :rtype:
+        """
+        if _plan_id not in self.__pending_plans:
+            raise RequestError(404, 'No pending plan {0}'.format(_plan_id))
+        return self.__pending_plans.pop(_plan_id)
+
+    def dispatch(self, _method, _path, _body):
+        """
+        Serve a request
+        :param _method:
+        :type _method:
+        :param _path:
+        :type _path:
+        :param _body:
+        :type _body: bytes
+        :return: (HTTP status, JSON-serializable response)
+        :rtype: tuple
+        """
+        __parts = _path.split('?', 1)[0].strip('/').split('/')
+        if __parts[0] != 'plans' or len(__parts) not in (1, 3) \
+                or (len(__parts) == 3 and __parts[2] not in ('accept', 'reject')):
+            raise RequestError(404, 'Unknown path ' + _path)
+        if _method != 'POST':
+            raise RequestError(405, 'Use POST')
+
+        if len(__parts) == 1:
+            try:
+                __request = json.loads(_body) if _body.strip() else {}
+            except ValueError as err:
+                raise RequestError(400, 'Invalid JSON: {0}'.format(err)) from err
+            return 201, self.generate(__request)
+
+        try:
+            __plan_id = int(__parts[1])
+        except ValueError as err:
+            raise RequestError(404, 'Unknown plan ' + __parts[1]) from err
+        if __parts[2] == 'accept':
+            return 200, self.accept(__plan_id)
+        return 200, self.reject(__plan_id)
+
+    async def handle_client(self, _reader, _writer):
+        """
+        Serve requests of a client connection until it is closed
+        :param _reader:
+        :type _reader: asyncio.StreamReader
+        :param _writer:
+        :type _writer: asyncio.StreamWriter
+        """
+        try:
+            while True:
+                __request_line = await _reader.readline()
+                if not __request_line.strip():
+                    break
+                __headers = {}
+                while True:
+                    __header_line = await _reader.readline()
+                    if not __header_line.strip():
+                        break
+                    __name, _, __value = __header_line.decode('latin-1').partition(':')
+                    __headers[__name.strip().lower()] = __value.strip()
+
+                __start = time.perf_counter()
+                __keep_alive = __headers.get('connection', '').lower() != 'close'
+                # Logged as is when the request line cannot be parsed
+                __method, __path = '-', '-'
+                try:
+                    __method, __path, _ = __request_line.decode('latin-1').split(' ', 2)
+                    __length = int(__headers.get('content-length', 0))
+                    if __length > MAX_BODY_SIZE:
+                        __keep_alive = False
+                        raise RequestError(413, 'Request body too large')
+                    __body = await _reader.readexactly(__length) if __length else b''
+                    __status, __response = self.dispatch(__method, __path, __body)
+                except RequestError as err:
+                    __status, __response = err.status, {'error': str(err)}
+                except ValueError:
+                    __status, __response = 400, {'error': 'Invalid request'}
+                    __keep_alive = False
+                except Exception as err: # pylint: disable=broad-except
+                    # A failed request must not stop the server nor leave the client unanswered
+                    self._configuration.error_log('%s %s failed: %r', __method, __path, err)
+                    __status, __response = 500, {'error': 'Internal error'}
+
+                __data = json.dumps(__response, ensure_ascii=False).encode('utf-8')
+                _writer.write('HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\n'
+                              'Content-Length: {2}\r\nConnection: {3}\r\n\r\n'.format(
+                                  __status, HTTP_REASONS.get(__status, ''), len(__data),
+                                  'keep-alive' if __keep_alive else 'close').encode('latin-1')
+                              + __data)
+                await _writer.drain()
+                self._configuration.debug_log('%s %s -> %d in %.3f ms', __method, __path,
+                                              __status, (time.perf_counter() - __start) * 1000)
+                if not __keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            _writer.close()
+
+    async def serve(self, _address):
+        """
+        Serve clients forever on _address (HOST:PORT or unix:PATH)
+        :param _address:
+        :type _address:
+        """
+        if _address.startswith('unix:'):
+            __socket_path = _address[len('unix:'):]
+            if os.path.exists(__socket_path):
+                os.unlink(__socket_path)
+            __server = await asyncio.start_unix_server(self.handle_client, __socket_path)
+        else:
+            __host, _, __port = _address.rpartition(':')
+            __server = await asyncio.start_server(self.handle_client, __host or '127.0.0.1',
+                                                  int(__port))
+        print('Serving meal plans on ' + _address, file=sys.stderr)
+        async with __server:
+            await __server.serve_forever()
+
+
+def run_server(address, _configuration, database, seasonal_database, history_path,
+               number_of_history_meals, default_settings, seed=None, plan_cache=None):
+    """
+    Run planning server until interrupted
+    :param address: HOST:PORT or unix:PATH
+    :type address:
+    :param _configuration:
+    :type _configuration:
+    :param database:
+    :type database:
+    :param seasonal_database:
+    :type seasonal_database:
+    :param history_path:
+    :type history_path:
+    :param number_of_history_meals:
+    :type number_of_history_meals:
+    :param default_settings:
+    :type default_settings:
+    :param seed:
+    :type seed:
+    :param plan_cache:
+    :type plan_cache:
+    """
+    __server = PlanningServer(_configuration, database, seasonal_database, history_path,
+                              number_of_history_meals, default_settings, seed, plan_cache)
+    try:
+        asyncio.run(__server.serve(address))
+    except KeyboardInterrupt:
+        pass
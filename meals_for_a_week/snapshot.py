@@ -0,0 +1,124 @@
+"""
+Meal for a week : compiled snapshot of built databases
+
+A snapshot is a pickle file stored next to its yaml source (ie : .database.yaml.snapshot).
+It holds a header identifying the source file content followed by the already built objects,
+so that a later run can skip yaml parsing and building entirely.
+"""
+import hashlib
+import io
+import os
+import pickle
+
+
+# Bump when the layout of pickled objects changes
+SNAPSHOT_VERSION = 8
+SNAPSHOT_SUFFIX = '.snapshot'
+
+
+def get_snapshot_path(source_path):
+    """
+    Get snapshot path for a yaml source file
+    :param source_path:
+    :type source_path:
+    :return:
+    :rtype:
+    """
+    __directory, __file_name = os.path.split(source_path)
+    return os.path.join(__directory, '.' + __file_name + SNAPSHOT_SUFFIX)
+
+
+def get_source_signature(source_path):
+    """
+    Signature of the yaml source : a snapshot is only valid for the same signature
+    :param source_path:
+    :type source_path:
+    :return:
+    :rtype:
+    """
+    __stat = os.stat(source_path)
+    return __stat.st_mtime_ns, __stat.st_size
+
+
+def get_source_digest(source_path):
+    """
+    Hash of the yaml source content : unlike its signature, it changes with an edit
+    keeping file size and modification time
+    :param source_path:
+    :type source_path:
+    :return:
+    :rtype: str
+    """
+    __hash = hashlib.sha256()
+    with open(source_path, 'rb') as __source_file:
+        for __block in iter(lambda: __source_file.read(1024 * 1024), b''):
+            __hash.update(__block)
+    return __hash.hexdigest()
+
+
+def build_header(source_path, kind, payload_size):
+    """
+
+    :param source_path:
+    :type source_path:
+    :param kind:
+    :type kind:
+    :param payload_size: size of pickled payload : a truncated snapshot is not used
+    :type payload_size:
+    :return:
+    :rtype:
+    """
+    return SNAPSHOT_VERSION, kind, get_source_digest(source_path), payload_size
+
+
+def read_snapshot(source_path, kind):
+    """
+    Read snapshot with a single read and return its (still pickled) payload
+    Return None when there is no snapshot or when it is outdated
+    :param source_path:
+    :type source_path:
+    :param kind:
+    :type kind:
+    :return:
+    :rtype: bytes
+    """
+    try:
+        with open(get_snapshot_path(source_path), 'rb') as __snapshot_file:
+            __data = __snapshot_file.read()
+        __stream = io.BytesIO(__data)
+        __header = pickle.load(__stream)
+        __payload = __data[__stream.tell():]
+        # Source is hashed only when the snapshot is of this version and kind
+        if not isinstance(__header, tuple) or __header[:2] != (SNAPSHOT_VERSION, kind) \
+                or __header != build_header(source_path, kind, len(__payload)):
+            return None
+        return __payload
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        return None
+
+
+def write_snapshot(source_path, kind, content):
+    """
+    Atomically write snapshot for source_path
+    Return pickled payload or None if snapshot cannot be written
+    :param source_path:
+    :type source_path:
+    :param kind:
+    :type kind:
+    :param content:
+    :type content:
+    :return:
+    :rtype: bytes
+    """
+    __snapshot_path = get_snapshot_path(source_path)
+    __temporary_path = __snapshot_path + '.tmp'
+    __payload = pickle.dumps(content, protocol=pickle.HIGHEST_PROTOCOL)
+    try:
+        with open(__temporary_path, 'wb') as __snapshot_file:
+            pickle.dump(build_header(source_path, kind, len(__payload)), __snapshot_file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+            __snapshot_file.write(__payload)
+        os.replace(__temporary_path, __snapshot_path)
+    except OSError:
+        return None
+    return __payload
@@ -0,0 +1,350 @@
+"""
+Meal for a week : constraint-solving meal plan generation
+
+PlanSolver generates a whole meal list in a single search instead of independent random draws.
+Constraints :
+- the number of veggie, special and other meals of the plan
+- at most one meal of each group (ie : a single lasagne variant a week)
+- every leftover ingredient is used by a meal of the plan (when an enabled meal uses it)
+- only meals enabled in the filtered database are chosen (seasonal and history exclusions)
+
+The search is a backtracking search with forward checking :
+leftover ingredients are covered first (the ingredient with fewest candidate meals first),
+then remaining slots are filled from randomly ordered candidate pools.
+After each choice, every uncovered ingredient must still have a candidate meal
+and every meal type must still have enough candidates, otherwise the choice is undone.
+"""
+from meals_for_a_week.meals_for_a_week import MealCollection, MealGenerator, \
+    NotEnoughMealsError # noqa
+
+
+# Search steps after which the search gives up
+MAX_SEARCH_STEPS = 100000
+
+
+class _ShuffledPool:
+    """
+    Candidate pool in random order, shuffled lazily (Fisher-Yates step on each new position) :
+    only the meals a search looks at are shuffled
+    """
+    __slots__ = ('__pool', '__random', '__count', '__positions', '__shuffled')
+
+    def __init__(self, _pool, _random):
+        """
+
+        :param _pool: MealPool or MealPoolView, must not change while this object is used
+        :type _pool:
+        :param _random: random number generator
+        :type _random:
+        """
+        self.__pool = _pool
+        self.__random = _random
+        self.__count = _pool.get_count()
+        # Shuffled position -> pool position, when they differ
+        self.__positions = {}
+        self.__shuffled = 0
+
+    def get_count(self):
+        """
+
+        :return:
+        :rtype: int
+        """
+        return self.__count
+
+    def get_at(self, _index):
+        """
+        Meal at _index in shuffled order
+        :param _index:
+        :type _index:
+        :return:
+        :rtype: Meal
+        """
+        while self.__shuffled <= _index:
+            __other = self.__random.randrange(self.__shuffled, self.__count)
+            __position = self.__positions.get(self.__shuffled, self.__shuffled)
+            self.__positions[self.__shuffled] = self.__positions.get(__other, __other)
+            self.__positions[__other] = __position
+            self.__shuffled += 1
+        return self.__pool.get_at(self.__positions.get(_index, _index))
+
+
+class PlanSolver(MealGenerator):
+    """
+    PlanSolver class : MealGenerator solving all plan constraints at once
+    """
+    def __init__(self, _configuration, meal_database, meal_limit, _random=None):
+        """
+
+        :param meal_database: filtered MealCollection (view) to choose meals from
+        :type meal_database:
+        :param meal_limit:
+        :type meal_limit:
+        :param _random: random number generator, used for every choice
+        :type _random: random.Random
+        """
+        super().__init__(_configuration, meal_database, meal_limit, _random)
+        self.__random = None
+        # Meal type -> candidate pool, shuffled candidate pool
+        self.__pools = {}
+        self.__shuffled_pools = {}
+        # Meal type -> number of meals still to choose, number of candidates not chosen yet
+        self.__remaining = {}
+        self.__available = {}
+        # Meal type -> first shuffled position to fill next meal of this type from
+        # (meals of a type are chosen in shuffled order : plans are not explored twice)
+        self.__next_positions = {}
+        # Leftover ingredient -> candidate meals
+        self.__meals_by_ingredient = {}
+        # Candidate meal -> meal types of the pools it belongs to
+        # (pool membership of a view is looked up through its parents : it is looked up once)
+        self.__pool_types_by_meal = {}
+        self.__uncovered_ingredients = set()
+        # Chosen (meal type, meal) pairs, meals and groups
+        self.__choices = []
+        self.__chosen_meals = set()
+        self.__chosen_groups = set()
+        self.__search_steps = 0
+
+    def generate(self, _leftovers):
+        """
+        Solve plan constraints, chosen meals are added to the meal list (see get())
+        Raise NotEnoughMealsError when no plan satisfies them
+        :param _leftovers:
+        :type _leftovers:
+        """
+        __profiler = self._configuration.get_profiler()
+        if _leftovers:
+            self._meal_database.set_leftover_mode(True)
+        self.__random = self._meal_database.get_random_generator()
+
+        # Same candidate pools as MealCollection.get_random_meal_by_type
+        __pool_names = {
+            'VEGGIE': MealCollection.POOL_VEGGIE,
+            'SPECIAL': MealCollection.POOL_SPECIAL,
+            'NORMAL': MealCollection.POOL_NORMAL_LENIENT if self._meal_database.is_leftover_mode()
+                      else MealCollection.POOL_NORMAL_STRICT,
+        }
+        __meal_types = self._configuration.get_meal_types()
+        for __meal_type in __meal_types:
+            if __meal_type == 'NORMAL':
+                # Meal limit counts veggie and special meals too
+                self.__remaining[__meal_type] = self._meal_limit - self._meal_veggie_limit \
+                    - self._meal_special_limit
+            else:
+                self.__remaining[__meal_type] = self.get_meal_limit_by_type(__meal_type)
+            self.__pools[__meal_type] = self._meal_database.get_pool(__pool_names[__meal_type])
+            self.__shuffled_pools[__meal_type] = _ShuffledPool(self.__pools[__meal_type],
+                                                               self.__random)
+            self.__available[__meal_type] = self.__pools[__meal_type].get_count()
+            self.__next_positions[__meal_type] = 0
+            if __profiler.is_enabled():
+                __profiler.observe('pool_size.' + __meal_type, self.__available[__meal_type])
+
+        # Sorted : same search (and plan) for a given seed
+        for __ingredient in sorted(set(_leftovers or ())):
+            __meals = [__meal
+                       for __meal in self._meal_database.get_meals_by_ingredient(__ingredient)
+                       if self.__get_meal_types(__meal)]
+            if __meals:
+                self.__meals_by_ingredient[__ingredient] = __meals
+                self.__uncovered_ingredients.add(__ingredient)
+            else:
+                self._configuration.verbose_log('No available meal uses leftover %s', __ingredient)
+
+        with __profiler.stage('generate.solve'):
+            __is_solved = self.__is_consistent() and self.__solve()
+        __profiler.count('solver.steps', self.__search_steps)
+        self._configuration.debug_log('Plan solved in %d step(s)', self.__search_steps)
+        if not __is_solved:
+            raise NotEnoughMealsError('Cannot find a meal list satisfying every constraint')
+
+        for __meal_type in __meal_types:
+            for __choice_type, __meal in self.__choices:
+                if __choice_type == __meal_type:
+                    self._meal_collection.add(__meal)
+
+    def __get_meal_types(self, _meal):
+        """
+        Meal types with meals still to choose _meal can be chosen as
+        :param _meal:
+        :type _meal:
+        :return:
+        :rtype: list
+        """
+        return [__meal_type for __meal_type in self.__get_pool_types(_meal)
+                if self.__remaining[__meal_type] > 0]
+
+    def __get_pool_types(self, _meal):
+        """
+        Meal types of the candidate pools _meal belongs to
+        :param _meal:
+        :type _meal:
+        :return:
+        :rtype: tuple
+        """
+        __pool_types = self.__pool_types_by_meal.get(_meal)
+        if __pool_types is None:
+            __pool_types = tuple(__meal_type for __meal_type, __pool in self.__pools.items()
+                                 if __pool.contains(_meal))
+            self.__pool_types_by_meal[_meal] = __pool_types
+        return __pool_types
+
+    def __is_candidate(self, _meal):
+        """
+        Whether _meal can still be chosen (not chosen yet, nor a meal of its group)
+        :param _meal:
+        :type _meal:
+        :return:
+        :rtype: bool
+        """
+        return _meal not in self.__chosen_meals \
+            and (_meal.get_group() is None or _meal.get_group() not in self.__chosen_groups)
+
+    def __get_candidates(self, _ingredient):
+        """
+        Meals which can still be chosen to use leftover _ingredient
+        :param _ingredient:
+        :type _ingredient:
+        :return:
+        :rtype: list
+        """
+        return [__meal for __meal in self.__meals_by_ingredient[_ingredient]
+                if self.__is_candidate(__meal) and self.__get_meal_types(__meal)]
+
+    def __choose(self, _meal_type, _meal):
+        """
+
+        :param _meal_type:
+        :type _meal_type:
+        :param _meal:
+        :type _meal:
+        :return: leftover ingredients covered by _meal
+        :rtype: set
+        """
+        self.__choices.append((_meal_type, _meal))
+        self.__chosen_meals.add(_meal)
+        if _meal.get_group() is not None:
+            self.__chosen_groups.add(_meal.get_group())
+        self.__remaining[_meal_type] -= 1
+        for __meal_type in self.__get_pool_types(_meal):
+            self.__available[__meal_type] -= 1
+        __covered_ingredients = self.__uncovered_ingredients.intersection(
+            _meal.get_mandatory_ingredients())
+        self.__uncovered_ingredients.difference_update(__covered_ingredients)
+        return __covered_ingredients
+
+    def __undo(self, _covered_ingredients):
+        """
+        Undo last choice
+        :param _covered_ingredients: leftover ingredients covered by last choice
+        :type _covered_ingredients:
+        """
+        __meal_type, __meal = self.__choices.pop()
+        self.__chosen_meals.discard(__meal)
+        self.__chosen_groups.discard(__meal.get_group())
+        self.__remaining[__meal_type] += 1
+        for __pool_meal_type in self.__pool_types_by_meal[__meal]:
+            self.__available[__pool_meal_type] += 1
+        self.__uncovered_ingredients.update(_covered_ingredients)
+
+    def __is_consistent(self):
+        """
+        Forward checking : whether remaining choices can still satisfy every constraint
+        (necessary condition only : groups are checked when meals are chosen)
+        :return:
+        :rtype: bool
+        """
+        for __meal_type, __remaining in self.__remaining.items():
+            if __remaining > self.__available[__meal_type]:
+                return False
+        if self.__uncovered_ingredients and not any(self.__remaining.values()):
+            return False
+        for __ingredient in self.__uncovered_ingredients:
+            if not any(self.__is_candidate(__meal) and self.__get_meal_types(__meal)
+                       for __meal in self.__meals_by_ingredient[__ingredient]):
+                return False
+        return True
+
+    def __solve(self):
+        """
+        Choose remaining meals : depth-first search with an explicit stack of choice iterators
+        (one per chosen meal : the search depth does not depend on the recursion limit)
+        :return: whether a plan was found
+        :rtype: bool
+        """
+        __choices = self.__get_next_choices()
+        if __choices is None:
+            return True
+        __stack = [__choices]
+        # Leftover ingredients covered by the choice leading to each stacked iterator but the first
+        __covered_stack = []
+        while __stack:
+            __choice = next(__stack[-1], None)
+            if __choice is None:
+                # Every choice failed : undo the choice leading to this iterator
+                __stack.pop()
+                if __covered_stack:
+                    self.__undo(__covered_stack.pop())
+                continue
+            __covered_ingredients = self.__choose(*__choice)
+            if not self.__is_consistent():
+                self.__undo(__covered_ingredients)
+                continue
+            __choices = self.__get_next_choices()
+            if __choices is None:
+                return True
+            __stack.append(__choices)
+            __covered_stack.append(__covered_ingredients)
+        return False
+
+    def __get_next_choices(self):
+        """
+        Choices for the next meal, None when every meal is chosen
+        :return: iterator of (meal type, meal) choices
+        :rtype: generator
+        """
+        self.__search_steps += 1
+        if self.__search_steps > MAX_SEARCH_STEPS:
+            raise NotEnoughMealsError('Cannot find a meal list satisfying every constraint '
+                                      'in ' + str(MAX_SEARCH_STEPS) + ' steps')
+        if self.__uncovered_ingredients:
+            return self.__iter_leftover_choices()
+        __meal_types = [__meal_type for __meal_type, __remaining in self.__remaining.items()
+                        if __remaining > 0]
+        if not __meal_types:
+            return None
+        return self.__iter_meal_type_choices(
+            min(__meal_types, key=lambda __type: self.__available[__type]
+                / self.__remaining[__type]))
+
+    def __iter_leftover_choices(self):
+        """
+        Meals using the uncovered leftover ingredient with fewest candidates, in random order
+        :return:
+        :rtype: generator
+        """
+        __candidates = min((self.__get_candidates(__ingredient)
+                            for __ingredient in sorted(self.__uncovered_ingredients)), key=len)
+        for __meal in self.__random.sample(__candidates, len(__candidates)):
+            for __meal_type in self.__get_meal_types(__meal):
+                yield __meal_type, __meal
+
+    def __iter_meal_type_choices(self, _meal_type):
+        """
+        Meals of _meal_type (the meal type with fewest candidates left per meal to choose),
+        in shuffled order from its next position
+        :param _meal_type:
+        :type _meal_type:
+        :return:
+        :rtype: generator
+        """
+        __shuffled_pool = self.__shuffled_pools[_meal_type]
+        __first_position = self.__next_positions[_meal_type]
+        for __position in range(__first_position, __shuffled_pool.get_count()):
+            __meal = __shuffled_pool.get_at(__position)
+            if not self.__is_candidate(__meal):
+                continue
+            self.__next_positions[_meal_type] = __position + 1
+            yield _meal_type, __meal
+        self.__next_positions[_meal_type] = __first_position
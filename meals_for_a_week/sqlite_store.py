@@ -0,0 +1,640 @@
+"""
+Meal for a week : SQLite storage backend
+
+Meals, seasonal vegetables and history are stored in a single SQLite file,
+created from the yaml files by import_yaml_files().
+SQLiteMealDatabase, SQLiteSeasonalDatabase and SQLiteHistoryDatabase have the interface of
+MealDatabase, SeasonalDatabase and HistoryDatabase used to generate plans (load, build, reload,
+filter, get, history add and commit), not their yaml editing methods (SQLiteMealDatabase has no
+extend, dump_to_yaml_file or get_raw_content : edit the yaml files and import them again).
+Meals are still built as Meal objects
+(meal generation draws from in-memory candidate pools), but filters are indexed SQL queries :
+- seasonal filter : meals using an out of season vegetable (ingredient index)
+- history filter : last weeks of history (date index), then meals with their names (name index)
+Meal types and leftovers are not SQL queries : generation draws meals of a type from the
+candidate pools of the built MealCollection, and finds leftover meals with its ingredient index,
+so type flags are stored but not indexed.
+"""
+import datetime
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+from meals_for_a_week.meals_for_a_week import Meal, MealCollection, MonthlyVegetables, \
+    MealDatabase, SeasonalDatabase, intern_name # noqa
+from meals_for_a_week.history import HistoryDatabase # noqa
+from meals_for_a_week.snapshot import get_source_signature # noqa
+
+
+# Bump when tables change : files of another version must be imported again
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE meals (id INTEGER PRIMARY KEY, name TEXT NOT NULL,
+                    is_veggie INTEGER NOT NULL, is_special INTEGER NOT NULL, meal_group TEXT);
+CREATE INDEX meals_by_name ON meals (name);
+CREATE TABLE ingredients (meal_id INTEGER NOT NULL REFERENCES meals (id),
+                          position INTEGER NOT NULL, ingredient TEXT NOT NULL,
+                          PRIMARY KEY (meal_id, position)) WITHOUT ROWID;
+CREATE INDEX ingredients_by_name ON ingredients (ingredient, meal_id);
+CREATE TABLE months (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE INDEX months_by_name ON months (name);
+CREATE TABLE vegetables (month_id INTEGER NOT NULL REFERENCES months (id),
+                         position INTEGER NOT NULL, vegetable TEXT NOT NULL,
+                         PRIMARY KEY (month_id, position)) WITHOUT ROWID;
+CREATE INDEX vegetables_by_name ON vegetables (vegetable, month_id);
+CREATE TABLE history (id INTEGER PRIMARY KEY, date TEXT, week INTEGER);
+CREATE INDEX history_by_date ON history (date, id);
+CREATE TABLE history_meals (entry_id INTEGER NOT NULL REFERENCES history (id),
+                            position INTEGER NOT NULL, meal TEXT NOT NULL,
+                            PRIMARY KEY (entry_id, position)) WITHOUT ROWID;
+"""
+# Lists of values are bound as a single JSON array parameter
+MEALS_BY_INGREDIENTS_QUERY = """
+SELECT DISTINCT meal_id FROM ingredients
+WHERE ingredient IN (SELECT value FROM json_each(?)) ORDER BY meal_id
+"""
+MEALS_BY_NAMES_QUERY = """
+SELECT id FROM meals WHERE name IN (SELECT value FROM json_each(?)) ORDER BY name, id
+"""
+RECENT_ENTRIES_QUERY = """
+SELECT id FROM history WHERE date IS NOT NULL ORDER BY date DESC, id DESC LIMIT ?
+"""
+ENTRY_MEALS_QUERY = """
+SELECT meal FROM history_meals WHERE entry_id IN (SELECT value FROM json_each(?))
+"""
+# Undated entries (old block history) are older than dated ones
+UNDATED_MEALS_QUERY = """
+SELECT history_meals.meal FROM history JOIN history_meals ON history_meals.entry_id = history.id
+WHERE history.date IS NULL ORDER BY history.id DESC, history_meals.position DESC LIMIT ?
+"""
+
+
+def connect(_path, _configuration):
+    """
+    Open an existing SQLite meal database, exit when it cannot be used
+    :param _path:
+    :type _path:
+    :param _configuration:
+    :type _configuration:
+    :return:
+    :rtype: sqlite3.Connection
+    """
+    try:
+        # mode=rw : a missing file is an error, not a new empty database
+        __connection = sqlite3.connect(
+            pathlib.Path(os.path.abspath(_path)).as_uri() + '?mode=rw', uri=True)
+        __version = __connection.execute('PRAGMA user_version').fetchone()[0]
+    except sqlite3.Error as err:
+        _configuration.error_log('Cannot open SQLite database %s: %s', _path, err)
+        sys.exit(os.EX_NOINPUT)
+    if __version != SCHEMA_VERSION:
+        _configuration.error_log('%s is not a meal database of version %d : '
+                                 'import yaml files again with --import-sqlite',
+                                 _path, SCHEMA_VERSION)
+        sys.exit(os.EX_DATAERR)
+    return __connection
+
+
+def import_yaml_files(sqlite_path, database_path, seasonal_path, history_path, _configuration):
+    """
+    Create SQLite file sqlite_path from yaml files (its previous content is replaced)
+    The file is written next to sqlite_path then renamed : readers never see a partial import
+    :param sqlite_path:
+    :type sqlite_path:
+    :param database_path:
+    :type database_path:
+    :param seasonal_path: None without seasonal file
+    :type seasonal_path:
+    :param history_path: None without history file
+    :type history_path:
+    :param _configuration:
+    :type _configuration:
+    """
+    __database = MealDatabase(database_path, _configuration)
+    __database.enable_streaming()
+    __database.load()
+    __database.build()
+    __months = []
+    if seasonal_path:
+        __seasonal_database = SeasonalDatabase(seasonal_path, _configuration)
+        __seasonal_database.load()
+        __seasonal_database.build()
+        __months = __seasonal_database.get()
+    __entries = []
+    if history_path:
+        __history_database = HistoryDatabase(history_path, _configuration)
+        __history_database.load()
+        __entries = __history_database.get_entries()
+
+    __meals = __database.get().get()
+    __temporary_path = sqlite_path + '.tmp'
+    try:
+        if os.path.exists(__temporary_path):
+            os.unlink(__temporary_path)
+        __connection = sqlite3.connect(__temporary_path)
+        try:
+            with __connection:
+                __connection.executescript(SCHEMA)
+                __connection.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+                __connection.executemany(
+                    'INSERT INTO meals VALUES (?, ?, ?, ?, ?)',
+                    ((__id, __meal.get(), __meal.is_veggie(), __meal.is_special(),
+                      __meal.get_group()) for __id, __meal in enumerate(__meals, 1)))
+                __connection.executemany(
+                    'INSERT INTO ingredients VALUES (?, ?, ?)',
+                    ((__id, __position, __ingredient)
+                     for __id, __meal in enumerate(__meals, 1)
+                     for __position, __ingredient in enumerate(__meal.get_mandatory_ingredients())))
+                __connection.executemany('INSERT INTO months VALUES (?, ?)',
+                                         ((__id, __month.get())
+                                          for __id, __month in enumerate(__months, 1)))
+                __connection.executemany(
+                    'INSERT INTO vegetables VALUES (?, ?, ?)',
+                    ((__id, __position, __vegetable)
+                     for __id, __month in enumerate(__months, 1)
+                     for __position, __vegetable in enumerate(__month.get_vegetables())))
+                insert_history_entries(__connection, __entries)
+            __connection.execute('ANALYZE')
+        finally:
+            __connection.close()
+        os.replace(__temporary_path, sqlite_path)
+    except (OSError, sqlite3.Error) as err:
+        _configuration.error_log('Cannot write SQLite database %s: %s', sqlite_path, err)
+        sys.exit(os.EX_CANTCREAT)
+
+    _configuration.verbose_log('%s: %d meals, %d months, %d history entries imported',
+                               sqlite_path, len(__meals), len(__months), len(__entries))
+
+
+def insert_history_entries(_connection, _entries):
+    """
+    Insert history entries (as read or built by HistoryDatabase), in the current transaction
+    :param _connection:
+    :type _connection:
+    :param _entries:
+    :type _entries:
+    """
+    for __entry in _entries:
+        __date = __entry.get("date")
+        __entry_id = _connection.execute(
+            'INSERT INTO history (date, week) VALUES (?, ?)',
+            (__date.isoformat() if isinstance(__date, datetime.date) else __date,
+             __entry.get("week"))).lastrowid
+        _connection.executemany(
+            'INSERT INTO history_meals VALUES (?, ?, ?)',
+            ((__entry_id, __position, str(__meal_record["meal"]).lower())
+             for __position, __meal_record in enumerate(
+                 __meal_record for __meal_record in __entry["meals"] or []
+                 if "meal" in __meal_record)))
+
+
+class SQLiteMealDatabase:
+    """
+    SQLiteMealDatabase class : MealDatabase read from a SQLite file
+    """
+    def __init__(self, database_path, _configuration):
+        """
+
+        :param database_path: path to SQLite file
+        :type database_path:
+        """
+        self.__database_path = database_path
+        self._configuration = _configuration
+        self.__connection = None
+        self.__meal_database = MealCollection(self._configuration)
+        self.__meal_database.watch_meals()
+        # meals.id -> Meal object, filled by build()
+        self.__meals_by_id = {}
+        self.__source_signature = None
+
+    def get_path(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self.__database_path
+
+    def enable_snapshot(self):
+        """
+        Ignored : meals are read from the SQLite file, there is no yaml to compile
+        """
+
+    def enable_columnar(self):
+        """
+        Ignored (with a warning) : filters are SQL queries
+        """
+        self._configuration.warn_log('Columnar filtering is not available with SQLite storage')
+
+    def enable_reload(self):
+        """
+        Ignored : reload() always builds meals again from the SQLite file
+        """
+
+    def enable_streaming(self):
+        """
+        Ignored : meals are always read row by row from the SQLite file
+        """
+
+    def load(self):
+        """
+        Load function : open SQLite file (meals are read by build())
+        """
+        if self.__connection:
+            self.__connection.close()
+        self.__source_signature = self.__get_source_signature()
+        self.__connection = connect(self.__database_path, self._configuration)
+
+    def __get_source_signature(self):
+        """
+
+        :return: signature of SQLite file, None if it cannot be read
+        :rtype:
+        """
+        try:
+            return get_source_signature(self.__database_path)
+        except OSError:
+            return None
+
+    def is_modified(self):
+        """
+        Return if SQLite file changed since last load()
+        :return:
+        :rtype: bool
+        """
+        __signature = self.__get_source_signature()
+        return __signature is not None and __signature != self.__source_signature
+
+    def reload(self):
+        """
+        Load and build meal database again if SQLite file changed
+        Views obtained before a reload must not be used after it
+        :return: True if the database changed
+        :rtype: bool
+        """
+        if not self.is_modified():
+            return False
+        self.load()
+        self.build()
+        return True
+
+    def build(self):
+        """
+        Build meal database (from scratch : calling it again does not duplicate meals)
+        """
+        __ingredients_by_id = {}
+        for __meal_id, __ingredient in self.__connection.execute(
+                'SELECT meal_id, ingredient FROM ingredients ORDER BY meal_id, position'):
+            __ingredients_by_id.setdefault(__meal_id, []).append(intern_name(__ingredient))
+
+        self.__meal_database = MealCollection(self._configuration)
+        self.__meal_database.watch_meals()
+        self.__meals_by_id = {}
+        for __meal_id, __name, __is_veggie, __is_special, __group in self.__connection.execute(
+                'SELECT id, name, is_veggie, is_special, meal_group FROM meals ORDER BY id'):
+            __meal = Meal(intern_name(__name))
+            if __is_veggie:
+                __meal.set_veggie(True)
+            if __is_special:
+                __meal.set_special(True)
+            if __group:
+                __meal.set_group(intern_name(__group))
+            if __meal_id in __ingredients_by_id:
+                __meal.set_mandatory_ingredients(__ingredients_by_id[__meal_id])
+            self.__meal_database.add(__meal)
+            self.__meals_by_id[__meal_id] = __meal
+
+        self.__meal_database.build_ingredient_index()
+
+    def get(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self.__meal_database
+
+    def get_meals_by_name(self, _name):
+        """
+        Get meals named _name
+        :param _name:
+        :type _name:
+        :return:
+        :rtype:
+        """
+        return [self.__meals_by_id[__meal_id] for (__meal_id,) in self.__connection.execute(
+            'SELECT id FROM meals WHERE name = ? ORDER BY id', (_name,))]
+
+    def get_catalogue(self):
+        """
+        No columnar catalogue with SQLite storage
+        :return:
+        :rtype:
+        """
+        return None
+
+    def filter(self, _seasoning, _history, _number_of_history_meals, _meal_collection=None,
+               _date=None):
+        """
+        Filter database
+        Meals are disabled in the same order as MealDatabase.filter() does :
+        seeded meal lists are the same with yaml files and SQLite storage
+        :param _number_of_history_meals:
+        :type _number_of_history_meals:
+        :param _seasoning:
+        :type _seasoning:
+        :param _history:
+        :type _history:
+        :param _meal_collection: view of the database to filter, instead of the database itself
+        :type _meal_collection:
+        :param _date: date whose month seasonal vegetables are taken from (today if None)
+        :type _date: datetime.date
+        """
+        if _meal_collection:
+            _disable_meal = _meal_collection.disable_meal
+        else:
+            _meal_collection = self.__meal_database
+            _disable_meal = Meal.disable
+        __profiler = self._configuration.get_profiler()
+
+        if _seasoning:
+            with __profiler.stage('filter.seasonal'):
+                # Vegetables restricted to a season which are not available this month
+                _out_of_season_vegetables = _seasoning.get_restricted_vegetable_set() \
+                    - _seasoning.get_current_vegetable_set(_date)
+                self.__disable_meals(MEALS_BY_INGREDIENTS_QUERY,
+                                     sorted(_out_of_season_vegetables),
+                                     _meal_collection, _disable_meal)
+
+        if _history:
+            with __profiler.stage('filter.history'):
+                history_meals = _history.get_recent_meal_names(_number_of_history_meals)
+                self._configuration.debug_log('Meals from history database: %s', history_meals)
+                self.__disable_meals(MEALS_BY_NAMES_QUERY, sorted(history_meals),
+                                     _meal_collection, _disable_meal)
+
+    def __disable_meals(self, _query, _values, _meal_collection, _disable_meal):
+        """
+        Disable meals of _meal_collection whose ids are returned by _query
+        :param _query: query with a single parameter : JSON array of _values
+        :type _query:
+        :param _values:
+        :type _values:
+        :param _meal_collection:
+        :type _meal_collection:
+        :param _disable_meal:
+        :type _disable_meal:
+        """
+        if not _values:
+            return
+        for (__meal_id,) in self.__connection.execute(_query, (json.dumps(_values),)):
+            __meal = self.__meals_by_id[__meal_id]
+            if _meal_collection.has_meal(__meal):
+                _disable_meal(__meal)
+
+
+class SQLiteSeasonalDatabase(SeasonalDatabase):
+    """
+    SQLiteSeasonalDatabase class : SeasonalDatabase read from a SQLite file
+    """
+    def __init__(self, database_path, _configuration):
+        """
+
+        :param database_path: path to SQLite file
+        :type database_path:
+        """
+        super().__init__(database_path, _configuration)
+        self.__connection = None
+
+    def enable_snapshot(self):
+        """
+        Ignored : seasonal vegetables are read from the SQLite file
+        """
+
+    def load_content(self):
+        """
+        Open SQLite file (months are read by build_months())
+        """
+        if self.__connection:
+            self.__connection.close()
+        self.__connection = connect(self.get_path(), self._configuration)
+
+    def build_months(self):
+        """
+        MonthlyVegetables objects of months and vegetables tables
+        :return:
+        :rtype: list
+        """
+        __vegetables_by_month_id = {}
+        for __month_id, __vegetable in self.__connection.execute(
+                'SELECT month_id, vegetable FROM vegetables ORDER BY month_id, position'):
+            __vegetables_by_month_id.setdefault(__month_id, []).append(intern_name(__vegetable))
+        __months = []
+        for __month_id, __name in self.__connection.execute(
+                'SELECT id, name FROM months ORDER BY id'):
+            __month = MonthlyVegetables(intern_name(__name))
+            __month.set_vegetables(__vegetables_by_month_id.get(__month_id, ()))
+            __months.append(__month)
+        return __months
+
+
+class SQLiteHistoryDatabase:
+    """
+    SQLiteHistoryDatabase class : HistoryDatabase stored in a SQLite file
+    """
+    def __init__(self, history_path, _configuration):
+        """
+
+        :param history_path: path to SQLite file
+        :type history_path:
+        """
+        self.__history_path = history_path
+        self._configuration = _configuration
+        self.__connection = None
+        self.__entries = []
+        # Entries added by add(), not written to SQLite file yet
+        self.__pending_entries = []
+        self.__meal_database = MealCollection(self._configuration)
+
+    def get_path(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self.__history_path
+
+    def __get_connection(self):
+        """
+        Open SQLite file on first use
+        :return:
+        :rtype: sqlite3.Connection
+        """
+        if self.__connection is None:
+            self.__connection = connect(self.__history_path, self._configuration)
+        return self.__connection
+
+    def load(self, _number_of_weeks=0):
+        """
+        Load function
+        When _number_of_weeks is set, only the last _number_of_weeks dated entries are read
+        :param _number_of_weeks:
+        :type _number_of_weeks:
+        """
+        __connection = self.__get_connection()
+        if _number_of_weeks > 0:
+            __entry_ids = [__entry_id for (__entry_id,) in __connection.execute(
+                RECENT_ENTRIES_QUERY, (_number_of_weeks,))]
+            __rows = __connection.execute(
+                'SELECT id, date, week FROM history WHERE id IN (SELECT value FROM json_each(?)) '
+                'ORDER BY date, id', (json.dumps(__entry_ids),)).fetchall()
+        else:
+            __rows = __connection.execute(
+                'SELECT id, date, week FROM history ORDER BY date IS NOT NULL, date, id').fetchall()
+
+        __meals_by_entry = {}
+        for __entry_id, __meal in __connection.execute(
+                'SELECT entry_id, meal FROM history_meals '
+                'WHERE entry_id IN (SELECT value FROM json_each(?)) ORDER BY entry_id, position',
+                (json.dumps([__row[0] for __row in __rows]),)):
+            __meals_by_entry.setdefault(__entry_id, []).append({'meal': __meal})
+
+        self.__entries = []
+        for __entry_id, __date, __week in __rows:
+            __entry = {'meals': __meals_by_entry.get(__entry_id, [])}
+            if __date is not None:
+                __entry['date'] = datetime.date.fromisoformat(__date)
+                __entry['week'] = __week
+            self.__entries.append(__entry)
+
+    def build(self):
+        """
+        Build meal collection from history entries, oldest first
+        """
+        self.__meal_database = MealCollection(self._configuration)
+        for __entry in self.__entries:
+            self.__add_entry_meals(__entry)
+
+    def __add_entry_meals(self, _entry):
+        """
+
+        :param _entry:
+        :type _entry:
+        """
+        for __meal_record in _entry["meals"]:
+            self.__meal_database.add(Meal(intern_name(__meal_record["meal"])))
+
+    def get(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self.__meal_database
+
+    def get_recent_meal_names(self, _number_of_weeks):
+        """
+        Names of meals planned over the last _number_of_weeks weeks (weeks added by add() first)
+        Undated entries (old block history) count as 7 meals per week
+        :param _number_of_weeks:
+        :type _number_of_weeks:
+        :return:
+        :rtype: frozenset
+        """
+        __meal_names = set()
+        __weeks_left = _number_of_weeks
+        for __entry in reversed(self.__pending_entries[-_number_of_weeks:]
+                                if _number_of_weeks > 0 else []):
+            __meal_names.update(__meal_record["meal"] for __meal_record in __entry["meals"])
+            __weeks_left -= 1
+        if __weeks_left <= 0:
+            return frozenset(__meal_names)
+
+        __connection = self.__get_connection()
+        __entry_ids = [__entry_id for (__entry_id,) in __connection.execute(
+            RECENT_ENTRIES_QUERY, (__weeks_left,))]
+        __meal_names.update(__meal for (__meal,) in __connection.execute(
+            ENTRY_MEALS_QUERY, (json.dumps(__entry_ids),)))
+        __weeks_left -= len(__entry_ids)
+        if __weeks_left > 0:
+            __meal_names.update(__meal for (__meal,) in __connection.execute(
+                UNDATED_MEALS_QUERY, (__weeks_left * 7,)))
+        return frozenset(__meal_names)
+
+    def get_entries(self):
+        """
+
+        :return:
+        :rtype:
+        """
+        return self.__entries
+
+    def append(self, _meals, _date=None):
+        """
+        Append a week of meals to history
+        :param _meals:
+        :type _meals:
+        :param _date:
+        :type _date:
+        """
+        self.add(_meals, _date)
+        self.commit()
+
+    def add(self, _meals, _date=None):
+        """
+        Add a week of meals to history, in memory only until commit()
+        :param _meals:
+        :type _meals:
+        :param _date:
+        :type _date:
+        """
+        __entry = HistoryDatabase.build_entry(_meals, _date if _date else datetime.date.today())
+        self.__entries.append(__entry)
+        self.__add_entry_meals(__entry)
+        self.__pending_entries.append(__entry)
+
+    def commit(self):
+        """
+        Write weeks added since last commit, in a single transaction
+        """
+        if not self.__pending_entries:
+            return
+        __connection = self.__get_connection()
+        try:
+            with __connection:
+                insert_history_entries(__connection, self.__pending_entries)
+        except sqlite3.Error as err:
+            self._configuration.error_log('SQLite error: %s', err)
+            sys.exit(os.EX_IOERR)
+        self.__pending_entries = []
+
+    def compact(self, _keep_weeks=0):
+        """
+        Delete history entries but the last _keep_weeks dated ones (all entries are kept
+        if _keep_weeks is 0), then rebuild SQLite file
+        :param _keep_weeks:
+        :type _keep_weeks:
+        """
+        __connection = self.__get_connection()
+        try:
+            with __connection:
+                __count = __connection.execute('SELECT count(*) FROM history').fetchone()[0]
+                if _keep_weeks > 0:
+                    __entry_ids = json.dumps([__entry_id for (__entry_id,) in __connection.execute(
+                        RECENT_ENTRIES_QUERY, (_keep_weeks,))])
+                    __connection.execute(
+                        'DELETE FROM history_meals '
+                        'WHERE entry_id NOT IN (SELECT value FROM json_each(?))', (__entry_ids,))
+                    __connection.execute(
+                        'DELETE FROM history WHERE id NOT IN (SELECT value FROM json_each(?))',
+                        (__entry_ids,))
+            __connection.execute('VACUUM')
+        except sqlite3.Error as err:
+            self._configuration.error_log('SQLite error: %s', err)
+            sys.exit(os.EX_IOERR)
+        self.__pending_entries = []
+        self.load()
+
+        self._configuration.verbose_log('History compacted: %d entries kept out of %d',
+                                        len(self.__entries), __count)
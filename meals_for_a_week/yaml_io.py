@@ -0,0 +1,228 @@
+"""
+Meal for a week : yaml input / output shared by database classes
+
+Use libyaml C loader / dumper when PyYAML is built with it,
+fall back to the pure-Python safe loader / dumper otherwise.
+"""
+import os
+import re
+import sys
+import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.events import DocumentStartEvent, MappingStartEvent, MappingEndEvent, \
+    SequenceStartEvent, SequenceEndEvent
+from yaml.resolver import Resolver
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+    from yaml.cyaml import CParser
+    YAML_BACKEND = 'libyaml'
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+    CParser = None
+    YAML_BACKEND = 'python'
+
+
+if CParser:
+    class StreamingLoader(CParser, Composer, SafeConstructor, Resolver):
+        """
+        Safe loader composing nodes one at a time (see iter_yaml_sequence()) :
+        libyaml parser events, composed by the pure-Python composer
+        (libyaml composer only composes whole documents)
+        """
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+else:
+    StreamingLoader = SafeLoader
+
+YAMLError = yaml.YAMLError
+
+# Large enough to never wrap a single-line document (libyaml does not accept infinity)
+YAML_LINE_WIDTH = 2 ** 30
+
+# Yaml anchor ("&name" starting a node), to which aliases ("*name") refer
+ANCHOR_PATTERN = re.compile(r'(?:^|[\s\[{,])&[^\s]')
+
+
+def get_backend():
+    """
+    Name of the yaml backend in use
+    :return:
+    :rtype: str
+    """
+    return YAML_BACKEND
+
+
+def load_yaml_file(file_path, _configuration):
+    """
+    Load yaml file content
+    :param file_path:
+    :type file_path:
+    :param _configuration:
+    :type _configuration:
+    :return:
+    :rtype:
+    """
+    _configuration.verbose_log('Loading %s with %s yaml backend', file_path, YAML_BACKEND)
+    try:
+        __yaml_file = open(file_path, encoding='utf-8')
+    except OSError as err:
+        _configuration.error_log('OS error: %s', err)
+        sys.exit(os.EX_OSFILE)
+    else:
+        with __yaml_file:
+            return yaml.load(__yaml_file, Loader=SafeLoader) or {}
+
+
+def iter_yaml_sequence(file_path, key, _configuration):
+    """
+    Parse the sequence of top-level "key" in a yaml file item by item :
+    each item is yielded as soon as it is parsed, then its yaml nodes are dropped,
+    so that the whole document is never held in memory (values of other keys are skipped)
+    :param file_path:
+    :type file_path:
+    :param key:
+    :type key:
+    :param _configuration:
+    :type _configuration:
+    :return:
+    :rtype: generator
+    """
+    _configuration.verbose_log('Streaming %s with %s yaml backend', file_path, YAML_BACKEND)
+    try:
+        __yaml_file = open(file_path, encoding='utf-8')
+    except OSError as err:
+        _configuration.error_log('OS error: %s', err)
+        sys.exit(os.EX_OSFILE)
+    with __yaml_file:
+        __loader = StreamingLoader(__yaml_file)
+        try:
+            # Stream start, then document start (none in an empty file)
+            __loader.get_event()
+            if not __loader.check_event(DocumentStartEvent):
+                return
+            __loader.get_event()
+            if not __loader.check_event(MappingStartEvent):
+                return
+            __loader.get_event()
+            while not __loader.check_event(MappingEndEvent):
+                __key_node = __loader.compose_node(None, None)
+                if __key_node.value == key and __loader.check_event(SequenceStartEvent):
+                    __loader.get_event()
+                    while not __loader.check_event(SequenceEndEvent):
+                        yield __loader.construct_document(__loader.compose_node(None, None))
+                    __loader.get_event()
+                else:
+                    __loader.compose_node(None, None)
+        finally:
+            __loader.dispose()
+
+
+def read_text_file(file_path, _configuration):
+    """
+    Read a yaml file as text, without parsing it
+    :param file_path:
+    :type file_path:
+    :param _configuration:
+    :type _configuration:
+    :return:
+    :rtype: str
+    """
+    try:
+        with open(file_path, encoding='utf-8') as __text_file:
+            return __text_file.read()
+    except OSError as err:
+        _configuration.error_log('OS error: %s', err)
+        sys.exit(os.EX_OSFILE)
+
+
+def split_sequence_items(content, key):
+    """
+    Split the block sequence of top-level "key" in a yaml document into the text of its items,
+    so that each item can be compared or parsed on its own (see load_yaml_string())
+    Return None if the document has another layout (flow sequence, anchors, several documents)
+    :param content:
+    :type content:
+    :param key:
+    :type key:
+    :return:
+    :rtype: list
+    """
+    if ANCHOR_PATTERN.search(content) or '\n---' in content:
+        # Items may refer to each other : they cannot be parsed separately
+        return None
+    __key_match = re.search('^' + re.escape(key) + r':[ \t]*$', content, re.MULTILINE)
+    if not __key_match:
+        return None
+    # First item gives the indentation of the sequence
+    __first_item_match = re.compile(r'^(?:[ \t]*(?:#.*)?\n)*( *)-(?: |$)', re.MULTILINE).match(
+        content, __key_match.end() + 1)
+    if not __first_item_match:
+        return [] if not content[__key_match.end():].strip() else None
+    __indentation = __first_item_match.group(1)
+    __start = __first_item_match.start(1)
+    # Sequence ends at the first line less indented than its items (ie : next top-level key)
+    if __indentation:
+        __end_pattern = r'\n(?: {0,%d}[^ \t\n#]| {%d}[^ \t\n#-])' % (len(__indentation) - 1,
+                                                                 len(__indentation))
+    else:
+        __end_pattern = r'\n[^ \t\n#-]'
+    __end_match = re.compile(__end_pattern).search(content, __start)
+    __end = __end_match.start() + 1 if __end_match else len(content)
+    # str.split is much faster than a multi-line regular expression on large files
+    __items = content[__start:__end].split('\n' + __indentation + '-')
+    for __index in range(1, len(__items)):
+        if __items[__index][:1] not in ('', ' ', '\n'):
+            return None
+        __items[__index] = __indentation + '-' + __items[__index]
+    # Same text for an item wherever it is : no line break at the end of any of them
+    __items[-1] = __items[-1].rstrip('\n')
+    return __items
+
+
+def dump_yaml_file(data, file_path, _configuration):
+    """
+    Dump data to yaml file
+    :param data:
+    :type data:
+    :param file_path:
+    :type file_path:
+    :param _configuration:
+    :type _configuration:
+    """
+    _configuration.verbose_log('Writing %s with %s yaml backend', file_path, YAML_BACKEND)
+    try:
+        __yaml_file = open(file_path, 'w', encoding='utf-8')
+    except OSError as err:
+        _configuration.error_log('OS error: %s', err)
+        sys.exit(os.EX_OSFILE)
+    else:
+        with __yaml_file:
+            yaml.dump(data, __yaml_file, Dumper=SafeDumper, allow_unicode=True)
+
+
+def load_yaml_string(content):
+    """
+    Load yaml content from a string
+    :param content:
+    :type content:
+    :return:
+    :rtype:
+    """
+    return yaml.load(content, Loader=SafeLoader)
+
+
+def dump_yaml_line(data):
+    """
+    Dump data as a single-line yaml document ("--- {...}")
+    :param data:
+    :type data:
+    :return:
+    :rtype: str
+    """
+    return yaml.dump(data, Dumper=SafeDumper, default_flow_style=True,
+                     width=YAML_LINE_WIDTH, allow_unicode=True, explicit_start=True)
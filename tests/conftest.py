@@ -0,0 +1,54 @@
+"""
+Meal for a week : test configuration
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+# pylint: disable=wrong-import-position
+
+# Tests import the application package from the source tree, as bin/meals_for_a_week does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from benchmarks.synthetic import write_dataset # noqa
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.meals_for_a_week import MealGenerator # noqa
+
+# Synthetic dataset : small enough to be written for each test, large enough for every filter
+DATASET_MEALS = 600
+DATASET_HISTORY_YEARS = 1
+
+
+@pytest.fixture(name='dataset')
+def fixture_dataset(tmp_path):
+    """
+    (database path, seasonal path, history path) of a synthetic dataset
+    """
+    return write_dataset(str(tmp_path / 'dataset'), DATASET_MEALS, DATASET_HISTORY_YEARS)
+
+
+def generate_plan(meal_database, seasonal_database, history_database, number_of_history_meals,
+                  leftovers, seed):
+    """
+    Names of the meals of a seeded plan, generated as the command line does
+    (databases are loaded and built, history is loaded)
+    """
+    configuration = Configuration()
+    meal_database.filter(seasonal_database, history_database, number_of_history_meals)
+    meal_generator = MealGenerator(configuration, meal_database.get().get_view(), 7,
+                                   random.Random(seed))
+    meal_generator.set_veggie_limit(2)
+    meal_generator.set_special_limit(1)
+    meal_generator.generate(leftovers)
+    return [meal.get() for meal in meal_generator.get().get()]
+
+
+@pytest.fixture(name='plan_generator')
+def fixture_plan_generator():
+    """
+    generate_plan() function
+    """
+    return generate_plan
@@ -0,0 +1,50 @@
+"""
+Meal for a week : BatchGenerator tests
+"""
+
+import pytest
+
+from meals_for_a_week.batch import BatchGenerator # noqa
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.meals_for_a_week import MealDatabase # noqa
+
+NUMBER_OF_MEALS = 12
+
+
+@pytest.fixture(name='batch_generator')
+def fixture_batch_generator(tmp_path):
+    """
+    BatchGenerator of a database of NUMBER_OF_MEALS meals, with a seed
+    """
+    database_path = tmp_path / 'database.yaml'
+    database_path.write_text('meals:\n' + ''.join(
+        "  - meal: 'plat {0}'\n".format(index)
+        + ('    is_veggie_compatible: True\n' if index % 3 == 0 else '')
+        for index in range(NUMBER_OF_MEALS)), encoding='utf-8')
+    configuration = Configuration()
+    meal_database = MealDatabase(str(database_path), configuration)
+    meal_database.load()
+    meal_database.build()
+    return BatchGenerator(configuration, meal_database, seed=0)
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_invalid_plans_are_reported(batch_generator, jobs):
+    plans = [
+        {'meals': 3},
+        {'id': 'seven', 'meals': 'seven'},
+        ['meals', 3],
+        {'leftovers': 'riz'},
+        {'meals': 3, 'veggie_meals': -1},
+        {'history_meals': None},
+        {'id': 'last', 'meals': '2', 'veggie_meals': 1, 'leftovers': ['riz']},
+    ]
+    results = list(batch_generator.generate(plans, jobs))
+    assert [result['id'] for result in results] == [0, 'seven', 2, 3, 4, 5, 'last']
+    assert [len(result['meals']) for result in results[::6]] == [3, 2]
+    assert results[1]['error'].startswith('Invalid plan settings: meals: ')
+    assert results[2]['error'] == 'Invalid plan settings: plan must be a mapping'
+    assert results[3]['error'] == 'Invalid plan settings: leftovers must be a list'
+    assert results[4]['error'] == 'Invalid plan settings: negative number of meals'
+    assert results[5]['error'].startswith('Invalid plan settings: history_meals: ')
+    assert results == list(batch_generator.generate(plans))
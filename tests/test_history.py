@@ -0,0 +1,167 @@
+"""
+Meal for a week : HistoryDatabase tests
+"""
+
+import datetime
+
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.history import HistoryDatabase # noqa
+from meals_for_a_week.meals_for_a_week import Meal # noqa
+
+BLOCK_HISTORY = 'meals:\n- meal: soupe\n- meal: gratin\n'
+
+
+def make_week(index):
+    """
+    Meals and date of week number index
+    """
+    return ([Meal('plat {0}-{1}'.format(index, day)) for day in range(2)],
+            datetime.date(2021, 1, 4) + datetime.timedelta(weeks=index))
+
+
+def load_history(history_path, number_of_weeks=0):
+    """
+    Loaded HistoryDatabase of history_path
+    """
+    history_database = HistoryDatabase(str(history_path), Configuration())
+    history_database.load(number_of_weeks)
+    return history_database
+
+
+def get_meal_names(history_database):
+    """
+    Meal names of every loaded entry, oldest first
+    """
+    return [[meal_record['meal'] for meal_record in entry['meals']]
+            for entry in history_database.get_entries()]
+
+
+def test_append_creates_history(tmp_path):
+    history_path = tmp_path / 'history.yaml'
+    history_database = load_history(history_path)
+    for index in range(3):
+        history_database.append(*make_week(index))
+    assert history_path.read_text(encoding='utf-8').count('\n') == 3
+    assert get_meal_names(load_history(history_path)) == [
+        ['plat {0}-0'.format(index), 'plat {0}-1'.format(index)] for index in range(3)]
+
+
+def test_append_after_block_history_without_final_new_line(tmp_path):
+    history_path = tmp_path / 'history.yaml'
+    history_path.write_text(BLOCK_HISTORY.rstrip('\n'), encoding='utf-8')
+    history_database = load_history(history_path)
+    history_database.append(*make_week(0))
+    reloaded_database = load_history(history_path)
+    assert get_meal_names(reloaded_database) == [['soupe', 'gratin'], ['plat 0-0', 'plat 0-1']]
+    assert 'date' not in reloaded_database.get_entries()[0]
+
+
+def test_add_is_written_by_commit_only(tmp_path):
+    history_path = tmp_path / 'history.yaml'
+    history_database = load_history(history_path)
+    history_database.add(*make_week(0))
+    assert not history_path.exists()
+    assert get_meal_names(history_database) == [['plat 0-0', 'plat 0-1']]
+    history_database.commit()
+    history_database.commit()
+    assert get_meal_names(load_history(history_path)) == [['plat 0-0', 'plat 0-1']]
+
+
+def test_compact_keeps_every_entry(tmp_path):
+    history_path = tmp_path / 'history.yaml'
+    history_path.write_text(BLOCK_HISTORY, encoding='utf-8')
+    history_database = load_history(history_path)
+    for index in range(2):
+        history_database.append(*make_week(index))
+    expected_meal_names = get_meal_names(history_database)
+    history_database.compact()
+    content = history_path.read_text(encoding='utf-8')
+    assert all(line.startswith('--- {') for line in content.splitlines())
+    assert get_meal_names(load_history(history_path)) == expected_meal_names
+    assert not (tmp_path / 'history.yaml.tmp').exists()
+
+
+def test_compact_keeps_last_weeks(tmp_path):
+    history_path = tmp_path / 'history.yaml'
+    history_path.write_text(BLOCK_HISTORY, encoding='utf-8')
+    history_database = load_history(history_path)
+    for index in range(3):
+        history_database.append(*make_week(index))
+    history_database.compact(2)
+    assert get_meal_names(history_database) == [['plat 1-0', 'plat 1-1'],
+                                                ['plat 2-0', 'plat 2-1']]
+    assert get_meal_names(load_history(history_path)) == get_meal_names(history_database)
+
+
+def test_compact_drops_pending_entries(tmp_path):
+    history_path = tmp_path / 'history.yaml'
+    history_database = load_history(history_path)
+    history_database.add(*make_week(0))
+    history_database.compact()
+    history_database.commit()
+    assert get_meal_names(load_history(history_path)) == [['plat 0-0', 'plat 0-1']]
+
+
+def write_weeks(history_path, number_of_weeks, head=''):
+    """
+    Write head followed by number_of_weeks appended weeks into history_path
+    """
+    history_path.write_text(head, encoding='utf-8')
+    history_database = load_history(history_path)
+    for index in range(number_of_weeks):
+        history_database.append(*make_week(index))
+
+
+def test_reverse_lines(tmp_path, monkeypatch):
+    # Blocks smaller than lines : lines span several blocks
+    monkeypatch.setattr('meals_for_a_week.history.TAIL_BLOCK_SIZE', 3)
+    for content in [b'', b'a', b'a\n', b'abc\n\nde\nfghij', b'abc\n\nde\nfghij\n', b'\n\n']:
+        file_path = tmp_path / 'lines'
+        file_path.write_bytes(content)
+        with open(file_path, 'rb') as lines_file:
+            lines = list(HistoryDatabase.reverse_lines(lines_file))
+        assert [line for _, line in reversed(lines)] == content.split(b'\n')
+        assert all(content[offset:offset + len(line)] == line for offset, line in lines)
+
+
+def test_load_tail(tmp_path):
+    history_path = tmp_path / 'history.yaml'
+    write_weeks(history_path, 5)
+    assert get_meal_names(load_history(history_path, 2)) == get_meal_names(
+        load_history(history_path))[-2:]
+    assert get_meal_names(load_history(history_path, 10)) == get_meal_names(
+        load_history(history_path))
+
+
+def test_load_tail_without_final_new_line(tmp_path):
+    history_path = tmp_path / 'history.yaml'
+    write_weeks(history_path, 3)
+    history_path.write_text(history_path.read_text(encoding='utf-8').rstrip('\n'),
+                            encoding='utf-8')
+    assert get_meal_names(load_history(history_path, 1)) == [['plat 2-0', 'plat 2-1']]
+
+
+def test_load_tail_skips_truncated_last_line(tmp_path):
+    history_path = tmp_path / 'history.yaml'
+    write_weeks(history_path, 3)
+    content = history_path.read_text(encoding='utf-8')
+    # Last entry cut by a crash in the middle of its write
+    history_path.write_text(content[:-15], encoding='utf-8')
+    assert get_meal_names(load_history(history_path, 2)) == [['plat 0-0', 'plat 0-1'],
+                                                             ['plat 1-0', 'plat 1-1']]
+    assert get_meal_names(load_history(history_path)) == get_meal_names(
+        load_history(history_path, 2))
+
+
+def test_load_tail_reaches_block_history(tmp_path):
+    history_path = tmp_path / 'history.yaml'
+    write_weeks(history_path, 2, BLOCK_HISTORY)
+    assert get_meal_names(load_history(history_path, 5)) == [['soupe', 'gratin'],
+                                                             ['plat 0-0', 'plat 0-1'],
+                                                             ['plat 1-0', 'plat 1-1']]
+    assert get_meal_names(load_history(history_path, 2)) == [['plat 0-0', 'plat 0-1'],
+                                                             ['plat 1-0', 'plat 1-1']]
+
+
+def test_load_tail_of_missing_history(tmp_path):
+    assert not load_history(tmp_path / 'history.yaml', 2).get_entries()
@@ -0,0 +1,52 @@
+"""
+Meal for a week : command line storage and filtering options tests
+"""
+
+import os
+import sys
+
+import pytest
+
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.main import main # noqa
+from meals_for_a_week.meals_for_a_week import MealDatabase # noqa
+
+
+def run_main(monkeypatch, capsys, arguments):
+    """
+    Output of the command line run with arguments
+    """
+    monkeypatch.setattr(sys, 'argv', ['meals_for_a_week'] + arguments)
+    main()
+    return capsys.readouterr().out
+
+
+@pytest.mark.parametrize('options', [
+    ['--columnar'],
+    ['--stream'],
+    ['--stream', '--columnar'],
+    ['--sqlite'],
+])
+def test_options_generate_same_plan(dataset, tmp_path, monkeypatch, capsys, options):
+    database_path, seasonal_path, history_path = dataset
+    meal_database = MealDatabase(database_path, Configuration())
+    meal_database.load()
+    meal_database.build()
+    leftovers = [meal.get_mandatory_ingredients()[0] for meal in meal_database.get().get()
+                 if meal.get_mandatory_ingredients()][:2]
+    arguments = ['-c', database_path, '-s', seasonal_path, '--history', history_path,
+                 '--history-meals', '2', '--veggie-meals', '2', '--special-meals', '1',
+                 '-p', '--seed', '7', '-l'] + leftovers
+
+    plan = run_main(monkeypatch, capsys, arguments + ['--no-snapshot'])
+    assert plan
+    assert not os.path.exists(os.path.join(os.path.dirname(database_path),
+                                           '.database.yaml.snapshot'))
+    if options == ['--sqlite']:
+        sqlite_path = str(tmp_path / 'meals.db')
+        run_main(monkeypatch, capsys, arguments + ['--import-sqlite', sqlite_path])
+        options = ['--sqlite', sqlite_path]
+    # First run writes snapshots, second one reads them
+    assert run_main(monkeypatch, capsys, arguments + options) == plan
+    assert run_main(monkeypatch, capsys, arguments + options) == plan
+    assert run_main(monkeypatch, capsys, arguments + options + ['--no-snapshot']) == plan
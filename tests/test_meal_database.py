@@ -0,0 +1,174 @@
+"""
+Meal for a week : MealDatabase and SeasonalDatabase reload tests
+"""
+
+import os
+
+import pytest
+
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.meals_for_a_week import MealDatabase, SeasonalDatabase # noqa
+from meals_for_a_week.yaml_io import YAMLError # noqa
+
+DATABASE = """meals:
+  - meal: 'Lasagne'
+    is_veggie_compatible: True
+    group: 'Lasagne'
+  - meal: 'Tartiflette'
+    mandatory_ingredients:
+      - pomme de terre
+  - meal: 'Crepes'
+    is_special: True
+"""
+
+
+def write_database(database_path, content):
+    """
+    Write content into database_path, with a newer modification time than the previous one
+    (the signature of a file written twice within the file system time resolution could match)
+    """
+    try:
+        modification_time = os.stat(database_path).st_mtime_ns + 1000000
+    except OSError:
+        modification_time = None
+    database_path.write_text(content, encoding='utf-8')
+    if modification_time is not None:
+        os.utime(database_path, ns=(modification_time, modification_time))
+
+
+def load_database(database_path):
+    """
+    Loaded and built MealDatabase of database_path, with incremental reload enabled
+    """
+    meal_database = MealDatabase(str(database_path), Configuration())
+    meal_database.enable_reload()
+    meal_database.load()
+    meal_database.build()
+    return meal_database
+
+
+def get_meals_by_name(meal_database):
+    """
+    Meals of meal_database by name
+    """
+    return {meal.get(): meal for meal in meal_database.get().get()}
+
+
+def test_reload_unmodified_database(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    write_database(database_path, DATABASE)
+    meal_database = load_database(database_path)
+    assert not meal_database.reload()
+
+
+def test_reload_keeps_unchanged_meals(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    write_database(database_path, DATABASE)
+    meal_database = load_database(database_path)
+    meals = get_meals_by_name(meal_database)
+
+    write_database(database_path, DATABASE.replace('is_special: True', 'is_veggie_compatible: True')
+                   + "  - meal: 'Soupe'\n")
+    assert meal_database.reload()
+    reloaded_meals = get_meals_by_name(meal_database)
+    assert sorted(reloaded_meals) == ['crepes', 'lasagne', 'soupe', 'tartiflette']
+    assert reloaded_meals['lasagne'] is meals['lasagne']
+    assert reloaded_meals['tartiflette'] is meals['tartiflette']
+    assert reloaded_meals['crepes'] is not meals['crepes']
+    assert reloaded_meals['crepes'].is_veggie() and not reloaded_meals['crepes'].is_special()
+    assert meal_database.get().get_meals_by_ingredient('pomme de terre') \
+        == [meals['tartiflette']]
+    assert meal_database.get_meals_by_name('soupe') == [reloaded_meals['soupe']]
+
+
+def test_reload_removes_meals(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    write_database(database_path, DATABASE)
+    meal_database = load_database(database_path)
+    assert meal_database.get_meals_by_name('tartiflette')
+
+    write_database(database_path, DATABASE.replace(
+        "  - meal: 'Tartiflette'\n    mandatory_ingredients:\n      - pomme de terre\n", ''))
+    assert meal_database.reload()
+    assert sorted(get_meals_by_name(meal_database)) == ['crepes', 'lasagne']
+    assert not meal_database.get_meals_by_name('tartiflette')
+    assert not meal_database.get().get_meals_by_ingredient('pomme de terre')
+
+
+def test_reload_duplicated_records(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    write_database(database_path, DATABASE + "  - meal: 'Crepes'\n    is_special: True\n")
+    meal_database = load_database(database_path)
+    assert len(meal_database.get_meals_by_name('crepes')) == 2
+
+    write_database(database_path, DATABASE)
+    assert meal_database.reload()
+    assert len(meal_database.get_meals_by_name('crepes')) == 1
+    assert len(meal_database.get().get()) == 3
+
+
+def test_reload_invalid_yaml_keeps_meals(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    write_database(database_path, DATABASE)
+    meal_database = load_database(database_path)
+    meals = get_meals_by_name(meal_database)
+
+    write_database(database_path, DATABASE + "  - meal: [unclosed\n")
+    assert not meal_database.reload()
+    assert get_meals_by_name(meal_database) == meals
+    # Invalid file is not reloaded again until it changes
+    assert not meal_database.reload()
+
+
+def test_reload_other_layout(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    write_database(database_path, DATABASE)
+    meal_database = load_database(database_path)
+
+    write_database(database_path, "meals: [{meal: 'Pizza'}, {meal: 'Lasagne'}]\n")
+    assert meal_database.reload()
+    assert sorted(get_meals_by_name(meal_database)) == ['lasagne', 'pizza']
+
+
+def test_full_reload_invalid_yaml_keeps_meals(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    write_database(database_path, DATABASE)
+    meal_database = load_database(database_path)
+    meals = get_meals_by_name(meal_database)
+
+    # Cannot be split into records : parsed as a whole
+    write_database(database_path, "meals: [ {meal: 'Pizza'}")
+    assert not meal_database.reload()
+    assert get_meals_by_name(meal_database) == meals
+    assert not meal_database.is_modified()
+
+    write_database(database_path, "meals: [{meal: 'Pizza'}]\n")
+    assert meal_database.reload()
+    assert sorted(get_meals_by_name(meal_database)) == ['pizza']
+
+
+def test_load_invalid_yaml_is_still_modified(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    write_database(database_path, "meals: [ {meal: 'Pizza'}")
+    meal_database = MealDatabase(str(database_path), Configuration())
+    meal_database.enable_reload()
+    with pytest.raises(YAMLError):
+        meal_database.load()
+    assert meal_database.is_modified()
+
+
+def test_seasonal_reload_invalid_yaml_keeps_months(tmp_path):
+    seasonal_path = tmp_path / 'seasonal.yaml'
+    write_database(seasonal_path, 'months:\n  - month: Janvier\n    vegetables:\n      - Chou\n')
+    seasonal_database = SeasonalDatabase(str(seasonal_path), Configuration())
+    seasonal_database.load()
+    seasonal_database.build()
+
+    write_database(seasonal_path, 'months: [ {month: Janvier')
+    assert not seasonal_database.reload()
+    assert seasonal_database.get_restricted_vegetable_set() == {'chou'}
+    assert not seasonal_database.is_modified()
+
+    write_database(seasonal_path, 'months: [{month: Janvier, vegetables: [Ail]}]\n')
+    assert seasonal_database.reload()
+    assert seasonal_database.get_restricted_vegetable_set() == {'ail'}
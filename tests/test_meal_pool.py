@@ -0,0 +1,254 @@
+"""
+Meal for a week : MealPool, MealPoolView and MealCollection candidate pool tests
+"""
+
+import random
+
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.meals_for_a_week import Meal, MealCollection, MealPool, MealPoolView # noqa
+
+POOL_NAMES = [MealCollection.POOL_VEGGIE, MealCollection.POOL_SPECIAL,
+              MealCollection.POOL_NORMAL_STRICT, MealCollection.POOL_NORMAL_LENIENT]
+
+
+def make_meals(count):
+    """
+    Meals named meal 0 .. meal count-1
+    """
+    return [Meal('meal ' + str(index)) for index in range(count)]
+
+
+def check_pool(pool, expected_meals):
+    """
+    Pool holds expected_meals, positions and get_at() agreeing with each other
+    """
+    assert pool.get_count() == len(expected_meals)
+    assert set(pool.get()) == set(expected_meals)
+    for position in range(pool.get_count()):
+        meal = pool.get_at(position)
+        assert pool.get_position(meal) == position
+        assert pool.contains(meal)
+
+
+def test_pool_add_is_idempotent():
+    meals = make_meals(3)
+    pool = MealPool()
+    for meal in meals + meals:
+        pool.add(meal)
+    check_pool(pool, meals)
+
+
+def test_pool_remove_swaps_last_meal():
+    meals = make_meals(4)
+    pool = MealPool()
+    for meal in meals:
+        pool.add(meal)
+    pool.remove(meals[1])
+    assert pool.get_at(1) is meals[3]
+    assert not pool.contains(meals[1])
+    assert pool.get_position(meals[1]) is None
+    check_pool(pool, [meals[0], meals[2], meals[3]])
+
+
+def test_pool_remove_last_meal():
+    meals = make_meals(3)
+    pool = MealPool()
+    for meal in meals:
+        pool.add(meal)
+    pool.remove(meals[2])
+    check_pool(pool, meals[:2])
+    pool.remove(meals[0])
+    pool.remove(meals[1])
+    check_pool(pool, [])
+    assert pool.get_random() is None
+
+
+def test_pool_remove_missing_meal():
+    meals = make_meals(2)
+    pool = MealPool()
+    pool.add(meals[0])
+    pool.remove(meals[1])
+    check_pool(pool, meals[:1])
+
+
+def test_pool_re_add_after_remove():
+    meals = make_meals(3)
+    pool = MealPool()
+    for meal in meals:
+        pool.add(meal)
+    pool.remove(meals[0])
+    pool.add(meals[0])
+    assert pool.get_position(meals[0]) == 2
+    check_pool(pool, meals)
+
+
+def test_view_leaves_base_pool_untouched():
+    meals = make_meals(5)
+    pool = MealPool()
+    for meal in meals:
+        pool.add(meal)
+    base_order = list(pool.get())
+    view = MealPoolView(pool)
+    view.remove(meals[0])
+    view.remove(meals[4])
+    extra_meal = Meal('extra')
+    view.add(extra_meal)
+    check_pool(view, meals[1:4] + [extra_meal])
+    assert pool.get() == base_order
+    check_pool(pool, meals)
+
+
+def test_view_remove_last_meal():
+    meals = make_meals(3)
+    pool = MealPool()
+    for meal in meals:
+        pool.add(meal)
+    view = MealPoolView(pool)
+    view.remove(meals[2])
+    check_pool(view, meals[:2])
+    assert not view.contains(meals[2])
+    view.remove(meals[1])
+    view.remove(meals[0])
+    check_pool(view, [])
+    assert view.get_random() is None
+
+
+def test_view_re_add_after_remove():
+    meals = make_meals(4)
+    pool = MealPool()
+    for meal in meals:
+        pool.add(meal)
+    view = MealPoolView(pool)
+    view.remove(meals[1])
+    view.add(meals[1])
+    view.add(meals[1])
+    check_pool(view, meals)
+    assert view.get_position(meals[1]) == 3
+
+
+def test_view_of_view():
+    meals = make_meals(4)
+    pool = MealPool()
+    for meal in meals:
+        pool.add(meal)
+    view = MealPoolView(pool)
+    view.remove(meals[0])
+    nested_view = MealPoolView(view)
+    nested_view.remove(meals[3])
+    nested_view.add(meals[0])
+    check_pool(nested_view, meals[:3])
+    check_pool(view, meals[1:])
+
+
+def test_view_random_operations_match_pool():
+    meals = make_meals(30)
+    pool = MealPool()
+    for meal in meals[:20]:
+        pool.add(meal)
+    view = MealPoolView(pool)
+    expected_meals = set(meals[:20])
+    random_generator = random.Random(0)
+    for _ in range(500):
+        meal = random_generator.choice(meals)
+        if random_generator.random() < 0.5:
+            view.add(meal)
+            expected_meals.add(meal)
+        else:
+            view.remove(meal)
+            expected_meals.discard(meal)
+        check_pool(view, list(expected_meals))
+    check_pool(pool, meals[:20])
+
+
+def make_collection(meals, enable_overrides=None):
+    """
+    MealCollection of meals built from scratch, meals enabled / disabled by enable_overrides
+    (meal -> bool) in this collection only
+    """
+    meal_collection = MealCollection(Configuration())
+    for meal, is_enable in (enable_overrides or {}).items():
+        if is_enable:
+            meal_collection.enable_meal(meal)
+        else:
+            meal_collection.disable_meal(meal)
+    meal_collection.extend(meals)
+    return meal_collection
+
+
+def check_collection_pools(meal_collection, enable_overrides=None):
+    """
+    Every candidate pool of meal_collection holds the meals of a full rebuild
+    """
+    rebuilt_collection = make_collection(meal_collection.get(), enable_overrides)
+    for pool_name in POOL_NAMES:
+        check_pool(meal_collection.get_pool(pool_name),
+                   rebuilt_collection.get_pool(pool_name).get())
+
+
+def change_meal_flag(meal, random_generator):
+    """
+    Enable, disable, or change veggie / special flag of meal
+    """
+    change = random_generator.randrange(4)
+    if change == 0:
+        meal.enable()
+    elif change == 1:
+        meal.disable()
+    elif change == 2:
+        meal.set_veggie(not meal.is_veggie())
+    else:
+        meal.set_special(not meal.is_special())
+
+
+def test_watched_meals_update_pools():
+    meals = make_meals(40)
+    meal_collection = make_collection(meals[:30])
+    meal_collection.watch_meals()
+    # Meals added after watch_meals() are watched too
+    meal_collection.extend(meals[30:])
+    random_generator = random.Random(0)
+    for _ in range(500):
+        change_meal_flag(random_generator.choice(meals), random_generator)
+        check_collection_pools(meal_collection)
+
+
+def test_removed_meals_are_not_watched():
+    meals = make_meals(3)
+    meal_collection = make_collection(meals)
+    meal_collection.watch_meals()
+    meal_collection.remove_meal(meals[0])
+    meals[0].set_veggie(True)
+    meals[1].set_veggie(True)
+    assert meal_collection.get_pool(MealCollection.POOL_VEGGIE).get() == [meals[1]]
+    check_collection_pools(meal_collection)
+
+
+def test_view_enable_overrides_leave_collection_untouched():
+    meals = make_meals(40)
+    random_generator = random.Random(1)
+    for meal in meals:
+        change_meal_flag(meal, random_generator)
+    meal_collection = make_collection(meals[:30])
+    meal_collection.watch_meals()
+    base_pools = {pool_name: list(meal_collection.get_pool(pool_name).get())
+                  for pool_name in POOL_NAMES}
+    view = meal_collection.get_view()
+    enable_overrides = {}
+    for _ in range(500):
+        meal = random_generator.choice(meals)
+        change = random_generator.randrange(4)
+        if change == 0:
+            view.enable_meal(meal)
+            enable_overrides[meal] = True
+        elif change == 1:
+            view.disable_meal(meal)
+            enable_overrides[meal] = False
+        elif change == 2:
+            view.add(meal)
+        elif view.has_meal(meal):
+            view.remove_meal(meal)
+        check_collection_pools(view, enable_overrides)
+    for pool_name in POOL_NAMES:
+        assert meal_collection.get_pool(pool_name).get() == base_pools[pool_name]
+    check_collection_pools(meal_collection)
+    assert all(meal_collection.is_meal_enable(meal) == meal.is_enable() for meal in meals)
@@ -0,0 +1,103 @@
+"""
+Meal for a week : PlanCache tests
+"""
+
+import json
+import os
+
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.plan_cache import PlanCache # noqa
+
+SETTINGS = {'meals': 7, 'veggie_meals': 2, 'special_meals': 1, 'leftovers': ['oeuf', 'riz']}
+
+
+def write_file(file_path, content, modification_time=None):
+    """
+    Write content into file_path, with a given modification time (in seconds)
+    """
+    file_path.write_text(content, encoding='utf-8')
+    if modification_time is not None:
+        os.utime(file_path, (modification_time, modification_time))
+
+
+def make_plan(index):
+    """
+    Meal records of plan number index (same size for every index below 100)
+    """
+    return [{'meal': 'plat {0:02d}'.format(index), 'is_veggie_compatible': False,
+             'is_special': False}]
+
+
+def test_key_is_stable(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    write_file(database_path, 'meals: []\n')
+    key = PlanCache(Configuration()).get_key(str(database_path), None, {'b', 'a'}, SETTINGS, 1)
+    # Same inputs in another process, history in another order
+    assert PlanCache(Configuration()).get_key(str(database_path), None, ['a', 'b'],
+                                              dict(SETTINGS), 1) == key
+    # Same content, another modification time
+    write_file(database_path, 'meals: []\n', 1000000000)
+    assert PlanCache(Configuration()).get_key(str(database_path), None, {'a', 'b'},
+                                              SETTINGS, 1) == key
+
+
+def test_key_changes_with_inputs(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    seasonal_path = tmp_path / 'seasonal.yaml'
+    write_file(database_path, 'meals: []\n')
+    write_file(seasonal_path, 'months: []\n')
+    plan_cache = PlanCache(Configuration())
+    key = plan_cache.get_key(str(database_path), None, set(), SETTINGS, 1)
+    keys = {
+        key,
+        plan_cache.get_key(str(database_path), str(seasonal_path), set(), SETTINGS, 1),
+        plan_cache.get_key(str(database_path), None, {'a'}, SETTINGS, 1),
+        plan_cache.get_key(str(database_path), None, set(), dict(SETTINGS, meals=6), 1),
+        plan_cache.get_key(str(database_path), None, set(),
+                           dict(SETTINGS, leftovers=['riz', 'oeuf']), 1),
+        plan_cache.get_key(str(database_path), None, set(), SETTINGS, 2),
+        plan_cache.get_key(str(database_path), None, set(), SETTINGS, 1, 'solver'),
+    }
+    assert len(keys) == 7
+    write_file(database_path, 'meals: [{meal: a}]\n')
+    assert plan_cache.get_key(str(database_path), None, set(), SETTINGS, 1) != key
+
+
+def test_memory_lru_eviction():
+    plan_cache = PlanCache(Configuration(), memory_size=2)
+    plan_cache.put('a', make_plan(0))
+    plan_cache.put('b', make_plan(1))
+    # Using a makes b the least recently used plan
+    assert plan_cache.get('a') == make_plan(0)
+    plan_cache.put('c', make_plan(2))
+    assert plan_cache.get('b') is None
+    assert plan_cache.get('a') == make_plan(0)
+    assert plan_cache.get('c') == make_plan(2)
+
+
+def test_disk_cache_is_shared(tmp_path):
+    PlanCache(Configuration(), cache_dir=str(tmp_path)).put('a', make_plan(0))
+    assert PlanCache(Configuration(), cache_dir=str(tmp_path)).get('a') == make_plan(0)
+    assert PlanCache(Configuration(), cache_dir=str(tmp_path)).get('b') is None
+
+
+def test_disk_lru_eviction(tmp_path):
+    plan_size = len(json.dumps(make_plan(0), ensure_ascii=False).encode('utf-8'))
+    plan_cache = PlanCache(Configuration(), memory_size=1, cache_dir=str(tmp_path),
+                           disk_size=10 * plan_size)
+    keys = [str(index) for index in range(10)]
+    for index, key in enumerate(keys):
+        plan_cache.put(key, make_plan(index))
+        os.utime(tmp_path / (key + '.json'), (1000 + index, 1000 + index))
+    # Reading a plan file makes it the most recently used one
+    assert PlanCache(Configuration(), cache_dir=str(tmp_path)).get('0') == make_plan(0)
+    # Over the size limit : least recently used files are deleted down to 90% of it
+    plan_cache.put('10', make_plan(10))
+    assert sorted(os.listdir(tmp_path)) == sorted(key + '.json'
+                                                  for key in keys[:1] + keys[3:] + ['10'])
+
+
+def test_unreadable_plan_file(tmp_path):
+    write_file(tmp_path / 'a.json', '[{"meal": ')
+    assert PlanCache(Configuration(), cache_dir=str(tmp_path)).get('a') is None
+
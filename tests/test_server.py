@@ -0,0 +1,231 @@
+"""
+Meal for a week : PlanningServer tests
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.meals_for_a_week import MealDatabase # noqa
+from meals_for_a_week.server import MAX_BODY_SIZE, PlanningServer, RequestError # noqa
+from meals_for_a_week.yaml_io import YAMLError # noqa
+
+NUMBER_OF_MEALS = 12
+
+
+class StreamWriter:
+    """
+    asyncio.StreamWriter keeping written data
+    """
+    def __init__(self):
+        self.data = b''
+        self.is_closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.is_closed = True
+
+
+@pytest.fixture(name='server')
+def fixture_server(tmp_path):
+    """
+    PlanningServer of a database of NUMBER_OF_MEALS meals, with a week of history excluded
+    """
+    database_path = tmp_path / 'database.yaml'
+    database_path.write_text('meals:\n' + ''.join(
+        "  - meal: 'plat {0}'\n".format(index)
+        + ('    is_veggie_compatible: True\n' if index % 3 == 0 else '')
+        for index in range(NUMBER_OF_MEALS)), encoding='utf-8')
+    configuration = Configuration()
+    meal_database = MealDatabase(str(database_path), configuration)
+    meal_database.enable_reload()
+    meal_database.load()
+    meal_database.build()
+    return PlanningServer(configuration, meal_database,
+                          history_path=str(tmp_path / 'history.yaml'), number_of_history_meals=1,
+                          seed=0)
+
+
+def post(server, path, request=None):
+    """
+    Dispatch a POST request, request being JSON-encoded
+    """
+    return server.dispatch('POST', path, json.dumps(request).encode('utf-8')
+                           if request is not None else b'')
+
+
+def get_meal_names(response):
+    """
+    Meal names of a generated plan
+    """
+    return [meal['meal'] for meal in response['meals']]
+
+
+def test_generate(server):
+    status, response = post(server, '/plans', {'meals': 5, 'veggie_meals': 2})
+    assert status == 201
+    assert response['id'] == 1
+    assert len(set(get_meal_names(response))) == 5
+    assert sum(1 for meal in response['meals'] if meal['is_veggie_compatible']) >= 2
+    assert post(server, '/plans')[1]['id'] == 2
+
+
+def test_generate_seeded(server):
+    _, response = post(server, '/plans', {'meals': 5, 'seed': 3})
+    _, other_response = post(server, '/plans/', {'meals': 5, 'seed': 3})
+    assert other_response['id'] != response['id']
+    assert other_response['meals'] == response['meals']
+
+
+def test_accept_excludes_meals(server, tmp_path):
+    _, response = post(server, '/plans', {'meals': 6})
+    assert post(server, '/plans/{0}/accept'.format(response['id'])) \
+        == (200, {'id': response['id'], 'status': 'accepted'})
+    assert 'plat' in (tmp_path / 'history.yaml').read_text(encoding='utf-8')
+    _, next_response = post(server, '/plans', {'meals': 6})
+    assert not set(get_meal_names(response)) & set(get_meal_names(next_response))
+    # Only meals not excluded by history are left
+    with pytest.raises(RequestError) as err:
+        post(server, '/plans', {'meals': NUMBER_OF_MEALS - 5})
+    assert err.value.status == 422
+
+
+def test_reject(server, tmp_path):
+    _, response = post(server, '/plans')
+    assert post(server, '/plans/{0}/reject'.format(response['id'])) \
+        == (200, {'id': response['id'], 'status': 'rejected'})
+    assert not (tmp_path / 'history.yaml').exists()
+    with pytest.raises(RequestError) as err:
+        post(server, '/plans/{0}/accept'.format(response['id']))
+    assert err.value.status == 404
+
+
+@pytest.mark.parametrize('method, path, body, status', [
+    ('GET', '/plans', b'', 405),
+    ('POST', '/', b'', 404),
+    ('POST', '/meals', b'', 404),
+    ('POST', '/plans/1', b'', 404),
+    ('POST', '/plans/1/delete', b'', 404),
+    ('POST', '/plans/one/accept', b'', 404),
+    ('POST', '/plans/1/accept', b'', 404),
+    ('POST', '/plans', b'{"meals": ', 400),
+    ('POST', '/plans', b'[7]', 400),
+    ('POST', '/plans', b'{"meals": "seven"}', 400),
+    ('POST', '/plans', b'{"leftovers": 7}', 400),
+    ('POST', '/plans', b'{"leftovers": "riz"}', 400),
+    ('POST', '/plans', b'{"leftovers": ["riz", 7]}', 400),
+    ('POST', '/plans', b'{"meals": -1}', 400),
+    ('POST', '/plans', b'{"meals": 3, "special_meals": -1}', 400),
+    ('POST', '/plans', b'{"meals": 2, "veggie_meals": 3}', 422),
+    ('POST', '/plans', b'{"meals": 13}', 422),
+    ('POST', '/plans', b'{"meals": 2, "special_meals": 1}', 422),
+])
+def test_dispatch_errors(server, method, path, body, status):
+    with pytest.raises(RequestError) as err:
+        server.dispatch(method, path, body)
+    assert err.value.status == status
+
+
+def serve(server, data):
+    """
+    Responses of server to a client connection sending data : (status line, JSON) list,
+    and whether the connection is closed
+    """
+    async def handle():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        writer = StreamWriter()
+        await server.handle_client(reader, writer)
+        return writer
+
+    writer = asyncio.run(handle())
+    responses = []
+    for response in writer.data.split(b'HTTP/1.1 ')[1:]:
+        head, _, body = response.partition(b'\r\n\r\n')
+        responses.append((head.split(b'\r\n')[0].decode('latin-1'), json.loads(body)))
+    return responses, writer.is_closed
+
+
+def make_request(method, path, body=b'', headers=''):
+    """
+    HTTP request
+    """
+    return '{0} {1} HTTP/1.1\r\nContent-Length: {2}\r\n{3}\r\n'.format(
+        method, path, len(body), headers).encode('latin-1') + body
+
+
+def test_handle_client_keep_alive(server):
+    responses, is_closed = serve(server, make_request('POST', '/plans', b'{"meals": 3}')
+                                 + make_request('POST', '/plans/1/reject')
+                                 + make_request('GET', '/plans'))
+    assert [status_line for status_line, _ in responses] \
+        == ['201 Created', '200 OK', '405 Method Not Allowed']
+    assert len(responses[0][1]['meals']) == 3
+    assert responses[2][1] == {'error': 'Use POST'}
+    assert is_closed
+
+
+def test_handle_client_connection_close(server):
+    responses, _ = serve(server, make_request('POST', '/plans', headers='Connection: close\r\n')
+                         + make_request('POST', '/plans'))
+    assert [status_line for status_line, _ in responses] == ['201 Created']
+
+
+@pytest.mark.parametrize('data, status_line', [
+    (b'POST\r\n\r\n', '400 Bad Request'),
+    (b'POST /plans HTTP/1.1\r\nContent-Length: many\r\n\r\n', '400 Bad Request'),
+    (b'POST /plans HTTP/1.1\r\nContent-Length: ' + str(MAX_BODY_SIZE + 1).encode('ascii')
+     + b'\r\n\r\n', '413 Payload Too Large'),
+])
+def test_handle_client_invalid_request(server, data, status_line):
+    # Connection is closed : what follows cannot be parsed
+    responses, is_closed = serve(server, data + make_request('POST', '/plans'))
+    assert [response_status_line for response_status_line, _ in responses] == [status_line]
+    assert 'error' in responses[0][1]
+    assert is_closed
+
+
+def test_invalid_database_keeps_last_meals(server, tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    modification_time = database_path.stat().st_mtime_ns + 1000000
+    database_path.write_text("meals: [ {meal: 'Pizza'}", encoding='utf-8')
+    os.utime(database_path, ns=(modification_time, modification_time))
+    status, response = post(server, '/plans', {'meals': NUMBER_OF_MEALS})
+    assert status == 201
+    assert 'pizza' not in get_meal_names(response)
+
+
+def test_reload_failure(server, monkeypatch):
+    def fail_reload():
+        raise YAMLError('mapping values are not allowed here')
+
+    monkeypatch.setattr(server, 'reload', fail_reload)
+    responses, _ = serve(server, make_request('POST', '/plans'))
+    assert responses == [('503 Service Unavailable', {
+        'error': 'Cannot reload databases: mapping values are not allowed here'})]
+    monkeypatch.undo()
+    assert post(server, '/plans')[0] == 201
+
+
+def test_internal_error_is_answered(server, monkeypatch):
+    def fail_generate(_request):
+        raise RuntimeError('unexpected')
+
+    monkeypatch.setattr(server, 'generate', fail_generate)
+    responses, _ = serve(server, make_request('POST', '/plans') + make_request('GET', '/plans'))
+    assert responses == [('500 Internal Server Error', {'error': 'Internal error'}),
+                         ('405 Method Not Allowed', {'error': 'Use POST'})]
+
+
+def test_generate_leftovers(server):
+    assert post(server, '/plans', {'meals': 3, 'leftovers': ['Riz']})[0] == 201
+    assert post(server, '/plans', {'meals': 3, 'leftovers': None})[0] == 201
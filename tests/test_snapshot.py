@@ -0,0 +1,97 @@
+"""
+Meal for a week : database snapshot tests
+"""
+
+import os
+import pickle
+
+from meals_for_a_week import snapshot # noqa
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.meals_for_a_week import MealDatabase # noqa
+from meals_for_a_week.snapshot import get_snapshot_path, read_snapshot, write_snapshot # noqa
+
+DATABASE = """meals:
+  - meal: 'Lasagne'
+  - meal: 'Crepes'
+    is_special: True
+"""
+
+
+def write_source(source_path, content):
+    """
+    Write content into source_path, keeping its modification time if it exists
+    (same size and modification time : only its content tells the change)
+    """
+    try:
+        modification_time = os.stat(source_path).st_mtime_ns
+    except OSError:
+        modification_time = None
+    source_path.write_text(content, encoding='utf-8')
+    if modification_time is not None:
+        os.utime(source_path, ns=(modification_time, modification_time))
+
+
+def load_meal_names(database_path):
+    """
+    Meal names of a MealDatabase loaded with snapshots enabled
+    """
+    meal_database = MealDatabase(str(database_path), Configuration())
+    meal_database.enable_snapshot()
+    meal_database.load()
+    meal_database.build()
+    return [meal.get() for meal in meal_database.get().get()]
+
+
+def test_snapshot_round_trip(tmp_path):
+    source_path = tmp_path / 'database.yaml'
+    write_source(source_path, DATABASE)
+    payload = write_snapshot(str(source_path), 'meals', ['a', 'b'])
+    assert read_snapshot(str(source_path), 'meals') == payload
+    assert pickle.loads(payload) == ['a', 'b']
+    assert read_snapshot(str(source_path), 'seasonal') is None
+    assert read_snapshot(str(tmp_path / 'other.yaml'), 'meals') is None
+
+
+def test_content_change_invalidates_snapshot(tmp_path):
+    source_path = tmp_path / 'database.yaml'
+    write_source(source_path, DATABASE)
+    write_snapshot(str(source_path), 'meals', ['a', 'b'])
+    write_source(source_path, DATABASE.replace('Lasagne', 'Risotto'))
+    assert read_snapshot(str(source_path), 'meals') is None
+
+
+def test_version_bump_invalidates_snapshot(tmp_path, monkeypatch):
+    source_path = tmp_path / 'database.yaml'
+    write_source(source_path, DATABASE)
+    write_snapshot(str(source_path), 'meals', ['a', 'b'])
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_VERSION', snapshot.SNAPSHOT_VERSION + 1)
+    assert read_snapshot(str(source_path), 'meals') is None
+
+
+def test_truncated_snapshot(tmp_path):
+    source_path = tmp_path / 'database.yaml'
+    write_source(source_path, DATABASE)
+    write_snapshot(str(source_path), 'meals', list(range(1000)))
+    snapshot_path = get_snapshot_path(str(source_path))
+    with open(snapshot_path, 'rb') as snapshot_file:
+        data = snapshot_file.read()
+    # Truncated in payload, then in header
+    for size in [len(data) - 10, 10, 0]:
+        with open(snapshot_path, 'wb') as snapshot_file:
+            snapshot_file.write(data[:size])
+        assert read_snapshot(str(source_path), 'meals') is None
+
+
+def test_meal_database_snapshot(tmp_path):
+    database_path = tmp_path / 'database.yaml'
+    write_source(database_path, DATABASE)
+    assert load_meal_names(database_path) == ['lasagne', 'crepes']
+    assert os.path.exists(get_snapshot_path(str(database_path)))
+    assert load_meal_names(database_path) == ['lasagne', 'crepes']
+
+    write_source(database_path, DATABASE.replace('Lasagne', 'Risotto'))
+    assert load_meal_names(database_path) == ['risotto', 'crepes']
+
+    with open(get_snapshot_path(str(database_path)), 'r+b') as snapshot_file:
+        snapshot_file.truncate(os.path.getsize(get_snapshot_path(str(database_path))) - 10)
+    assert load_meal_names(database_path) == ['risotto', 'crepes']
@@ -0,0 +1,136 @@
+"""
+Meal for a week : PlanSolver tests
+"""
+
+import random
+
+import pytest
+
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.meals_for_a_week import Meal, MealCollection, NotEnoughMealsError # noqa
+from meals_for_a_week.solver import PlanSolver # noqa
+
+
+def make_meal(name, is_veggie=False, is_special=False, group=None, ingredients=()):
+    """
+    Meal object with the given flags
+    """
+    meal = Meal(name)
+    meal.set_veggie(is_veggie)
+    meal.set_special(is_special)
+    if group:
+        meal.set_group(group)
+    meal.set_mandatory_ingredients(ingredients)
+    return meal
+
+
+def make_collection(configuration, meals):
+    """
+    MealCollection of meals, indexed by ingredient
+    """
+    meal_collection = MealCollection(configuration)
+    meal_collection.extend(meals)
+    meal_collection.build_ingredient_index()
+    return meal_collection
+
+
+def solve(meals, meal_limit, leftovers=None, seed=0, veggie_limit=0, special_limit=0):
+    """
+    Meals of the plan solved from meals
+    """
+    configuration = Configuration()
+    plan_solver = PlanSolver(configuration, make_collection(configuration, meals).get_view(),
+                             meal_limit, random.Random(seed))
+    plan_solver.set_veggie_limit(veggie_limit)
+    plan_solver.set_special_limit(special_limit)
+    plan_solver.generate(leftovers)
+    return plan_solver.get().get()
+
+
+def make_meals(count):
+    """
+    Meals without constraint, every fourth one veggie and every fifth one special
+    """
+    return [make_meal('plat ' + str(index), is_veggie=index % 4 == 0, is_special=index % 5 == 0)
+            for index in range(count)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_plan_meal_types(seed):
+    plan = solve(make_meals(40), 7, seed=seed, veggie_limit=2, special_limit=1)
+    assert len(plan) == len(set(plan)) == 7
+    assert sum(1 for meal in plan if meal.is_special()) == 1
+    assert sum(1 for meal in plan if meal.is_veggie()) >= 2
+
+
+def test_plan_is_seeded():
+    meals = make_meals(40)
+    assert solve(meals, 7, seed=3) == solve(meals, 7, seed=3)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_plan_groups(seed):
+    meals = [make_meal('lasagne ' + str(index), group='lasagne') for index in range(5)] \
+        + [make_meal('gratin ' + str(index), group='gratin') for index in range(5)] \
+        + [make_meal('pizza')]
+    plan = solve(meals, 3, seed=seed)
+    assert sorted(meal.get_group() or '' for meal in plan) == ['', 'gratin', 'lasagne']
+
+
+def test_plan_groups_infeasible():
+    meals = [make_meal('lasagne ' + str(index), group='lasagne') for index in range(5)] \
+        + [make_meal('pizza')]
+    with pytest.raises(NotEnoughMealsError):
+        solve(meals, 3)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_plan_leftovers(seed):
+    meals = make_meals(40) + [
+        make_meal('quiche', group='tarte', ingredients=['oeuf', 'lardons']),
+        make_meal('tarte', group='tarte', ingredients=['oeuf']),
+        make_meal('omelette', ingredients=['oeuf']),
+        make_meal('ratatouille', is_veggie=True, ingredients=['courgette']),
+    ]
+    plan = solve(meals, 4, leftovers=['oeuf', 'lardons', 'courgette'], seed=seed,
+                 veggie_limit=1)
+    ingredients = set()
+    for meal in plan:
+        ingredients.update(meal.get_mandatory_ingredients())
+    assert {'oeuf', 'lardons', 'courgette'} <= ingredients
+    assert len(plan) == 4
+    assert {'quiche', 'ratatouille'} <= {meal.get() for meal in plan}
+
+
+def test_plan_leftovers_without_meal_are_ignored():
+    plan = solve(make_meals(10), 3, leftovers=['truffe'])
+    assert len(plan) == 3
+
+
+def test_plan_leftovers_infeasible():
+    # Both leftovers need a meal of the same group
+    meals = make_meals(10) + [make_meal('quiche', group='tarte', ingredients=['oeuf']),
+                              make_meal('tarte', group='tarte', ingredients=['lardons'])]
+    with pytest.raises(NotEnoughMealsError):
+        solve(meals, 3, leftovers=['oeuf', 'lardons'])
+
+
+def test_plan_leftovers_more_than_meals():
+    meals = [make_meal(name, ingredients=[name]) for name in ['a', 'b', 'c']]
+    with pytest.raises(NotEnoughMealsError):
+        solve(meals, 2, leftovers=['a', 'b', 'c'])
+
+
+def test_search_steps_limit(monkeypatch):
+    monkeypatch.setattr('meals_for_a_week.solver.MAX_SEARCH_STEPS', 50)
+    # Infeasible, but only found out once every combination of groups is tried
+    meals = [make_meal('plat {0}-{1}'.format(group, index), group=str(group))
+             for group in range(10) for index in range(10)]
+    with pytest.raises(NotEnoughMealsError, match='50 steps'):
+        solve(meals, 11)
+
+
+def test_long_plan():
+    # Deeper than the default recursion limit
+    plan = solve(make_meals(3000), 2000, veggie_limit=300, special_limit=100)
+    assert len(set(plan)) == 2000
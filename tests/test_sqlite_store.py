@@ -0,0 +1,170 @@
+"""
+Meal for a week : SQLite storage backend tests
+"""
+
+import datetime
+import sqlite3
+
+import pytest
+
+from meals_for_a_week.configuration import Configuration # noqa
+from meals_for_a_week.history import HistoryDatabase # noqa
+from meals_for_a_week.meals_for_a_week import Meal, MealCollection, MealDatabase, \
+    SeasonalDatabase # noqa
+from meals_for_a_week.sqlite_store import SQLiteHistoryDatabase, SQLiteMealDatabase, \
+    SQLiteSeasonalDatabase, import_yaml_files # noqa
+
+POOL_NAMES = [MealCollection.POOL_VEGGIE, MealCollection.POOL_SPECIAL,
+              MealCollection.POOL_NORMAL_STRICT, MealCollection.POOL_NORMAL_LENIENT]
+
+
+def import_dataset(dataset, tmp_path):
+    """
+    Path of the SQLite file imported from dataset
+    """
+    sqlite_path = str(tmp_path / 'meals.db')
+    import_yaml_files(sqlite_path, *dataset, Configuration())
+    return sqlite_path
+
+
+def load(database):
+    """
+    Loaded and built database
+    """
+    database.load()
+    database.build()
+    return database
+
+
+def get_meal_records(meals):
+    """
+    Comparable records of Meal objects
+    """
+    return [(meal.get(), meal.is_veggie(), meal.is_special(), meal.get_group(),
+             tuple(meal.get_mandatory_ingredients())) for meal in meals]
+
+
+def get_pools(meal_collection):
+    """
+    Meal names of every candidate pool of meal_collection, in pool order
+    """
+    return {pool_name: [meal.get() for meal in meal_collection.get_pool(pool_name).get()]
+            for pool_name in POOL_NAMES}
+
+
+def get_history_records(history_database):
+    """
+    Comparable records of history entries
+    """
+    return [(entry.get('date'), [meal_record['meal'] for meal_record in entry['meals']])
+            for entry in history_database.get_entries()]
+
+
+def test_import_matches_yaml(dataset, tmp_path):
+    sqlite_path = import_dataset(dataset, tmp_path)
+    yaml_database = load(MealDatabase(dataset[0], Configuration()))
+    sqlite_database = load(SQLiteMealDatabase(sqlite_path, Configuration()))
+    assert get_meal_records(sqlite_database.get().get()) \
+        == get_meal_records(yaml_database.get().get())
+    assert get_pools(sqlite_database.get()) == get_pools(yaml_database.get())
+    meal_name = yaml_database.get().get()[0].get()
+    assert get_meal_records(sqlite_database.get_meals_by_name(meal_name)) \
+        == get_meal_records(yaml_database.get_meals_by_name(meal_name))
+
+    yaml_seasonal_database = load(SeasonalDatabase(dataset[1], Configuration()))
+    sqlite_seasonal_database = load(SQLiteSeasonalDatabase(sqlite_path, Configuration()))
+    assert [(month.get(), month.get_vegetables()) for month in sqlite_seasonal_database.get()] \
+        == [(month.get(), month.get_vegetables()) for month in yaml_seasonal_database.get()]
+    assert sqlite_seasonal_database.get_current_vegetable_set() \
+        == yaml_seasonal_database.get_current_vegetable_set()
+
+    yaml_history_database = HistoryDatabase(dataset[2], Configuration())
+    yaml_history_database.load()
+    sqlite_history_database = SQLiteHistoryDatabase(sqlite_path, Configuration())
+    sqlite_history_database.load()
+    assert get_history_records(sqlite_history_database) \
+        == get_history_records(yaml_history_database)
+
+
+@pytest.mark.parametrize('number_of_history_meals', [0, 2, 100])
+def test_filter_matches_yaml(dataset, tmp_path, plan_generator, number_of_history_meals):
+    sqlite_path = import_dataset(dataset, tmp_path)
+    plans = []
+    pools = []
+    for meal_database, seasonal_database, history_database in [
+            (MealDatabase(dataset[0], Configuration()),
+             SeasonalDatabase(dataset[1], Configuration()),
+             HistoryDatabase(dataset[2], Configuration())),
+            (SQLiteMealDatabase(sqlite_path, Configuration()),
+             SQLiteSeasonalDatabase(sqlite_path, Configuration()),
+             SQLiteHistoryDatabase(sqlite_path, Configuration()))]:
+        load(meal_database)
+        load(seasonal_database)
+        history_database.load(number_of_history_meals)
+        leftovers = sorted(meal_database.get().get()[0].get_mandatory_ingredients())
+        plans.append(plan_generator(meal_database, seasonal_database,
+                                    history_database if number_of_history_meals else None,
+                                    number_of_history_meals, leftovers, 1))
+        pools.append(get_pools(meal_database.get()))
+    assert plans[0] == plans[1]
+    assert pools[0] == pools[1]
+
+
+def test_history_recent_meal_names(dataset, tmp_path):
+    sqlite_path = import_dataset(dataset, tmp_path)
+    yaml_history_database = HistoryDatabase(dataset[2], Configuration())
+    yaml_history_database.load()
+    sqlite_history_database = SQLiteHistoryDatabase(sqlite_path, Configuration())
+    for number_of_weeks in [1, 3, 1000]:
+        assert sqlite_history_database.get_recent_meal_names(number_of_weeks) \
+            == yaml_history_database.get_recent_meal_names(number_of_weeks)
+
+
+def test_history_add_commit_compact(dataset, tmp_path):
+    sqlite_path = import_dataset(dataset, tmp_path)
+    history_database = SQLiteHistoryDatabase(sqlite_path, Configuration())
+    history_database.load()
+    number_of_entries = len(history_database.get_entries())
+    week_date = datetime.date.today() + datetime.timedelta(weeks=1)
+    history_database.add([Meal('plat nouveau')], week_date)
+    # Added weeks are recent history before they are committed
+    assert 'plat nouveau' in history_database.get_recent_meal_names(1)
+    assert 'plat nouveau' not in SQLiteHistoryDatabase(
+        sqlite_path, Configuration()).get_recent_meal_names(1)
+    history_database.commit()
+    history_database.commit()
+
+    reloaded_database = SQLiteHistoryDatabase(sqlite_path, Configuration())
+    reloaded_database.load(1)
+    assert get_history_records(reloaded_database) == [(week_date, ['plat nouveau'])]
+    reloaded_database.load()
+    assert len(reloaded_database.get_entries()) == number_of_entries + 1
+
+    reloaded_database.compact(2)
+    assert len(reloaded_database.get_entries()) == 2
+    compacted_database = SQLiteHistoryDatabase(sqlite_path, Configuration())
+    compacted_database.load()
+    assert get_history_records(compacted_database) == get_history_records(reloaded_database)
+    assert get_history_records(compacted_database)[-1] == (week_date, ['plat nouveau'])
+
+
+def test_reload_after_import(dataset, tmp_path):
+    sqlite_path = import_dataset(dataset, tmp_path)
+    meal_database = load(SQLiteMealDatabase(sqlite_path, Configuration()))
+    assert not meal_database.reload()
+    with open(dataset[0], 'a', encoding='utf-8') as database_file:
+        database_file.write("- meal: 'Plat ajouté'\n")
+    import_yaml_files(sqlite_path, *dataset, Configuration())
+    assert meal_database.reload()
+    assert meal_database.get_meals_by_name('plat ajouté')
+
+
+def test_connect_errors(tmp_path):
+    with pytest.raises(SystemExit):
+        load(SQLiteMealDatabase(str(tmp_path / 'missing.db'), Configuration()))
+    # Not imported by this version : import is required again
+    connection = sqlite3.connect(str(tmp_path / 'other.db'))
+    connection.execute('CREATE TABLE meals (id INTEGER PRIMARY KEY)')
+    connection.close()
+    with pytest.raises(SystemExit):
+        load(SQLiteMealDatabase(str(tmp_path / 'other.db'), Configuration()))
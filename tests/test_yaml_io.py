@@ -0,0 +1,52 @@
+"""
+Meal for a week : yaml I/O tests
+"""
+
+import pytest
+
+from meals_for_a_week.yaml_io import load_yaml_string, split_sequence_items # noqa
+
+
+@pytest.mark.parametrize('content', [
+    'meals:\n  - meal: a\n    group: x\n  - meal: b\nother: 1\n',
+    # Items not indented under their key, nested sequences at the same indentation as items
+    'meals:\n- meal: a\n  mandatory_ingredients:\n  - x\n  - y\n- meal: b\nother: 1\n',
+    # Nested sequence less indented than the keys of its item
+    'meals:\n  - meal: a\n    mandatory_ingredients:\n    - x\n  - meal: b\n',
+    # Comments and blank lines before and between items
+    '# head\nmeals:\n  # first\n  - meal: a\n  # between\n\n  - meal: b # trailing\n',
+    # Flow items
+    'meals:\n  - {meal: a, group: g}\n  - [1, 2]\n',
+    # Sequence at the end of a document without final new line
+    'other: 1\nmeals:\n  - meal: a\n  - meal: b',
+])
+def test_split_sequence_items(content):
+    items = split_sequence_items(content, 'meals')
+    assert [load_yaml_string(item)[0] for item in items] == load_yaml_string(content)['meals']
+    assert not any(item.endswith('\n') for item in items[-1:])
+
+
+@pytest.mark.parametrize('content', [
+    # Items referring to each other
+    'meals:\n  - &lasagne {meal: a}\n  - *lasagne\n',
+    'meals:\n  - meal: &name a\n  - meal: b\n',
+    # Flow sequence
+    'meals: [{meal: a}, {meal: b}]\n',
+    # Several documents
+    'meals:\n  - meal: a\n---\nmeals:\n  - meal: b\n',
+    # Missing key, or key with another value
+    'other:\n  - meal: a\n',
+    'meals:\nother: 1\n',
+])
+def test_split_sequence_items_other_layouts(content):
+    assert split_sequence_items(content, 'meals') is None
+
+
+def test_split_sequence_items_empty_sequence():
+    assert split_sequence_items('meals:\n', 'meals') == []
+
+
+def test_split_sequence_items_same_text_wherever_item_is():
+    items = split_sequence_items('meals:\n  - meal: a\n  - meal: b\n', 'meals')
+    swapped_items = split_sequence_items('meals:\n  - meal: b\n  - meal: a', 'meals')
+    assert items == list(reversed(swapped_items))